@@ -1,7 +1,14 @@
-from .authentication import Authentication
-from .client import Client
+import importlib
+
 from .config import FilelibConfig
-from .upload_manager import UploadManager
+
+# Components that pull in heavy dependencies(httpx, jwt, jmstorage...)
+# are imported on first access to keep `import filelib` cheap.
+_LAZY_ATTRIBUTES = {
+    "Authentication": ".authentication",
+    "Client": ".client",
+    "UploadManager": ".upload_manager"
+}
 
 __all__ = [
     "Client",
@@ -9,3 +16,17 @@ __all__ = [
     "FilelibConfig",
     "UploadManager"
 ]
+
+
+def __getattr__(name):
+    module_path = _LAZY_ATTRIBUTES.get(name)
+    if module_path is None:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    value = getattr(importlib.import_module(module_path, __name__), name)
+    # Cache it so module level `__getattr__` is not hit again.
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
@@ -0,0 +1,252 @@
+"""
+Upload the members of zip and tar archives as files of their own, without extracting them to disk.
+
+Members stored without compression(zip `ZIP_STORED`, plain tar) are read in place through a seekable view
+of their byte range in the archive, so they are uploaded like any other file: in parallel and resumable.
+Compressed members are decompressed while they are uploaded, through the stream path. See `filelib.streaming`
+Members of compressed tar archives(.tar.gz...) are compressed members: reaching one decompresses the archive up to it,
+so reading all of them is quadratic. Compressed tar archives with more than `max_compressed_members` members
+to upload are refused; they must be extracted, or fewer members selected.
+"""
+import io
+import os
+import posixpath
+import struct
+import tarfile
+import time
+import typing
+import zipfile
+
+from .discovery import Patterns, _matches, _to_patterns
+from .exceptions import ValidationError
+from .sources import Source
+from .utils import resolve_path
+
+MAX_COMPRESSED_TAR_MEMBERS = 16
+
+
+class ArchiveRangeReader(io.RawIOBase):
+    """
+    Seekable, read-only view of `size` bytes of the file at `path` starting at `offset`.
+    """
+
+    def __init__(self, path: str, offset: int, size: int):
+        super().__init__()
+        self.offset = offset
+        self.size = size
+        self._file = open(path, "rb")
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError("Negative seek position %d" % offset)
+        self._position = offset
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer).cast("B")[:max(0, self.size - self._position)]
+        if not len(view):
+            return 0
+        self._file.seek(self.offset + self._position)
+        read = self._file.readinto(view) or 0
+        self._position += read
+        return read
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+class MemberStream(io.RawIOBase):
+    """
+    Non-seekable reader of a compressed member. Closes the archive with it.
+    """
+
+    def __init__(self, reader, archive):
+        super().__init__()
+        self._reader = reader
+        self._archive = archive
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer) -> int:
+        return self._reader.readinto(buffer)
+
+    def close(self):
+        self._reader.close()
+        self._archive.close()
+        super().close()
+
+
+class ArchiveMemberSource(Source):
+    """
+    Member of the archive at `path`. `offset`: where its content starts in the archive if it is stored uncompressed.
+    """
+    __slots__ = ("path", "name", "size", "mtime", "offset")
+
+    def __init__(self, path: str, name: str, size: int, mtime: float, offset: typing.Optional[int] = None):
+        self.path = path
+        self.name = name
+        self.size = size
+        self.mtime = mtime
+        self.offset = offset
+
+    @property
+    def compressed(self) -> bool:
+        return self.offset is None
+
+    def open(self):
+        if not self.compressed:
+            return ArchiveRangeReader(self.path, self.offset, self.size)
+        return self.open_member()
+
+    def open_member(self) -> MemberStream:
+        raise NotImplementedError
+
+    def __repr__(self):
+        return "<%s %s:%s>" % (type(self).__name__, self.path, self.name)
+
+
+class ZipMemberSource(ArchiveMemberSource):
+    __slots__ = ()
+
+    def open_member(self):
+        archive = zipfile.ZipFile(self.path)
+        try:
+            return MemberStream(archive.open(self.name), archive)
+        except BaseException:
+            archive.close()
+            raise
+
+
+class TarMemberSource(ArchiveMemberSource):
+    __slots__ = ("info",)
+
+    def __init__(self, path: str, info: tarfile.TarInfo, offset: typing.Optional[int] = None):
+        super().__init__(path, info.name, info.size, info.mtime, offset)
+        # Lets the member be read without listing the archive again.
+        self.info = info
+
+    def open_member(self):
+        archive = tarfile.open(self.path, "r:*")
+        try:
+            return MemberStream(archive.extractfile(self.info), archive)
+        except BaseException:
+            archive.close()
+            raise
+
+
+def _get_member_path(name: str) -> typing.Optional[str]:
+    """
+    Relative path of a member. None for names pointing outside the archive.
+    """
+    path = posixpath.normpath(name.replace("\\", "/")).lstrip("/")
+    if path in ("", ".") or path == ".." or path.startswith("../"):
+        return None
+    return path
+
+
+def _get_zip_data_offset(file, info: zipfile.ZipInfo) -> int:
+    # Local header lengths of name and extra field can differ from the central directory.
+    file.seek(info.header_offset)
+    header = struct.unpack(zipfile.structFileHeader, file.read(zipfile.sizeFileHeader))
+    return info.header_offset + zipfile.sizeFileHeader + header[zipfile._FH_FILENAME_LENGTH] + header[zipfile._FH_EXTRA_FIELD_LENGTH]
+
+
+def _iter_zip(path: str) -> typing.Iterator[typing.Tuple[str, ArchiveMemberSource]]:
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as file:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            # Encrypted members are decrypted while read.
+            stored = info.compress_type == zipfile.ZIP_STORED and not info.flag_bits & 0x1
+            offset = _get_zip_data_offset(file, info) if stored else None
+            mtime = time.mktime(info.date_time + (0, 0, -1))
+            yield info.filename, ZipMemberSource(path, info.filename, info.file_size, mtime, offset)
+
+
+def _is_compressed_tar(path: str) -> bool:
+    try:
+        tarfile.open(path, "r:").close()
+    except tarfile.ReadError:
+        return True
+    return False
+
+
+def _iter_tar(path: str, compressed: bool) -> typing.Iterator[typing.Tuple[str, ArchiveMemberSource]]:
+    with tarfile.open(path, "r:*" if compressed else "r:") as archive:
+        for info in archive:
+            if not info.isreg():
+                continue
+            # Content of sparse members is not contiguous in the archive.
+            offset = None if compressed or info.issparse() else info.offset_data
+            yield info.name, TarMemberSource(path, info, offset)
+
+
+def iter_archive(
+        path: str,
+        include: Patterns = None,
+        exclude: Patterns = None,
+        max_compressed_members: int = MAX_COMPRESSED_TAR_MEMBERS
+) -> typing.Iterator[typing.Tuple[str, ArchiveMemberSource]]:
+    """
+    Yield (relative_path, source) of every file in the zip or tar archive at `path`, listed as they are read.
+    `include`, `exclude`: glob pattern(s) matched against the path in the archive, or the name.
+    Members with paths outside the archive(e.g. "../name") are skipped.
+    Compressed tar archives are listed up front, and refused if more than `max_compressed_members` members are selected.
+    """
+    path = resolve_path(path)
+    compressed = False
+    if zipfile.is_zipfile(path):
+        members = _iter_zip(path)
+    elif tarfile.is_tarfile(path):
+        compressed = _is_compressed_tar(path)
+        members = _iter_tar(path, compressed)
+    else:
+        raise ValidationError("`%s` is not a zip or tar archive." % path)
+    members = _filter_members(members, _to_patterns(include), _to_patterns(exclude))
+    if not compressed:
+        return members
+    members = list(members)
+    if len(members) > max_compressed_members:
+        raise ValidationError(
+            "`%s` is a compressed tar archive with %d members to upload, more than %d. "
+            "Every member is read by decompressing the archive from its start: "
+            "extract it, or select fewer members with `include`/`exclude`." % (path, len(members), max_compressed_members)
+        )
+    return iter(members)
+
+
+def _is_excluded(relative_path: str, exclude) -> bool:
+    """
+    Excluded members, and members of excluded directories as `walk_directory` skips them.
+    """
+    parts = relative_path.split("/")
+    return any(_matches("/".join(parts[:i]), parts[i - 1], exclude) for i in range(1, len(parts) + 1))
+
+
+def _filter_members(members, include, exclude):
+    for name, source in members:
+        relative_path = _get_member_path(name)
+        if relative_path is None:
+            continue
+        base_name = os.path.basename(relative_path)
+        if exclude and _is_excluded(relative_path, exclude):
+            continue
+        if include and not _matches(relative_path, base_name, include):
+            continue
+        yield relative_path, source
@@ -3,10 +3,6 @@ from configparser import ConfigParser
 from datetime import datetime
 from uuid import uuid4
 
-import httpx
-import jwt
-import pytz
-
 from filelib.constants import (
     AUTHENTICATION_URL,
     AUTHORIZATION_HEADER,
@@ -120,6 +116,8 @@ class Authentication:
         return not self.is_expired() and bool(self.__ACCESS_TOKEN)
 
     def is_expired(self):
+        import pytz
+
         if not self.__ACCESS_TOKEN:
             return True
         if not self.__ACCESS_TOKEN_EXPIRATION:
@@ -149,6 +147,10 @@ class Authentication:
         make a POST request to AUTHENTICATION_URL to acquire an access_token
         :return: None
         """
+        # Deferred so that importing the package does not load httpx/jwt.
+        import httpx
+        import jwt
+
         jwt_payload = self._access_token_payload()
         jwt_encoded = jwt.encode(
             payload=jwt_payload,
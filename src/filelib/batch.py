@@ -0,0 +1,168 @@
+"""
+Create the file entities of many small files with a single request.
+
+Without it every file is created with its own request before any of its data is sent.
+`EntityBatcher.iter_created` creates the next batch while the files of the current one are uploading.
+"""
+import concurrent.futures
+import logging
+import os
+import typing
+
+import httpx
+
+from .authentication import Authentication
+from .constants import (
+    DEFAULT_CREATE_BATCH_SIZE,
+    FILE_UPLOAD_BATCH_URL,
+    UNSUPPORTED_ENDPOINT_STATUS_CODES
+)
+from .exceptions import FilelibAPIException
+from .ratelimit import RateLimitState, send_throttled
+from .sources import Source
+from .streaming import is_stream
+from .upload_manager import UploadManager
+from .utils import parse_api_err
+
+logger = logging.getLogger(__name__)
+
+# Headers and data Filelib API responds with for a single created file. See `UploadManager.set_entity`
+Entity = typing.Dict[str, typing.Any]
+
+
+class EntityBatcher:
+
+    def __init__(
+            self,
+            auth: Authentication,
+            batch_size: int = DEFAULT_CREATE_BATCH_SIZE,
+            max_file_size: int = UploadManager.MIN_CHUNK_SIZE,
+            rate_limit_state: typing.Optional[RateLimitState] = None
+    ):
+        if batch_size < 1:
+            raise ValueError("Batch size must be at least 1. Value provided: %d" % batch_size)
+        self.auth = auth
+        self.batch_size = batch_size
+        # Bigger files are created on their own: they have parts to resume.
+        self.max_file_size = max_file_size
+        # Set to False once Filelib API responds that batch create is not supported.
+        self.supported = True
+        # Throttled requests pause the uploads sharing it. See `filelib.ratelimit`
+        self.rate_limit_state = rate_limit_state or RateLimitState()
+        # Error of the last batch that failed. Its files are created on their own instead.
+        self.error: typing.Optional[Exception] = None
+
+    @staticmethod
+    def get_file_size(file) -> int:
+        if isinstance(file, Source):
+            return file.size
+        size = file.seek(0, os.SEEK_END)
+        file.seek(0)
+        return size
+
+    @staticmethod
+    def get_file_head(file) -> bytes:
+        """
+        First 1000 bytes of the file, the same UploadManager names its cache namespace after.
+        """
+        if isinstance(file, Source):
+            with file.open() as opened:
+                return opened.read(1000)
+        file.seek(0)
+        head = file.read(1000)
+        file.seek(0)
+        return head
+
+    def has_cached_entity(self, file_args: dict) -> bool:
+        """
+        Whether the file has an interrupted upload to resume. A new entity would orphan the cached one.
+        """
+        if file_args.get("ignore_cache"):
+            return False
+        cache = file_args.get("cache")
+        if cache is None:
+            namespace = UploadManager.make_cache_namespace(self.get_file_head(file_args["file"]), file_args["file_name"])
+            cache = UploadManager.get_namespace_cache(namespace, file_args.get("cache_backend"))
+        return cache.get(UploadManager._CACHE_ENTITY_KEY) is not None
+
+    def is_batchable(self, file_args: dict) -> bool:
+        file = file_args["file"]
+        return (
+            self.supported
+            and not is_stream(file)
+            and self.get_file_size(file) <= self.max_file_size
+            and not self.has_cached_entity(file_args)
+        )
+
+    def create(self, batch: typing.List[dict]) -> typing.List[typing.Optional[Entity]]:
+        """
+        Create the files of `batch`, UploadManager arguments of files sharing the same config, with a single request.
+        Return an entity per file. Entities are None if batch create is not supported.
+        """
+        headers = self.auth.to_headers()
+        headers.update(batch[0]["config"].to_headers())
+        payload = {
+            "files": [
+                {
+                    "file_name": file_args["file_name"],
+                    "file_size": self.get_file_size(file_args["file"]),
+                    "mimetype": file_args.get("content_type")
+                } for file_args in batch
+            ]
+        }
+        with httpx.Client() as client:
+            req = send_throttled(lambda: client.post(FILE_UPLOAD_BATCH_URL, json=payload, headers=headers), self.rate_limit_state)
+        if req.status_code in UNSUPPORTED_ENDPOINT_STATUS_CODES:
+            self.supported = False
+            return [None] * len(batch)
+        if not req.is_success:
+            raise FilelibAPIException(*parse_api_err(req))
+        entities = req.json()["data"]
+        if len(entities) != len(batch):
+            raise FilelibAPIException("Batch create responded with %d files for %d." % (len(entities), len(batch)))
+        return entities
+
+    def _created(self, future, batch):
+        try:
+            entities = future.result()
+        except Exception as exc:
+            # Every file is created on its own instead, which reports the error if it persists.
+            self.error = exc
+            logger.warning("Batch create of %d files failed, creating them one by one: %s", len(batch), exc)
+            entities = [None] * len(batch)
+        for (key, file_args), entity in zip(batch, entities):
+            yield key, file_args, entity
+
+    def iter_created(
+            self,
+            files: typing.Iterable[typing.Tuple[typing.Any, dict]]
+    ) -> typing.Iterator[typing.Tuple[typing.Any, dict, typing.Optional[Entity]]]:
+        """
+        Take (key, UploadManager arguments) pairs and yield (key, UploadManager arguments, entity).
+        Files that are not batchable are yielded right away with no entity.
+        A batch is yielded once the next one is being created.
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="filelib-batch") as executor:
+            batch = []
+            batch_config = None
+            previous = None
+            for key, file_args in files:
+                if not self.is_batchable(file_args):
+                    yield key, file_args, None
+                    continue
+                config = file_args["config"].to_headers()
+                # A batch is created under a single config.
+                if batch and (len(batch) >= self.batch_size or config != batch_config):
+                    current = (executor.submit(self.create, [args for _key, args in batch]), batch)
+                    if previous:
+                        yield from self._created(*previous)
+                    previous, batch = current, []
+                batch.append((key, file_args))
+                batch_config = config
+            if batch:
+                current = (executor.submit(self.create, [args for _key, args in batch]), batch)
+                if previous:
+                    yield from self._created(*previous)
+                previous = current
+            if previous:
+                yield from self._created(*previous)
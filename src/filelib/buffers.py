@@ -0,0 +1,79 @@
+"""
+Reusable chunk buffers so uploads do not allocate a new `bytes` object for every part.
+"""
+import mmap
+import threading
+
+
+class BufferPool:
+    """
+    Hand out at most `count` buffers and reuse them once they are released.
+    Buffers are allocated on first use and kept while the pool may hand them out.
+    `acquire` blocks while every buffer is in use.
+
+    Uploads sharing the pool `reserve` the buffers they need while they run and `unreserve` them once finished,
+    so the pool holds enough buffers for every upload running at once.
+
+    Buffers are anonymous memory maps: page aligned(usable for O_DIRECT reads)
+    and not committed by the OS until they are written to.
+    """
+
+    def __init__(self, count: int = 1):
+        if count < 1:
+            raise ValueError("Buffer pool requires at least one buffer. Value provided: %d" % count)
+        self.min_count = count
+        self._reserved = 0
+        self._free = []
+        self._allocated = 0
+        self._condition = threading.Condition()
+
+    @property
+    def count(self) -> int:
+        """
+        Buffers the pool may hold: every reserved buffer, and never less than it was created with.
+        """
+        return max(self.min_count, self._reserved)
+
+    def reserve(self, count: int):
+        """
+        Allow the pool to hold `count` more buffers until they are unreserved.
+        """
+        with self._condition:
+            self._reserved += count
+            self._condition.notify_all()
+
+    def unreserve(self, count: int):
+        """
+        Give back buffers reserved with `reserve`. Free buffers above the new count are dropped.
+        """
+        with self._condition:
+            self._reserved = max(0, self._reserved - count)
+            while self._free and self._allocated > self.count:
+                self._free.pop()
+                self._allocated -= 1
+
+    def acquire(self, size: int) -> mmap.mmap:
+        """
+        Return a buffer of at least `size` bytes.
+        """
+        with self._condition:
+            while not self._free and self._allocated >= self.count:
+                self._condition.wait()
+            if self._free:
+                buffer = self._free.pop()
+                if len(buffer) >= size:
+                    return buffer
+                # Chunk size grew, buffer is replaced with a bigger one below.
+            else:
+                self._allocated += 1
+        # Memory maps cannot be empty.
+        return mmap.mmap(-1, max(size, 1))
+
+    def release(self, buffer: mmap.mmap):
+        with self._condition:
+            if self._allocated > self.count:
+                # Held while the pool shrunk. Dropped, views of it may still be in use.
+                self._allocated -= 1
+                return
+            self._free.append(buffer)
+            self._condition.notify()
@@ -0,0 +1,360 @@
+"""
+Backends to store the resume state of uploads.
+
+A backend holds the state of every upload, `namespace()` returns the view of a single upload
+with the same methods as `jmstorage.Cache` so it can be passed to UploadManager as `cache`.
+
+Every entry expires `ttl` seconds after it is written. `gc()` removes expired entries
+and the state of uploads that are completed or cancelled in bulk.
+Expired entries are kept until they are removed, `include_expired` reads them still:
+`Client.sweep_stale_uploads` finds the oldest abandoned uploads with them.
+Values must be JSON serializable.
+
+Namespaces starting with RESERVED_NAMESPACE_PREFIX hold what is not an upload(e.g. `filelib.dedup`)
+in the same backend. They are not listed by `namespaces()` so they are never taken for abandoned uploads.
+"""
+import fnmatch
+import json
+import sqlite3
+import threading
+import time
+import typing
+from collections import OrderedDict
+
+from filelib.constants import (
+    DEFAULT_CACHE_TTL,
+    UPLOAD_CANCELLED,
+    UPLOAD_COMPLETED
+)
+
+# Key UploadManager stores the upload status with.
+CACHE_STATUS_KEY = "STATUS"
+# Uploads in these statuses have nothing left to resume.
+FINISHED_STATUSES = (UPLOAD_COMPLETED, UPLOAD_CANCELLED)
+RESERVED_NAMESPACE_PREFIX = "__filelib_"
+
+
+def is_reserved_namespace(namespace: str) -> bool:
+    return namespace.startswith(RESERVED_NAMESPACE_PREFIX)
+
+
+class CacheNamespace:
+    """
+    View of a backend for a single upload.
+    """
+
+    def __init__(self, backend: "BaseCacheBackend", namespace: str):
+        self.backend = backend
+        self.namespace = namespace
+
+    def get(self, key):
+        return self.backend.get(self.namespace, key)
+
+    def set(self, key, value):
+        return self.backend.set(self.namespace, key, value)
+
+    def delete(self, key):
+        return self.backend.delete(self.namespace, key)
+
+    def pop(self, key):
+        value = self.get(key)
+        self.delete(key)
+        return value
+
+    def truncate(self):
+        return self.backend.truncate(self.namespace)
+
+
+class BaseCacheBackend:
+
+    def __init__(self, ttl: typing.Optional[float] = DEFAULT_CACHE_TTL):
+        # None keeps entries until they are deleted.
+        self.ttl = ttl
+
+    def namespace(self, namespace: str) -> CacheNamespace:
+        return CacheNamespace(self, str(namespace))
+
+    def is_expired(self, updated_at: float, now: typing.Optional[float] = None) -> bool:
+        if self.ttl is None:
+            return False
+        return updated_at < (now or time.time()) - self.ttl
+
+    def get(self, namespace, key, include_expired=False):
+        raise NotImplementedError
+
+    def set(self, namespace, key, value):
+        raise NotImplementedError
+
+    def delete(self, namespace, key):
+        raise NotImplementedError
+
+    def truncate(self, namespace):
+        raise NotImplementedError
+
+    def namespaces(self, include_expired=False) -> typing.Iterator[typing.Tuple[str, float]]:
+        """
+        Yield (namespace, updated_at) of every upload with entries that are not expired, or any entries with `include_expired`.
+        updated_at is the time of the latest write. Reserved namespaces are not uploads and are skipped.
+        """
+        raise NotImplementedError
+
+    def gc(self, max_age: typing.Optional[float] = None) -> int:
+        """
+        Remove expired entries and uploads that are finished.
+        Uploads not written to in the last `max_age` seconds are removed as well.
+        Uploads are not cancelled on the server, run `Client.sweep_stale_uploads` first for that.
+        Return the number of namespaces removed.
+        """
+        now = time.time()
+        removed = 0
+        for namespace, updated_at in list(self.namespaces()):
+            stale = max_age is not None and updated_at < now - max_age
+            if stale or self.get(namespace, CACHE_STATUS_KEY) in FINISHED_STATUSES:
+                self.truncate(namespace)
+                removed += 1
+        self._evict_expired()
+        return removed
+
+    def _evict_expired(self):
+        """
+        Remove entries past their ttl.
+        """
+        raise NotImplementedError
+
+
+class MemoryCache(BaseCacheBackend):
+    """
+    In process cache. Least recently used uploads are evicted after `max_namespaces`.
+    """
+
+    def __init__(self, ttl: typing.Optional[float] = DEFAULT_CACHE_TTL, max_namespaces: int = 10000):
+        super().__init__(ttl=ttl)
+        self.max_namespaces = max_namespaces
+        # namespace: {key: (value, updated_at)}
+        self._data: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, namespace, key, include_expired=False):
+        with self._lock:
+            entries = self._data.get(namespace)
+            if entries is None or key not in entries:
+                return None
+            self._data.move_to_end(namespace)
+            value, updated_at = entries[key]
+            if not include_expired and self.is_expired(updated_at):
+                del entries[key]
+                return None
+            return value
+
+    def set(self, namespace, key, value):
+        with self._lock:
+            self._data.setdefault(namespace, {})[key] = (value, time.time())
+            self._data.move_to_end(namespace)
+            while len(self._data) > self.max_namespaces:
+                self._data.popitem(last=False)
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._data.get(namespace, {}).pop(key, None)
+
+    def truncate(self, namespace):
+        with self._lock:
+            self._data.pop(namespace, None)
+
+    def namespaces(self, include_expired=False):
+        now = time.time()
+        with self._lock:
+            items = [(ns, max(t for _v, t in entries.values())) for ns, entries in self._data.items() if entries]
+        for namespace, updated_at in items:
+            if (include_expired or not self.is_expired(updated_at, now)) and not is_reserved_namespace(namespace):
+                yield namespace, updated_at
+
+    def _evict_expired(self):
+        now = time.time()
+        with self._lock:
+            for namespace in list(self._data):
+                entries = self._data[namespace]
+                for key in [k for k, (_v, t) in entries.items() if self.is_expired(t, now)]:
+                    del entries[key]
+                if not entries:
+                    del self._data[namespace]
+
+
+class SQLiteCache(BaseCacheBackend):
+    """
+    Every upload in a single SQLite file. Lookups and evictions use indexes.
+    """
+
+    def __init__(self, path: str = "filelib_cache.sqlite3", ttl: typing.Optional[float] = DEFAULT_CACHE_TTL):
+        super().__init__(ttl=ttl)
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS filelib_cache ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT, updated_at REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS filelib_cache_updated_at ON filelib_cache (updated_at)"
+            )
+            # Finding finished uploads by status.
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS filelib_cache_key_value ON filelib_cache (key, value)"
+            )
+
+    def _execute(self, query, params=()):
+        with self._lock:
+            return self._connection.execute(query, params).fetchall()
+
+    def _expires_before(self, include_expired=False):
+        # Entries updated before this time are expired.
+        return float("-inf") if self.ttl is None or include_expired else time.time() - self.ttl
+
+    def get(self, namespace, key, include_expired=False):
+        rows = self._execute(
+            "SELECT value FROM filelib_cache WHERE namespace = ? AND key = ? AND updated_at >= ?",
+            (namespace, key, self._expires_before(include_expired))
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    def set(self, namespace, key, value):
+        self._execute(
+            "INSERT OR REPLACE INTO filelib_cache (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value), time.time())
+        )
+
+    def delete(self, namespace, key):
+        self._execute("DELETE FROM filelib_cache WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def truncate(self, namespace):
+        self._execute("DELETE FROM filelib_cache WHERE namespace = ?", (namespace,))
+
+    def namespaces(self, include_expired=False):
+        rows = self._execute(
+            "SELECT namespace, MAX(updated_at) FROM filelib_cache WHERE updated_at >= ? GROUP BY namespace",
+            (self._expires_before(include_expired),)
+        )
+        yield from ((namespace, updated_at) for namespace, updated_at in rows if not is_reserved_namespace(namespace))
+
+    def gc(self, max_age: typing.Optional[float] = None) -> int:
+        finished = self._execute(
+            "SELECT namespace FROM filelib_cache WHERE key = ? AND value IN (%s)" % ", ".join("?" * len(FINISHED_STATUSES)),
+            (CACHE_STATUS_KEY, *[json.dumps(status) for status in FINISHED_STATUSES])
+        )
+        namespaces = {row[0] for row in finished}
+        if max_age is not None:
+            stale = self._execute(
+                "SELECT namespace FROM filelib_cache GROUP BY namespace HAVING MAX(updated_at) < ?",
+                (time.time() - max_age,)
+            )
+            namespaces.update(row[0] for row in stale if not is_reserved_namespace(row[0]))
+        for namespace in namespaces:
+            self.truncate(namespace)
+        self._evict_expired()
+        return len(namespaces)
+
+    def _evict_expired(self):
+        self._execute("DELETE FROM filelib_cache WHERE updated_at < ?", (self._expires_before(),))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class LocalKVStore:
+    """
+    In process stand-in for a network key value store(e.g. redis.Redis) for `KVCache`.
+    Implements only the methods `KVCache` uses.
+    """
+
+    def __init__(self):
+        # key: (value, expires_at)
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value, expires_at = self._data.get(key, (None, None))
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ex if ex else None)
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def scan_iter(self, match="*"):
+        with self._lock:
+            keys = [key for key in self._data if fnmatch.fnmatchcase(key, match)]
+        yield from keys
+
+
+class KVCache(BaseCacheBackend):
+    """
+    Adapter for a network key value store shared by many hosts.
+    `client` must provide `get(key)`, `set(key, value, ex=seconds)`, `delete(*keys)`, `scan_iter(match=pattern)`
+    as `redis.Redis` does. `LocalKVStore` can be used in its place.
+    TTL is delegated to the store, which drops expired keys: `include_expired` reads nothing more.
+    """
+
+    def __init__(self, client, prefix: str = "filelib:", ttl: typing.Optional[float] = DEFAULT_CACHE_TTL):
+        super().__init__(ttl=ttl)
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, namespace, key):
+        return "%s%s:%s" % (self.prefix, namespace, key)
+
+    def _load(self, raw):
+        if raw is None:
+            return None
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf8")
+        return json.loads(raw)
+
+    def get(self, namespace, key, include_expired=False):
+        entry = self._load(self.client.get(self._key(namespace, key)))
+        return None if entry is None else entry["value"]
+
+    def set(self, namespace, key, value):
+        entry = json.dumps({"value": value, "updated_at": time.time()})
+        ttl = None if self.ttl is None else max(1, int(self.ttl))
+        self.client.set(self._key(namespace, key), entry, ex=ttl)
+
+    def delete(self, namespace, key):
+        self.client.delete(self._key(namespace, key))
+
+    def _keys(self, namespace=None):
+        pattern = self.prefix + ("%s:*" % namespace if namespace is not None else "*")
+        for key in self.client.scan_iter(match=pattern):
+            yield key.decode("utf8") if isinstance(key, bytes) else key
+
+    def truncate(self, namespace):
+        keys = list(self._keys(namespace))
+        if keys:
+            self.client.delete(*keys)
+
+    def namespaces(self, include_expired=False):
+        latest = {}
+        for key in self._keys():
+            namespace = key[len(self.prefix):].rsplit(":", 1)[0]
+            # Keys of reserved namespaces can have ":" in them, which the split above does not tell apart.
+            if is_reserved_namespace(namespace):
+                continue
+            entry = self._load(self.client.get(key))
+            if entry is not None:
+                latest[namespace] = max(latest.get(namespace, 0), entry["updated_at"])
+        yield from latest.items()
+
+    def _evict_expired(self):
+        # Store evicts expired keys itself.
+        pass
@@ -1,24 +1,95 @@
+import collections
+import concurrent.futures
+import datetime
+import functools
+import io
+import itertools
+import json
+import math
+import os
+import posixpath
+import threading
+import time
+import typing
 import zlib
 
+import httpx
+
+from .archives import MAX_COMPRESSED_TAR_MEMBERS, iter_archive
 from .authentication import Authentication
-from .constants import CREDENTIAL_SOURCE_OPTION_FILE
+from .batch import EntityBatcher
+from .buffers import BufferPool
+from .cache import CACHE_STATUS_KEY, FINISHED_STATUSES
+from .config import FilelibConfig, sanitize_prefix
+from .constants import (
+    CONTENT_TYPE_JSON,
+    CONTENT_TYPE_TAR,
+    CREDENTIAL_SOURCE_OPTION_FILE,
+    DEFAULT_DISCOVERY_WORKERS,
+    DEFAULT_LARGE_FILE_SIZE,
+    DEFAULT_MAX_OPEN_FILES,
+    DEFAULT_PACK_SIZE,
+    UPLOAD_FAILED
+)
+from .discovery import walk_directory
+from .exceptions import (
+    FileDoesNotExistError,
+    FilelibAPIException,
+    FilelibBaseException,
+    ValidationError
+)
+from .packing import TarPackSource
+from .ratelimit import BandwidthLimiter, RateLimitState
+from .results import UploadResult, result_key
+from .scheduling import SCHEDULE_PRIORITY, FileScheduler, ScheduledFile
+from .sources import FileSource, Source
+from .streaming import StreamUploadManager, is_stream
 from .upload_manager import UploadManager
-from .utils import get_random_string
+from .utils import get_random_string, parse_api_err
 
 
 class Client:
     """
     Organize Filelib API operations here
     """
+    # Files from added directories taken ahead of the upload to be scheduled with the rest.
+    SCHEDULE_LOOKAHEAD = 1000
+    # `add_file` arguments kept apart from UploadManager arguments. See `filelib.scheduling`
+    SCHEDULE_ARGUMENTS = ("priority", "deadline")
+
     def __init__(
             self,
             credentials_source=CREDENTIAL_SOURCE_OPTION_FILE,
             credentials_path='~/.filelib/credentials',
+            cache_backend=None,
+            max_open_files=DEFAULT_MAX_OPEN_FILES,
+            dedup_index=None,
+            bandwidth_limit=None,
+            storage_bandwidth_limits=None,
+            rate_limit_state=None
     ):
         self.auth = Authentication(source=credentials_source, path=credentials_path)
+        # Resume state backend shared by added files. See `filelib.cache`
+        self.cache_backend = cache_backend
+        # Content uploaded already, shared by added files. See `filelib.dedup`
+        self.dedup_index = dedup_index
+        # Bytes per second shared by every file uploaded by this client, and per storage overrides.
+        self.rate_limiter = BandwidthLimiter(bandwidth_limit, storage_bandwidth_limits)
+        # Throttled requests pause every file of this client.
+        # A `SharedRateLimitState` pauses every process on the host. See `filelib.ratelimit`
+        self.rate_limit_state = rate_limit_state or RateLimitState()
+        # Chunk buffers are reused between files uploaded by this client.
+        self.buffer_pool = BufferPool()
         self.instance_index = self._gen_instance_index()
         self.ADDED_FILES = {self.instance_index: {}}
         self.PROCESSED_FILES = {self.instance_index: {}}
+        # Priority and deadline of added files, by index.
+        self.FILE_SCHEDULES = {self.instance_index: {}}
+        # `add_file` arguments produced while uploading. See `add_directory`, `add_packed`
+        self.ADDED_ITERABLES = []
+        # Files added by path are opened when their upload starts, at most `max_open_files` at a time.
+        self.max_open_files = max_open_files
+        self._open_files = threading.BoundedSemaphore(max_open_files)
 
     def _gen_instance_index(self):
         return get_random_string(10)
@@ -34,12 +105,90 @@ class Client:
             ignore_cache=False,
             abort_on_fail=False,
             content_type=None,
-            clear_cache=False
+            clear_cache=False,
+            prefetch=2,
+            drop_page_cache=False,
+            direct_io=False,
+            small_file_threshold=0,
+            compression=None,
+            priority=0,
+            deadline=None
     ):
+        """
+        Add a file to upload with `upload`.
+
+        `file`: a path, a `filelib.sources.Source`, a file object, or a stream: a file object that cannot be seeked
+        or an iterable of bytes. See `filelib.streaming`
+        `priority`: files with higher priority are uploaded first.
+        `deadline`: time, as `time.time()` or a datetime, the upload should finish by. See `filelib.scheduling`
+        """
+        file_args = self._get_file_args(
+            file,
+            config,
+            file_name=file_name,
+            cache=cache,
+            multithreading=multithreading,
+            workers=workers,
+            ignore_cache=ignore_cache,
+            abort_on_fail=abort_on_fail,
+            content_type=content_type,
+            clear_cache=clear_cache,
+            prefetch=prefetch,
+            drop_page_cache=drop_page_cache,
+            direct_io=direct_io,
+            small_file_threshold=small_file_threshold,
+            compression=compression
+        )
+        f_index = self._gen_index(file_args["file_name"])
+        self.ADDED_FILES[self.instance_index][f_index] = file_args
+        self._set_schedule(f_index, priority=priority, deadline=deadline)
 
-        file_name, file = UploadManager.process_file(file_name, file)
-        f_index = self._gen_index(file_name)
-        self.ADDED_FILES[self.instance_index][f_index] = ({
+    def _set_schedule(self, index, priority=0, deadline=None):
+        if isinstance(deadline, datetime.datetime):
+            deadline = deadline.timestamp()
+        if priority or deadline is not None:
+            self.FILE_SCHEDULES.setdefault(self.instance_index, {})[index] = {"priority": priority, "deadline": deadline}
+
+    @classmethod
+    def _pop_schedule(cls, item: dict) -> dict:
+        """
+        Remove scheduling arguments from `add_file` arguments and return them.
+        """
+        return {key: item.pop(key) for key in cls.SCHEDULE_ARGUMENTS if key in item}
+
+    def _get_file_args(
+            self,
+            file,
+            config,
+            file_name=None,
+            cache=None,
+            multithreading=False,
+            workers=None,
+            ignore_cache=False,
+            abort_on_fail=False,
+            content_type=None,
+            clear_cache=False,
+            prefetch=2,
+            drop_page_cache=False,
+            direct_io=False,
+            small_file_threshold=0,
+            compression=None
+    ):
+        """
+        Validate a file and return UploadManager arguments for it.
+        """
+        if type(file) is str:
+            # Opened when its upload starts.
+            file = FileSource.from_path(file)
+        if isinstance(file, Source):
+            # Named as UploadManager names it, so result keys match.
+            file_name = os.path.basename(file_name or file.name)
+        elif is_stream(file):
+            # Pipes, stdin, generators: read to their end while uploading.
+            file_name, file = StreamUploadManager.process_file(file_name, file)
+        else:
+            file_name, file = UploadManager.process_file(file_name, file)
+        return {
             "file_name": file_name,
             "file": file,
             "config": config,
@@ -50,9 +199,182 @@ class Client:
             "content_type": content_type,
             "ignore_cache": ignore_cache,
             "abort_on_fail": abort_on_fail,
-            "clear_cache": clear_cache
+            "clear_cache": clear_cache,
+            "prefetch": prefetch,
+            "buffer_pool": self.buffer_pool,
+            "drop_page_cache": drop_page_cache,
+            "direct_io": direct_io,
+            "cache_backend": self.cache_backend,
+            "small_file_threshold": small_file_threshold,
+            "compression": compression,
+            "dedup_index": self.dedup_index,
+            "rate_limiter": self.rate_limiter,
+            "rate_limit_state": self.rate_limit_state
+        }
+
+    def add_directory(
+            self,
+            path,
+            config,
+            include=None,
+            exclude=None,
+            discovery_workers=DEFAULT_DISCOVERY_WORKERS,
+            onerror=None,
+            **options
+    ):
+        """
+        Add every file under the directory at `path`.
+        Files are discovered while uploading, see `iter_directory`.
+        """
+        self.ADDED_ITERABLES.append(
+            self.iter_directory(
+                path,
+                config,
+                include=include,
+                exclude=exclude,
+                discovery_workers=discovery_workers,
+                onerror=onerror,
+                **options
+            )
+        )
+
+    def iter_directory(
+            self,
+            path,
+            config,
+            include=None,
+            exclude=None,
+            discovery_workers=DEFAULT_DISCOVERY_WORKERS,
+            onerror=None,
+            **options
+    ):
+        """
+        Yield `add_file` arguments of every file under the directory at `path`. Can be passed to `upload_iter`.
+
+        Files are uploaded under `config.prefix` + their directory relative to `path`, with their name.
+        Characters of directory names that are not allowed in prefixes are replaced with "_".
+
+        `include`, `exclude`: glob pattern(s) matched against the path relative to `path`, or the name.
+        `onerror`: called with errors of directories that cannot be scanned. Those are skipped.
+        `options`: `add_file` arguments for every file.
+        """
+        if not os.path.isdir(os.path.expanduser(path)):
+            raise FileDoesNotExistError("Directory not found at given path: %s" % path)
+        files = walk_directory(
+            path,
+            include=include,
+            exclude=exclude,
+            workers=discovery_workers,
+            onerror=onerror
+        )
+        return self._iter_directory_files(files, config, options)
+
+    def _iter_directory_files(self, files, config, options):
+        # Config of every relative directory.
+        configs = {"": config}
+        for relative_path, source in files:
+            relative_dir, name = posixpath.split(relative_path)
+            if relative_dir not in configs:
+                # Directory names can have characters prefixes cannot, e.g. "v1.2", "my docs"
+                configs[relative_dir] = FilelibConfig(
+                    storage=config.storage,
+                    prefix=posixpath.join(config.prefix.strip("/"), sanitize_prefix(relative_dir)),
+                    access=config.access
+                )
+            yield dict(options, file=source, file_name=name, config=configs[relative_dir])
+
+    def add_archive(self, path, config, include=None, exclude=None, max_compressed_members=MAX_COMPRESSED_TAR_MEMBERS, **options):
+        """
+        Add every file in the zip or tar archive at `path`, each uploaded as a file of its own without extracting it.
+        Members are listed while uploading, see `iter_archive`.
+        """
+        self.ADDED_ITERABLES.append(
+            self.iter_archive(path, config, include=include, exclude=exclude, max_compressed_members=max_compressed_members, **options)
+        )
+
+    def iter_archive(self, path, config, include=None, exclude=None, max_compressed_members=MAX_COMPRESSED_TAR_MEMBERS, **options):
+        """
+        Yield `add_file` arguments of every file in the zip or tar archive at `path`. Can be passed to `upload_iter`.
+        Stored members are read in place, compressed members are decompressed while uploading. See `filelib.archives`
+
+        `include`, `exclude`, `options`: see `iter_directory`, with paths in the archive.
+        `max_compressed_members`: compressed tar archives with more members to upload are refused, see `filelib.archives`
+        """
+        members = iter_archive(path, include=include, exclude=exclude, max_compressed_members=max_compressed_members)
+        return self._iter_directory_files(members, config, options)
+
+    def add_packed(
+            self,
+            files: typing.Iterable,
+            config,
+            name,
+            max_pack_size=DEFAULT_PACK_SIZE,
+            max_member_size=UploadManager.MIN_CHUNK_SIZE,
+            **options
+    ):
+        """
+        Pack small files into tar archives that are uploaded like any other file.
+        Archives are named `<name>-00000.tar` and hold up to `max_pack_size` bytes. Nothing is written to disk.
+        Every archive is uploaded with an index, `<name>-00000.tar.index.json`: name, offset and size of its members.
+
+        Items of `files`: a path, a `FileSource` or a dict of `add_file` arguments, e.g. `client.iter_directory(path, config)`
+        Members are named with their `file_name`, under their directory relative to `config.prefix` if they have a `config` below it.
+        Files bigger than `max_member_size` are not packed but uploaded on their own.
+        `options`: `add_file` arguments for the archives.
+        """
+        self.ADDED_ITERABLES.append(self._iter_packed(files, config, name, max_pack_size, max_member_size, options))
+
+    def _iter_packed(self, files, config, name, max_pack_size, max_member_size, options):
+        members = []
+        pack_size = 0
+        pack_count = 0
+        for item in files:
+            file_args = dict(item) if isinstance(item, dict) else {"file": item}
+            source = file_args["file"]
+            if type(source) is str:
+                source = FileSource.from_path(source)
+            if not isinstance(source, FileSource) or source.size > max_member_size:
+                yield {**options, "config": config, **file_args}
+                continue
+            member_name = self._get_member_name(file_args, source, config)
+            member_size = TarPackSource.get_member_size(source.size, member_name)
+            if members and pack_size + member_size > max_pack_size:
+                yield from self._get_pack_files(members, config, "%s-%05d.tar" % (name, pack_count), options)
+                members, pack_size = [], 0
+                pack_count += 1
+            members.append((member_name, source))
+            pack_size += member_size
+        if members:
+            yield from self._get_pack_files(members, config, "%s-%05d.tar" % (name, pack_count), options)
 
-        })
+    @staticmethod
+    def _get_member_name(file_args, source, config):
+        name = file_args.get("file_name") or os.path.basename(source.path)
+        prefix = getattr(file_args.get("config"), "prefix", "").strip("/")
+        root = config.prefix.strip("/")
+        if prefix != root and (not root or prefix.startswith(root + "/")):
+            # e.g. files of `iter_directory`: their directory is mapped onto the prefix.
+            return posixpath.join(prefix[len(root):].lstrip("/"), name)
+        return name
+
+    @staticmethod
+    def _get_pack_files(members, config, pack_name, options):
+        """
+        Return `add_file` arguments of the archive of `members` and its index.
+        """
+        pack = TarPackSource(pack_name, members)
+        index = json.dumps(pack.index()).encode("utf8")
+        return [
+            dict(options, file=pack, file_name=pack_name, config=config, content_type=CONTENT_TYPE_TAR),
+            dict(options, file=io.BytesIO(index), file_name=pack_name + ".index.json", config=config, content_type=CONTENT_TYPE_JSON)
+        ]
+
+    def set_bandwidth_limit(self, rate, storage=None):
+        """
+        Change the bandwidth limit in bytes per second, of every upload or uploads to `storage`.
+        Uploads in progress are affected as well. None removes the limit.
+        """
+        self.rate_limiter.set_rate(rate, storage=storage)
 
     def get_files(self):
         return self.ADDED_FILES.get(self.instance_index)
@@ -68,17 +390,320 @@ class Client:
         instance_files = self.ADDED_FILES.get(self.instance_index, {})
         return f"{len(instance_files)}_{zlib.crc32(bytes(f_index_joined, 'utf8'))}"
 
-    def single_process(self):
-        for index, _file_args in self.get_files().items():
-            up = UploadManager(**_file_args)
+    def single_process(
+            self,
+            sink=None,
+            batch_size=0,
+            workers=1,
+            policy=SCHEDULE_PRIORITY,
+            large_file_size=DEFAULT_LARGE_FILE_SIZE,
+            large_file_share=0.25
+    ):
+        if workers < 1:
+            raise ValidationError("`workers` must be at least 1. Value provided: %d" % workers)
+        completed = sink.completed() if sink is not None else set()
+        scheduler = FileScheduler(policy, workers=workers, large_file_size=large_file_size, large_file_share=large_file_share)
+        window = len(self.get_files()) + self.SCHEDULE_LOOKAHEAD
+        files = self._iter_scheduled(self._iter_added_files(completed), scheduler, window)
+        files = self._iter_created(files, batch_size)
+        # Errors of failed files. Their results are recorded, the files queued behind them are uploaded still.
+        errors = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="filelib-upload") as executor:
+            pending = set()
+            while True:
+                # The next file is scheduled only once a worker is free for it.
+                if len(pending) >= workers:
+                    pending = self._wait_for_files(pending, errors)
+                scheduled = next(files, None)
+                if scheduled is None:
+                    break
+                item, file_args, entity = scheduled
+                pending.add(executor.submit(self._upload_scheduled, scheduler, item, file_args, sink, entity))
+            while pending:
+                pending = self._wait_for_files(pending, errors)
+        if errors:
+            raise errors[0]
+
+    @staticmethod
+    def _wait_for_files(pending, errors):
+        """
+        Wait for a file to finish, adding its error to `errors`. Return the files still uploading.
+        """
+        done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            exc = future.exception()
+            if exc is not None:
+                errors.append(exc)
+        return pending
+
+    def _upload_scheduled(self, scheduler: FileScheduler, item: ScheduledFile, file_args, sink, entity=None):
+        try:
+            self._upload_file(file_args, functools.partial(self._record_result, item.index, sink), entity=entity)
+        finally:
+            scheduler.done(item)
+
+    def _iter_scheduled(self, files, scheduler: FileScheduler, window):
+        """
+        Take (index, UploadManager arguments) pairs and yield (ScheduledFile, UploadManager arguments)
+        in the order of `scheduler`, which holds up to `window` files at a time.
+        """
+        files = iter(files)
+        schedules = self.FILE_SCHEDULES.get(self.instance_index, {})
+        while True:
+            for index, file_args in itertools.islice(files, max(window - len(scheduler), 0)):
+                # Size of streams is not known until they end.
+                size = math.inf if is_stream(file_args["file"]) else EntityBatcher.get_file_size(file_args["file"])
+                scheduler.push(index, file_args, size, **schedules.pop(index, {}))
+            item = scheduler.pop()
+            if item is None:
+                return
+            yield item, item.file_args
+
+    def _iter_added_files(self, completed):
+        """
+        Yield (index, UploadManager arguments) of added files and files of added directories.
+        Files in `completed` are skipped.
+        """
+        files = self.get_files()
+        for index in list(files):
+            # Release the added file entry as soon as it is processed.
+            file_args = files.pop(index)
+            if self._get_result_key(file_args) not in completed:
+                yield index, file_args
+            else:
+                self.FILE_SCHEDULES.get(self.instance_index, {}).pop(index, None)
+        while self.ADDED_ITERABLES:
+            for item in self.ADDED_ITERABLES.pop(0):
+                item = dict(item)
+                schedule = self._pop_schedule(item)
+                file_args = self._get_file_args(**item)
+                if self._get_result_key(file_args) not in completed:
+                    index = self._gen_index(self._get_result_key(file_args))
+                    self._set_schedule(index, **schedule)
+                    yield index, file_args
+
+    def _iter_created(self, files, batch_size):
+        """
+        Create small files in batches of `batch_size` ahead of their upload. 0 disables.
+        """
+        if not batch_size:
+            return ((key, file_args, None) for key, file_args in files)
+        return EntityBatcher(self.auth, batch_size=batch_size, rate_limit_state=self.rate_limit_state).iter_created(files)
+
+    @staticmethod
+    def _get_result_key(file_args):
+        return result_key(file_args["config"].prefix, file_args["file_name"])
+
+    def _record_result(self, index, sink, result):
+        """
+        Keep a compact UploadResult of a processed file, or write it to `sink` if one is provided.
+        """
+        if sink is not None:
+            sink.write(result)
+        else:
+            self.PROCESSED_FILES[self.instance_index][index] = result
+
+    def _upload_file(self, file_args, on_result, entity=None):
+        """
+        Upload a single file and call `on_result` with its UploadResult, even if the upload raises.
+        `entity`: the file entity if it is created already. See `UploadManager.set_entity`
+        """
+        source = file_args["file"]
+        if not isinstance(source, Source):
+            return self._run_upload(file_args, on_result, entity)
+        with self._open_files:
+            try:
+                file = source.open()
+            except Exception as exc:
+                # e.g. deleted after it was added. Does not stop the other files.
+                return on_result(self._get_failed_result(file_args, exc))
+            try:
+                return self._run_upload(dict(file_args, file=file), on_result, entity)
+            finally:
+                file.close()
+
+    @staticmethod
+    def _get_failed_result(file_args, exc) -> UploadResult:
+        """
+        UploadResult of a file whose upload could not be started.
+        """
+        file = file_args["file"]
+        return UploadResult(
+            file_name=str(file_args.get("file_name") or getattr(file, "path", file)),
+            prefix=getattr(file_args.get("config"), "prefix", ""),
+            status=UPLOAD_FAILED,
+            error=str(exc)
+        )
+
+    def _run_upload(self, file_args, on_result, entity=None):
+        manager_class = StreamUploadManager if is_stream(file_args["file"]) else UploadManager
+        up = manager_class(**file_args)
+        if entity:
+            up.set_entity(**entity)
+        try:
             up.upload()
-            self.PROCESSED_FILES[self.instance_index][index] = up
+        except Exception as exc:
+            up.set_upload_status(UPLOAD_FAILED)
+            up.error = up.error or str(exc)
+            raise
+        finally:
+            on_result(up.to_result())
+            up.close()
 
     def _set_instance_index(self, inst_index):
         self.instance_index = inst_index
 
-    def upload(self):
+    def upload(
+            self,
+            sink=None,
+            batch_size=0,
+            workers=1,
+            policy=SCHEDULE_PRIORITY,
+            large_file_size=DEFAULT_LARGE_FILE_SIZE,
+            large_file_share=0.25
+    ):
         """
         Initiate the upload for added files.
+
+        `sink`: a `filelib.sinks.BaseResultSink` to stream results to instead of `PROCESSED_FILES`.
+        Files the sink has recorded as completed are skipped.
+        `batch_size`: create small files in batches of this size with a single request each. 0 disables.
+        `workers`: files uploaded at the same time.
+        `policy`: order of the files, "priority", "sjf" or "edf". See `filelib.scheduling`
+        Files of at least `large_file_size` bytes get `large_file_share` of `workers`, at least one of two or more, while any are queued.
+
+        A file failing does not stop the rest: every file is uploaded and has its result recorded,
+        then the error of the first file that failed is raised.
+        """
+        return self.single_process(
+            sink=sink,
+            batch_size=batch_size,
+            workers=workers,
+            policy=policy,
+            large_file_size=large_file_size,
+            large_file_share=large_file_share
+        )
+
+    def upload_iter(self, files: typing.Iterable, config=None, sink=None, concurrency=4, batch_size=0, **options):
+        """
+        Upload files consumed lazily from `files`, e.g. a generator over a database cursor or a directory walk.
+        Uploading starts with the first file; the next file is taken from `files`
+        only when fewer than `concurrency` files are being uploaded.
+
+        Items of `files`: a path, a file object or a dict of `add_file` arguments.
+        `config` and `options` are the `add_file` arguments used for items that do not provide them.
+
+        Yield an UploadResult for every file as it finishes. Results are not kept in `PROCESSED_FILES`.
+        Files `sink` has recorded as completed are skipped, the rest are written to it.
+        A file failing does not stop the rest.
+        `batch_size`: see `upload`
         """
-        return self.single_process()
+        if concurrency < 1:
+            raise ValidationError("`concurrency` must be at least 1. Value provided: %d" % concurrency)
+        completed = sink.completed() if sink is not None else set()
+        options = dict(options, config=config)
+
+        def upload(file_args, entity):
+            results = []
+            try:
+                self._upload_file(file_args, results.append, entity=entity)
+            except Exception as exc:
+                if not results:
+                    # Raised before the upload started, e.g. UploadManager could not be created.
+                    return self._get_failed_result(file_args, exc)
+            return results[0]
+
+        def report(result):
+            if sink is not None:
+                sink.write(result)
+            return result
+
+        def collect(pending):
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+                yield report(future.result())
+
+        # Results of files that are not valid.
+        failed = collections.deque()
+
+        def prepare():
+            for item in files:
+                file_args = dict(options, **item) if isinstance(item, dict) else dict(options, file=item)
+                # Files are uploaded in the order they are consumed.
+                self._pop_schedule(file_args)
+                try:
+                    file_args = self._get_file_args(**file_args)
+                except FilelibBaseException as exc:
+                    failed.append(self._get_failed_result(file_args, exc))
+                    continue
+                if self._get_result_key(file_args) not in completed:
+                    yield None, file_args
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+            pending = set()
+            for _key, file_args, entity in self._iter_created(prepare(), batch_size):
+                while failed:
+                    yield report(failed.popleft())
+                # Backpressure: wait for a file to finish before taking the next one.
+                if len(pending) >= concurrency:
+                    yield from collect(pending)
+                pending.add(executor.submit(upload, file_args, entity))
+            while failed:
+                yield report(failed.popleft())
+            while pending:
+                yield from collect(pending)
+
+    def sweep_stale_uploads(self, older_than, cache_backend=None, workers=8):
+        """
+        Cancel uploads in the resume cache that are not updated for `older_than` seconds.
+        Running uploads update it every CACHE_REFRESH_INTERVAL seconds as their parts are sent:
+        `older_than` must be longer than that and than sending a single part takes.
+        Filelib API deletes the parts uploaded so far; local entries are purged as each cancel succeeds.
+        Cancels are sent concurrently over a shared connection pool.
+
+        Return a dict: {"cancelled": [namespace, ...], "failed": {namespace: error}}
+        """
+        backend = cache_backend or self.cache_backend
+        if backend is None:
+            raise ValidationError("A `cache_backend` is required to find stale uploads.")
+        result = {"cancelled": [], "failed": {}}
+        threshold = time.time() - older_than
+
+        def cancel(client, namespace, location):
+            req = client.delete(location, headers=self.auth.to_headers())
+            # 404: Already deleted on the server.
+            if not req.is_success and req.status_code != 404:
+                raise FilelibAPIException(*parse_api_err(req))
+            backend.truncate(namespace)
+
+        def collect(pending):
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                namespace = pending.pop(future)
+                try:
+                    future.result()
+                    result["cancelled"].append(namespace)
+                except Exception as exc:
+                    result["failed"][namespace] = str(exc)
+
+        limits = httpx.Limits(max_connections=workers, max_keepalive_connections=workers)
+        with httpx.Client(limits=limits) as client:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                pending = {}
+                # Uploads past the backend ttl are the oldest abandoned ones, they are cancelled as well.
+                for namespace, updated_at in list(backend.namespaces(include_expired=True)):
+                    status = backend.get(namespace, CACHE_STATUS_KEY, include_expired=True)
+                    if updated_at >= threshold or status in FINISHED_STATUSES:
+                        continue
+                    location = backend.get(namespace, UploadManager._CACHE_ENTITY_KEY, include_expired=True)
+                    if not location:
+                        # Nothing was created on the server.
+                        backend.truncate(namespace)
+                        continue
+                    if len(pending) >= workers * UploadManager.SUBMISSION_WINDOW_FACTOR:
+                        collect(pending)
+                    pending[executor.submit(cancel, client, namespace, location)] = namespace
+                while pending:
+                    collect(pending)
+        return result
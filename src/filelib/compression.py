@@ -0,0 +1,75 @@
+"""
+Compress parts before they are sent, with the part's `Content-Encoding` telling Filelib API how to decode it.
+
+zstd is used if `zstandard` is installed, gzip otherwise.
+Parts are cut from the original content, so part sizes keep within the chunk size limits of the server;
+only the bytes on the wire shrink.
+"""
+import gzip
+import typing
+
+COMPRESSION_AUTO = "auto"
+COMPRESSION_ZSTD = "zstd"
+COMPRESSION_GZIP = "gzip"
+COMPRESSION_OPTIONS = (COMPRESSION_AUTO, COMPRESSION_ZSTD, COMPRESSION_GZIP)
+
+
+class Codec:
+    # Value of Content-Encoding header
+    name: str
+
+    def compress(self, data) -> bytes:
+        raise NotImplementedError
+
+
+class GzipCodec(Codec):
+    name = COMPRESSION_GZIP
+
+    def __init__(self, level: int = 1):
+        # Fastest level: compression must keep up with the network.
+        self.level = level
+
+    def compress(self, data):
+        return gzip.compress(data, compresslevel=self.level)
+
+
+class ZstdCodec(Codec):
+    name = COMPRESSION_ZSTD
+
+    def __init__(self, level: int = 3):
+        import zstandard
+        self.level = level
+        self._zstandard = zstandard
+
+    def compress(self, data):
+        # Compressor objects are not thread safe; parts are compressed in worker threads.
+        return self._zstandard.ZstdCompressor(level=self.level).compress(data)
+
+
+def get_codec(compression: str = COMPRESSION_AUTO) -> Codec:
+    """
+    Return the codec for the compression option. `auto` prefers zstd and falls back to gzip.
+    """
+    if compression not in COMPRESSION_OPTIONS:
+        raise ValueError("Compression must be one of: %s. Value provided: %s" % (", ".join(COMPRESSION_OPTIONS), compression))
+    if compression == COMPRESSION_GZIP:
+        return GzipCodec()
+    try:
+        return ZstdCodec()
+    except ImportError:
+        if compression == COMPRESSION_ZSTD:
+            raise
+        return GzipCodec()
+
+
+def get_ratio(codec: Codec, samples: typing.Iterable[bytes]) -> float:
+    """
+    Return how many times smaller the samples get when compressed.
+    """
+    raw = compressed = 0
+    for sample in samples:
+        if not sample:
+            continue
+        raw += len(sample)
+        compressed += len(codec.compress(sample))
+    return raw / compressed if compressed else 1.0
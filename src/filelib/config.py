@@ -7,6 +7,15 @@ from filelib.constants import (
 )
 from filelib.exceptions import ConfigPrefixInvalidError, ConfigValidationError
 
+PREFIX_CHARACTERS = frozenset(string.ascii_letters + string.digits + "-" + "_" + "/")
+
+
+def sanitize_prefix(prefix: str) -> str:
+    """
+    Replace characters that are not allowed in a prefix with "_". e.g. "my docs/v1.2" -> "my_docs/v1_2"
+    """
+    return "".join(character if character in PREFIX_CHARACTERS else "_" for character in prefix)
+
 
 class FilelibConfig:
 
@@ -25,8 +34,7 @@ class FilelibConfig:
 
         if not self.prefix:
             return True
-        allowed_characters = string.ascii_letters + string.digits + "-" + "_" + "/"
-        if not set(self.prefix) <= set(allowed_characters):
+        if not set(self.prefix) <= PREFIX_CHARACTERS:
             raise ConfigPrefixInvalidError
         return True
 
@@ -2,6 +2,14 @@
 # These values must be configurable for local dev testing
 AUTHENTICATION_URL = "https://api.filelib.com/auth/"
 FILE_UPLOAD_URL = "https://api.filelib.com/upload/"
+# Create and upload a small file with a single multipart request.
+FILE_UPLOAD_SINGLE_URL = "https://api.filelib.com/upload/single/"
+# Create many file entities with a single request.
+FILE_UPLOAD_BATCH_URL = "https://api.filelib.com/upload/batch/"
+# Create a file from the content of an uploaded file.
+FILE_UPLOAD_COPY_URL = "https://api.filelib.com/upload/copy/"
+# Find an uploaded file by the digest of its content.
+FILE_DEDUP_URL = "https://api.filelib.com/upload/dedup/"
 
 # Tell the API endpoint what SDK is communicating.
 REQUEST_CLIENT_SOURCE = "python_filelib"
@@ -43,6 +51,12 @@ UPLOAD_LOCATION_HEADER = "Location"
 FILE_UPLOAD_STATUS_HEADER = "Filelib-File-Upload-Status"
 # GENERIC HEADERS
 CONTENT_TYPE_HEADER = "Content-Type"
+CONTENT_LENGTH_HEADER = "Content-Length"
+CONTENT_ENCODING_HEADER = "Content-Encoding"
+RETRY_AFTER_HEADER = "Retry-After"
+# Ref: https://datatracker.ietf.org/doc/draft-ietf-httpapi-ratelimit-headers/
+RATE_LIMIT_REMAINING_HEADER = "RateLimit-Remaining"
+RATE_LIMIT_RESET_HEADER = "RateLimit-Reset"
 # Error Headers
 ERROR_MESSAGE_HEADER = "Filelib-Error-Message"
 ERROR_CODE_HEADER = "Filelib-Error-Code"
@@ -54,11 +68,35 @@ UPLOAD_CANCELLED = "cancelled"  # User or server cancelled the upload.
 UPLOAD_COMPLETED = "completed"  # All parts are uploaded and transfer completed entirely.
 UPLOAD_FAILED = "failed"  # Error occurred during upload progress.
 
+# Response status codes that will fail every remaining part as well. Upload is stopped immediately.
+FATAL_UPLOAD_STATUS_CODES = (401, 403, 404)
+# Single request upload(or batch create) responses that mean the API does not support it.
+# Chunked upload(or a create request per file) is used instead.
+UNSUPPORTED_ENDPOINT_STATUS_CODES = (404, 405, 501)
+
+# Responses telling the client to slow down. Filelib API: 429, S3: 503 SlowDown
+THROTTLE_STATUS_CODES = (429, 503)
+MAX_THROTTLE_RETRIES = 5  # Times a throttled part is sent again.
+MAX_THROTTLE_DELAY = 60  # Seconds to wait when the response does not say how long.
+
+# RESUME CACHE
+DEFAULT_CACHE_TTL = 7 * 24 * 60 * 60  # Seconds an upload can be resumed for.
+CACHE_REFRESH_INTERVAL = 60  # Seconds between writes marking a running upload as alive.
+
+# CLIENT
+DEFAULT_MAX_OPEN_FILES = 256  # Files a Client keeps open at any given time.
+DEFAULT_DISCOVERY_WORKERS = 8  # Threads scanning directories in `Client.add_directory`.
+DEFAULT_CREATE_BATCH_SIZE = 100  # Files created with a single request. See `filelib.batch`
+DEFAULT_PACK_SIZE = 512 * 2 ** 20  # Bytes of small files packed into a single archive. See `filelib.packing`
+DEFAULT_LARGE_FILE_SIZE = 2 ** 30  # Files that get a guaranteed share of upload workers. See `filelib.scheduling`
+
 # MULTIPROCESSING
 SHARED_MEMORY_NAME = "filelib-api-multiprocessing-shared-memory"
 SHARED_MEMORY_START = "{key:0>10}".format(key="started")  # 10 chars
 SHARED_MEMORY_TERMINATE = "{key:0>10}".format(key="terminate")   # 10 chars
+SHARED_RATE_LIMIT_NAME = "filelib-api-rate-limit"
 
 # CONTENT TYPE DECLARATIONS
 CONTENT_TYPE_XML = "application/xml"
 CONTENT_TYPE_JSON = "application/json"
+CONTENT_TYPE_TAR = "application/x-tar"
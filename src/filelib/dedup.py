@@ -0,0 +1,112 @@
+"""
+Index of uploaded content to skip uploading identical files again.
+
+Files are identified by the sha256 digest of their content and their size.
+When a file with the same content is uploaded already, `UploadManager` asks Filelib API
+to copy it instead of sending the content again.
+"""
+import hashlib
+import typing
+
+import httpx
+
+from .cache import RESERVED_NAMESPACE_PREFIX, BaseCacheBackend, MemoryCache
+from .constants import FILE_DEDUP_URL, UNSUPPORTED_ENDPOINT_STATUS_CODES
+from .exceptions import FilelibAPIException
+from .ratelimit import RateLimitState, send_throttled
+from .utils import parse_api_err
+
+if typing.TYPE_CHECKING:
+    from .authentication import Authentication
+
+DIGEST_ALGORITHM = "sha256"
+
+
+def get_digest(file, lock=None, block_size: int = 2 ** 20) -> str:
+    """
+    Return "sha256:<hex>" of the content of the file object. `lock` is held while the file is read.
+    """
+    digest = hashlib.new(DIGEST_ALGORITHM)
+    offset = 0
+    while True:
+        if lock is not None:
+            with lock:
+                file.seek(offset)
+                block = file.read(block_size)
+        else:
+            file.seek(offset)
+            block = file.read(block_size)
+        if not block:
+            break
+        digest.update(block)
+        offset += len(block)
+    return "%s:%s" % (DIGEST_ALGORITHM, digest.hexdigest())
+
+
+class DedupIndex:
+    """
+    Map (digest, size) of uploaded files to their URL.
+    Entries are kept in a cache backend, SQLiteCache keeps them between runs.
+    `remote`: look up digests missing locally from Filelib API as well.
+    """
+    # Reserved, so it is never taken for an abandoned upload. See `filelib.cache`
+    NAMESPACE = RESERVED_NAMESPACE_PREFIX + "dedup"
+
+    def __init__(self, backend: typing.Optional[BaseCacheBackend] = None, remote: bool = False):
+        self.backend = backend or MemoryCache(ttl=None)
+        self.remote = remote
+        # Set to False once Filelib API responds that lookups are not supported.
+        self._remote_supported = True
+
+    @staticmethod
+    def _key(digest: str, size: int) -> str:
+        return "%s:%d" % (digest, size)
+
+    def get(
+            self,
+            digest: str,
+            size: int,
+            auth: typing.Optional["Authentication"] = None,
+            rate_limit_state: typing.Optional[RateLimitState] = None
+    ) -> typing.Optional[str]:
+        url = self.backend.get(self.NAMESPACE, self._key(digest, size))
+        if url is None and self.remote and auth is not None:
+            url = self.lookup(digest, size, auth, rate_limit_state=rate_limit_state)
+            if url:
+                self.add(digest, size, url)
+        return url
+
+    def lookup(
+            self,
+            digest: str,
+            size: int,
+            auth: "Authentication",
+            rate_limit_state: typing.Optional[RateLimitState] = None
+    ) -> typing.Optional[str]:
+        """
+        Ask Filelib API for the URL of a file with the same content.
+        Throttled lookups pause every sender sharing `rate_limit_state`. See `filelib.ratelimit`
+        """
+        if not self._remote_supported:
+            return None
+        params = {"digest": digest, "file_size": size}
+        with httpx.Client() as client:
+            req = send_throttled(
+                lambda: client.get(FILE_DEDUP_URL, params=params, headers=auth.to_headers()),
+                rate_limit_state or RateLimitState()
+            )
+        if req.status_code == 404:
+            # No such content.
+            return None
+        if req.status_code in UNSUPPORTED_ENDPOINT_STATUS_CODES:
+            self._remote_supported = False
+            return None
+        if not req.is_success:
+            raise FilelibAPIException(*parse_api_err(req))
+        return req.json()["data"].get("url")
+
+    def add(self, digest: str, size: int, url: str):
+        self.backend.set(self.NAMESPACE, self._key(digest, size), url)
+
+    def discard(self, digest: str, size: int):
+        self.backend.delete(self.NAMESPACE, self._key(digest, size))
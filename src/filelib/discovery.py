@@ -0,0 +1,92 @@
+"""
+Find files to upload in a directory tree.
+
+Directories are scanned with `os.scandir` on a thread pool, so listing a tree on a network
+file system is not bound by the latency of a single directory listing at a time.
+Files are yielded as soon as their directory is scanned.
+"""
+import collections
+import concurrent.futures
+import fnmatch
+import os
+import typing
+
+from .sources import FileSource
+
+Patterns = typing.Optional[typing.Union[str, typing.Iterable[str]]]
+
+
+def _to_patterns(patterns: Patterns) -> typing.Tuple[str, ...]:
+    if not patterns:
+        return ()
+    if isinstance(patterns, str):
+        return (patterns,)
+    return tuple(patterns)
+
+
+def _matches(relative_path: str, name: str, patterns: typing.Tuple[str, ...]) -> bool:
+    """
+    Patterns match either the path relative to the root, or the name.
+    """
+    return any(fnmatch.fnmatchcase(relative_path, p) or fnmatch.fnmatchcase(name, p) for p in patterns)
+
+
+def walk_directory(
+        root: str,
+        include: Patterns = None,
+        exclude: Patterns = None,
+        workers: int = 8,
+        follow_symlinks: bool = False,
+        onerror: typing.Optional[typing.Callable[[OSError], typing.Any]] = None
+) -> typing.Iterator[typing.Tuple[str, FileSource]]:
+    """
+    Yield (relative_path, FileSource) of every file under `root`. Relative paths are separated by "/".
+
+    `include`: glob pattern(s) a file must match.
+    `exclude`: glob pattern(s) of files and directories to skip. Excluded directories are not scanned.
+    `onerror`: called with the OSError of a directory that cannot be scanned, as `os.walk` does.
+    """
+    if workers < 1:
+        raise ValueError("Directory discovery requires at least one worker. Value provided: %d" % workers)
+    root = os.path.abspath(os.path.expanduser(root))
+    include = _to_patterns(include)
+    exclude = _to_patterns(exclude)
+
+    def scan(path, relative_dir):
+        files, directories = [], []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                relative_path = relative_dir + entry.name
+                if exclude and _matches(relative_path, entry.name, exclude):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=follow_symlinks):
+                        directories.append((entry.path, relative_path + "/"))
+                    elif entry.is_file():
+                        if include and not _matches(relative_path, entry.name, include):
+                            continue
+                        stat = entry.stat()
+                        files.append((relative_path, FileSource(entry.path, stat.st_size, stat.st_mtime)))
+                except OSError as exc:
+                    # Removed while scanning.
+                    if onerror:
+                        onerror(exc)
+        return files, directories
+
+    # Directories waiting to be scanned are kept as paths; only a window of them is in the executor.
+    waiting = collections.deque([(root, "")])
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="filelib-discovery") as executor:
+        pending = set()
+        while waiting or pending:
+            while waiting and len(pending) < workers * 2:
+                pending.add(executor.submit(scan, *waiting.popleft()))
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                try:
+                    files, directories = future.result()
+                except OSError as exc:
+                    if onerror:
+                        onerror(exc)
+                    continue
+                waiting.extend(directories)
+                yield from files
@@ -172,3 +172,21 @@ class ChunkUploadFailedError(FilelibBaseException):
     message = "Chunk Upload Failed"
     code = 400
     error_code = "CHUNK_UPLOAD_FAILED"
+
+
+class UploadAbortedError(FilelibBaseException):
+    """
+    Raised when a chunk upload is interrupted because the upload was aborted.
+    """
+    message = "Upload was aborted."
+    code = 400
+    error_code = "UPLOAD_ABORTED"
+
+
+class SourceChangedError(FilelibBaseException):
+    """
+    Raised when a file changed after it was added and its content no longer matches its recorded size.
+    """
+    message = "File changed after it was added."
+    code = 400
+    error_code = "SOURCE_CHANGED"
@@ -0,0 +1,154 @@
+"""
+Pack many small files into tar archives that are uploaded as a single file.
+
+A `TarPackSource` lays out the archive from the sizes of its members without reading them:
+the archive is never written to disk, parts are read straight from the member files
+when `UploadManager` reads them. `index()` lists where the content of every member is in the archive,
+so a member can be read with a ranged request without extracting the archive.
+"""
+import bisect
+import io
+import tarfile
+import typing
+
+from .exceptions import SourceChangedError
+from .sources import FileSource, Source
+
+
+class PackMember:
+    __slots__ = ("name", "source", "header_offset", "offset")
+
+    def __init__(self, name: str, source: FileSource, header_offset: int, offset: int):
+        self.name = name
+        self.source = source
+        # Where the tar header of the member starts.
+        self.header_offset = header_offset
+        # Where the content of the member starts.
+        self.offset = offset
+
+    @property
+    def size(self) -> int:
+        return self.source.size
+
+
+class TarPackSource(Source):
+    __slots__ = ("name", "members", "size", "_segments", "_starts")
+
+    def __init__(self, name: str, members: typing.Iterable[typing.Tuple[str, FileSource]]):
+        self.name = name
+        self.members: typing.List[PackMember] = []
+        # (start, length, header bytes or member) of every contiguous byte range of the archive.
+        self._segments = []
+        position = 0
+        for member_name, source in members:
+            info = tarfile.TarInfo(member_name)
+            info.size = source.size
+            info.mtime = int(source.mtime)
+            info.mode = 0o644
+            header = info.tobuf(format=tarfile.PAX_FORMAT, encoding="utf-8", errors="surrogateescape")
+            member = PackMember(member_name, source, position, position + len(header))
+            self.members.append(member)
+            self._segments.append((position, len(header), header))
+            position += len(header)
+            self._segments.append((position, source.size, member))
+            position += source.size
+            padding = -source.size % tarfile.BLOCKSIZE
+            if padding:
+                self._segments.append((position, padding, bytes(padding)))
+                position += padding
+        # End of archive: two empty blocks.
+        self._segments.append((position, 2 * tarfile.BLOCKSIZE, bytes(2 * tarfile.BLOCKSIZE)))
+        self.size = position + 2 * tarfile.BLOCKSIZE
+        self._starts = [segment[0] for segment in self._segments]
+
+    @staticmethod
+    def get_member_size(size: int, name: str = "") -> int:
+        """
+        Estimate the bytes a member of `size` takes in the archive.
+        Names longer than the tar header allows take an extra header.
+        """
+        header = tarfile.BLOCKSIZE * (1 if len(name.encode("utf8")) < tarfile.LENGTH_NAME else 4)
+        return header + size + (-size % tarfile.BLOCKSIZE)
+
+    def index(self) -> typing.List[dict]:
+        return [{"name": member.name, "offset": member.offset, "size": member.size} for member in self.members]
+
+    def open(self) -> "TarPackReader":
+        return TarPackReader(self)
+
+    def __repr__(self):
+        return "<TarPackSource %s: %d members>" % (self.name, len(self.members))
+
+
+class TarPackReader(io.RawIOBase):
+    """
+    Seekable, read-only view of the archive of a `TarPackSource`.
+    Keeps the last member file read from open, since parts are read in order.
+    """
+
+    def __init__(self, pack: TarPackSource):
+        super().__init__()
+        self.pack = pack
+        self._position = 0
+        self._member: typing.Optional[PackMember] = None
+        self._member_file = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.pack.size
+        if offset < 0:
+            raise ValueError("Negative seek position %d" % offset)
+        self._position = offset
+        return self._position
+
+    def _read_member(self, member: PackMember, offset: int, view: memoryview) -> int:
+        if self._member is not member:
+            self._close_member()
+            self._member_file = member.source.open()
+            self._member = member
+        self._member_file.seek(offset)
+        filled = 0
+        while filled < len(view):
+            read = self._member_file.readinto(view[filled:])
+            if not read:
+                raise SourceChangedError("`%s` is smaller than when it was packed." % member.source.path)
+            filled += read
+        return filled
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer).cast("B")
+        filled = 0
+        segments = self.pack._segments
+        index = bisect.bisect_right(self.pack._starts, self._position) - 1
+        while filled < len(view) and self._position < self.pack.size:
+            start, length, content = segments[index]
+            offset = self._position - start
+            size = min(length - offset, len(view) - filled)
+            if isinstance(content, PackMember):
+                self._read_member(content, offset, view[filled:filled + size])
+            else:
+                view[filled:filled + size] = content[offset:offset + size]
+            filled += size
+            self._position += size
+            index += 1
+        return filled
+
+    def _close_member(self):
+        if self._member_file is not None:
+            self._member_file.close()
+        self._member = self._member_file = None
+
+    def close(self):
+        self._close_member()
+        super().close()
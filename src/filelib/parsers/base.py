@@ -1,6 +1,7 @@
 import typing
 
-import httpx
+if typing.TYPE_CHECKING:
+    import httpx
 
 
 class Error(typing.Tuple):
@@ -11,7 +12,7 @@ class Error(typing.Tuple):
 
 class BaseErrorFormatter:
 
-    def __init__(self, response: httpx.Response):
+    def __init__(self, response: "httpx.Response"):
         self.response = response
 
     def format(self) -> typing.Tuple[str, int, str]:
@@ -11,8 +11,9 @@
 import json
 from typing import Any, MutableMapping
 
-import xmltojson
-
 
 def xmlparser(xml) -> MutableMapping[Any, Any]:
+    # Only needed when a direct upload fails, no need to load it up front.
+    import xmltojson
+
     return json.loads(xmltojson.parse(xml))
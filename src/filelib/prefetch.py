@@ -0,0 +1,93 @@
+"""
+Read chunks ahead of the upload workers so disk reads overlap with network sends.
+
+The number of chunks held in memory is bounded by `capacity`:
+a slot is taken before a chunk is read and given back with `release` once the chunk is sent.
+"""
+import queue
+import threading
+import typing
+
+
+class ChunkPrefetcher:
+    # Marks the end of the part numbers in the queue.
+    _DONE = object()
+
+    def __init__(
+            self,
+            read_chunk: typing.Callable[[int], typing.Any],
+            part_numbers: typing.Iterable[int],
+            capacity: int,
+            advise: typing.Optional[typing.Callable[[int], typing.Any]] = None,
+            discard: typing.Optional[typing.Callable[[typing.Any], typing.Any]] = None
+    ):
+        if capacity < 1:
+            raise ValueError("Prefetch capacity must be at least 1. Value provided: %d" % capacity)
+        self.read_chunk = read_chunk
+        self.part_numbers = part_numbers
+        self.capacity = capacity
+        self.advise = advise
+        # Called with chunks that are read but never consumed, e.g. to give their buffers back.
+        self.discard = discard
+        self._slots = threading.Semaphore(capacity)
+        self._queue = queue.Queue()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._read_ahead, name="filelib-prefetch", daemon=True)
+
+    def _read_ahead(self):
+        try:
+            for part_number in self.part_numbers:
+                # Let the OS start reading this part while we wait for a free slot.
+                if self.advise:
+                    self.advise(part_number)
+                self._slots.acquire()
+                if self._closed.is_set():
+                    return
+                self._queue.put((part_number, self.read_chunk(part_number)))
+        except Exception as exc:
+            self._queue.put(exc)
+        finally:
+            self._queue.put(self._DONE)
+
+    def __iter__(self) -> typing.Iterator[typing.Tuple[int, typing.Any]]:
+        """
+        Yield (part_number, chunk) in the order of part numbers.
+        Errors raised while reading are raised here.
+        """
+        while True:
+            item = self._queue.get()
+            if item is self._DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def release(self):
+        """
+        Free the slot of a chunk that is done being sent.
+        """
+        self._slots.release()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def close(self):
+        """
+        Stop reading ahead. Chunks that are not consumed yet are discarded.
+        """
+        self._closed.set()
+        # Wake the reader up if it is waiting for a slot.
+        self._slots.release()
+        if self._thread.is_alive():
+            self._thread.join()
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if isinstance(item, tuple) and self.discard:
+                self.discard(item[1])
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
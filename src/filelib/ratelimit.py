@@ -0,0 +1,254 @@
+"""
+Limit the bandwidth uploads use.
+
+Every block of a part(`UploadManager.STREAM_BLOCK_SIZE`) draws from a token bucket before it is sent,
+so the rate stays smooth instead of bursting a whole part at a time.
+A single limiter is shared by every worker and every file of a `Client`.
+
+When Filelib API or a storage platform throttles(429, 503 SlowDown), every sender pauses together
+until the time the response asks for, instead of each worker retrying on its own.
+The pause is kept in a `RateLimitState`, shared by the workers of a `Client`,
+or in a `SharedRateLimitState`, shared by every process of the host.
+"""
+import email.utils
+import struct
+import threading
+import time
+import typing
+
+import httpx
+
+from .constants import (
+    MAX_THROTTLE_DELAY,
+    MAX_THROTTLE_RETRIES,
+    RATE_LIMIT_REMAINING_HEADER,
+    RATE_LIMIT_RESET_HEADER,
+    RETRY_AFTER_HEADER,
+    SHARED_RATE_LIMIT_NAME,
+    THROTTLE_STATUS_CODES
+)
+from .utils import get_shared_memory
+
+
+class TokenBucket:
+    """
+    Allow `rate` bytes per second on average, up to `burst` bytes at once. `rate` None is unlimited.
+    """
+
+    def __init__(self, rate: typing.Optional[float] = None, burst: typing.Optional[float] = None):
+        self._lock = threading.Lock()
+        self.rate = None
+        self.burst = None
+        self._tokens = 0.0
+        self._updated_at = time.monotonic()
+        self.set_rate(rate, burst)
+        # Start full.
+        self._tokens = self.burst or 0.0
+
+    def set_rate(self, rate: typing.Optional[float], burst: typing.Optional[float] = None):
+        """
+        Change the rate. Senders waiting already are not woken up early.
+        `burst` defaults to a tenth of a second worth of bytes.
+        """
+        if rate is not None and rate <= 0:
+            raise ValueError("Rate must be greater than 0 or None. Value provided: %s" % rate)
+        with self._lock:
+            self.rate = rate
+            self.burst = burst if burst is not None else (rate / 10 if rate else None)
+            self._tokens = min(self._tokens, self.burst) if self.burst is not None else 0.0
+            self._updated_at = time.monotonic()
+
+    def acquire(self, amount: int):
+        """
+        Take `amount` bytes, sleeping until the bucket allows them.
+        Amounts bigger than the bucket are allowed: the bucket goes into debt and later senders wait longer.
+        """
+        if self.rate is None:
+            return
+        with self._lock:
+            if self.rate is None:
+                return
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class BandwidthLimiter:
+    """
+    Rate limit in bytes per second for every upload, with overrides for uploads to specific storages.
+    An upload to a storage with an override is limited by the override only.
+    """
+
+    def __init__(self, rate: typing.Optional[float] = None, storage_rates: typing.Optional[typing.Mapping[str, float]] = None):
+        self._bucket = TokenBucket(rate)
+        self._storage_buckets: typing.Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+        for storage, storage_rate in (storage_rates or {}).items():
+            self.set_rate(storage_rate, storage=storage)
+
+    @property
+    def rate(self) -> typing.Optional[float]:
+        return self._bucket.rate
+
+    def set_rate(self, rate: typing.Optional[float], storage: typing.Optional[str] = None, burst: typing.Optional[float] = None):
+        """
+        Change the rate of every upload, or of uploads to `storage`. Takes effect while uploading.
+        None removes the limit, or the override of `storage`.
+        """
+        if storage is None:
+            return self._bucket.set_rate(rate, burst)
+        if rate is None:
+            return self.remove_override(storage)
+        with self._lock:
+            bucket = self._storage_buckets.get(storage)
+            if bucket is None:
+                self._storage_buckets[storage] = TokenBucket(rate, burst)
+                return
+        bucket.set_rate(rate, burst)
+
+    def remove_override(self, storage: str):
+        with self._lock:
+            self._storage_buckets.pop(storage, None)
+
+    def get_bucket(self, storage: typing.Optional[str] = None) -> TokenBucket:
+        return self._storage_buckets.get(storage, self._bucket) if storage is not None else self._bucket
+
+    def acquire(self, amount: int, storage: typing.Optional[str] = None):
+        self.get_bucket(storage).acquire(amount)
+
+
+def _parse_delay(value: typing.Optional[str], now: float) -> typing.Optional[float]:
+    """
+    Seconds to wait from a header that holds either seconds or an HTTP date.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - now)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_throttle_delay(response: httpx.Response, attempt: int = 0) -> typing.Optional[float]:
+    """
+    Return the seconds every sender must pause for after `response`, None if it does not ask for a pause.
+    Throttled responses without `Retry-After` or `RateLimit-Reset`(S3 SlowDown) back off exponentially by `attempt`.
+    Successful responses with no requests remaining pause until the window resets.
+    """
+    throttled = response.status_code in THROTTLE_STATUS_CODES
+    headers = response.headers
+    if not throttled and headers.get(RATE_LIMIT_REMAINING_HEADER, "").strip() != "0":
+        return None
+    now = time.time()
+    delay = _parse_delay(headers.get(RETRY_AFTER_HEADER), now)
+    if delay is None:
+        delay = _parse_delay(headers.get(RATE_LIMIT_RESET_HEADER), now)
+    if delay is None:
+        if not throttled:
+            return None
+        delay = 2 ** attempt
+    return min(delay, MAX_THROTTLE_DELAY)
+
+
+class RateLimitState:
+    """
+    Time until which every sender sharing the state waits before sending.
+    """
+    # Waiters check for interruption at least this often.
+    WAIT_INTERVAL = 0.5
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+
+    def get_paused_until(self) -> float:
+        return self._paused_until
+
+    def _set_paused_until(self, paused_until: float):
+        self._paused_until = paused_until
+
+    def pause(self, seconds: float):
+        """
+        Pause every sender for `seconds`. A pause that ends later is kept.
+        """
+        paused_until = time.time() + seconds
+        with self._lock:
+            if paused_until > self.get_paused_until():
+                self._set_paused_until(paused_until)
+
+    def get_delay(self) -> float:
+        return max(0.0, self.get_paused_until() - time.time())
+
+    def wait(self, interrupt: typing.Optional[threading.Event] = None) -> bool:
+        """
+        Sleep until the pause ends. Other senders may extend the pause while waiting.
+        Return False if `interrupt` is set before.
+        """
+        while True:
+            if interrupt is not None and interrupt.is_set():
+                return False
+            delay = self.get_delay()
+            if not delay:
+                return True
+            time.sleep(min(delay, self.WAIT_INTERVAL))
+
+
+def send_throttled(
+        send: typing.Callable[[], httpx.Response],
+        state: RateLimitState,
+        interrupt: typing.Optional[threading.Event] = None
+) -> typing.Optional[httpx.Response]:
+    """
+    Call `send` once the pause of `state` is over. Throttled requests pause every sender sharing `state`
+    and are sent again, up to MAX_THROTTLE_RETRIES times.
+    Return the last response, None if `interrupt` is set while waiting.
+    """
+    attempt = 0
+    while True:
+        if not state.wait(interrupt):
+            return None
+        response = send()
+        delay = get_throttle_delay(response, attempt)
+        if delay is not None:
+            state.pause(delay)
+        if response.status_code not in THROTTLE_STATUS_CODES or attempt >= MAX_THROTTLE_RETRIES:
+            return response
+        attempt += 1
+
+
+class SharedRateLimitState(RateLimitState):
+    """
+    `RateLimitState` every process of the host with the same `name` shares, kept in shared memory.
+    Processes update the pause without a lock between them: two processes pausing at once may lose the shorter pause,
+    which the next throttled response sets again.
+    """
+    _FORMAT = "<d"
+
+    def __init__(self, name: str = SHARED_RATE_LIMIT_NAME):
+        super().__init__()
+        self.name = name
+        size = struct.calcsize(self._FORMAT)
+        self._shared_memory, self.is_new = get_shared_memory(size=size, name=name, initial=struct.pack(self._FORMAT, 0.0))
+
+    def get_paused_until(self) -> float:
+        return struct.unpack_from(self._FORMAT, self._shared_memory.buf)[0]
+
+    def _set_paused_until(self, paused_until: float):
+        struct.pack_into(self._FORMAT, self._shared_memory.buf, 0, paused_until)
+
+    def close(self):
+        self._shared_memory.close()
+
+    def unlink(self):
+        """
+        Remove the shared memory block. Call once, from the process that owns the deployment.
+        """
+        self._shared_memory.unlink()
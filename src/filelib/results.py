@@ -0,0 +1,74 @@
+"""
+Compact record of a finished upload.
+
+`Client` keeps these instead of `UploadManager` objects so that file handles,
+presigned URL maps and cache handles are released as soon as an upload is finished.
+"""
+import posixpath
+import typing
+
+
+def result_key(prefix: typing.Optional[str], file_name: str) -> str:
+    """
+    Identify an upload by where it is stored: files with the same name can be uploaded under different prefixes.
+    """
+    return posixpath.join((prefix or "").strip("/"), file_name)
+
+
+class UploadResult:
+    __slots__ = (
+        "file_name",
+        "prefix",
+        "url",
+        "size",
+        "status",
+        "error",
+        "started_at",
+        "finished_at",
+        "digest",
+        "compressed_size",
+        "compression_ratio"
+    )
+
+    def __init__(
+            self,
+            file_name: str,
+            prefix: str = "",
+            url: typing.Optional[str] = None,
+            size: typing.Optional[int] = None,
+            status: typing.Optional[str] = None,
+            error: str = "",
+            started_at: typing.Optional[float] = None,
+            finished_at: typing.Optional[float] = None,
+            digest: typing.Optional[str] = None,
+            compressed_size: typing.Optional[int] = None,
+            compression_ratio: typing.Optional[float] = None
+    ):
+        self.file_name = file_name
+        self.prefix = prefix
+        self.url = url
+        self.size = size
+        self.status = status
+        self.error = error
+        self.started_at = started_at
+        self.finished_at = finished_at
+        self.digest = digest
+        # Bytes sent on the wire and how many times smaller they are, if parts are compressed.
+        self.compressed_size = compressed_size
+        self.compression_ratio = compression_ratio
+
+    @property
+    def key(self) -> str:
+        return result_key(self.prefix, self.file_name)
+
+    @property
+    def duration(self) -> typing.Optional[float]:
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __repr__(self):
+        return "<UploadResult %s: %s>" % (self.file_name, self.status)
@@ -0,0 +1,154 @@
+"""
+Order the files of `Client.upload` so small, urgent uploads are not stuck behind large ones.
+
+Policies:
+    priority: highest `priority` first.
+    sjf: shortest job, smallest file, first.
+    edf: earliest `deadline` first. Files without a deadline go last.
+Ties are broken by priority, then by the order files are added in.
+
+Files of at least `large_file_size` bytes are guaranteed `large_file_share` of the workers while any are queued,
+at least one worker, so they keep making progress however many small files are queued ahead of them.
+A single worker is never reserved: large files wait for the files ahead of them in policy order,
+which can be forever under "sjf" while small files keep being added.
+"""
+import heapq
+import itertools
+import math
+import threading
+import typing
+
+from .constants import DEFAULT_LARGE_FILE_SIZE
+
+SCHEDULE_PRIORITY = "priority"
+SCHEDULE_SJF = "sjf"
+SCHEDULE_EDF = "edf"
+SCHEDULE_POLICIES = (SCHEDULE_PRIORITY, SCHEDULE_SJF, SCHEDULE_EDF)
+
+
+class ScheduledFile:
+    __slots__ = ("index", "file_args", "size", "priority", "deadline", "sequence", "is_large")
+
+    def __init__(
+            self,
+            index: str,
+            file_args: dict,
+            size: float,
+            priority: int = 0,
+            deadline: typing.Optional[float] = None,
+            sequence: int = 0,
+            is_large: bool = False
+    ):
+        self.index = index
+        # UploadManager arguments
+        self.file_args = file_args
+        # math.inf if not known, e.g. streams.
+        self.size = size
+        self.priority = priority
+        # Time, as `time.time()`, the upload should be finished by.
+        self.deadline = deadline
+        self.sequence = sequence
+        self.is_large = is_large
+
+    def __repr__(self):
+        return "<ScheduledFile %s: priority %s, %s bytes>" % (self.file_args["file_name"], self.priority, self.size)
+
+
+class FileScheduler:
+    """
+    Queue of files to upload. `pop` returns the next file for a free worker, `done` is called once it finishes.
+    Thread safe.
+    """
+
+    def __init__(
+            self,
+            policy: str = SCHEDULE_PRIORITY,
+            workers: int = 1,
+            large_file_size: int = DEFAULT_LARGE_FILE_SIZE,
+            large_file_share: float = 0.25
+    ):
+        if policy not in SCHEDULE_POLICIES:
+            raise ValueError("Policy must be one of: %s. Value provided: %s" % (", ".join(SCHEDULE_POLICIES), policy))
+        if not 0 <= large_file_share <= 1:
+            raise ValueError("Large file share must be between 0 and 1. Value provided: %s" % large_file_share)
+        self.policy = policy
+        self.workers = workers
+        self.large_file_size = large_file_size
+        self.large_file_share = large_file_share
+        self._queue = []
+        # Large files only, in the same order. Large files popped from one heap are left in the other and skipped.
+        self._large_queue = []
+        self._popped_large = set()
+        self._count = 0
+        self._sequence = itertools.count()
+        self._running_large = 0
+        self._lock = threading.Lock()
+
+    @property
+    def reserved_workers(self) -> int:
+        """
+        Workers large files get ahead of any other file.
+        """
+        if self.workers < 2 or not self.large_file_share:
+            return 0
+        return max(1, math.floor(self.workers * self.large_file_share))
+
+    def get_key(self, item: ScheduledFile) -> tuple:
+        if self.policy == SCHEDULE_SJF:
+            return item.size, -item.priority, item.sequence
+        if self.policy == SCHEDULE_EDF:
+            deadline = item.deadline if item.deadline is not None else math.inf
+            return deadline, -item.priority, item.sequence
+        return -item.priority, item.sequence
+
+    def push(self, index: str, file_args: dict, size: float, priority: int = 0, deadline: typing.Optional[float] = None):
+        with self._lock:
+            item = ScheduledFile(
+                index,
+                file_args,
+                size,
+                priority=priority,
+                deadline=deadline,
+                sequence=next(self._sequence),
+                is_large=size >= self.large_file_size
+            )
+            entry = (self.get_key(item), item.sequence, item)
+            self._count += 1
+            heapq.heappush(self._queue, entry)
+            if item.is_large:
+                heapq.heappush(self._large_queue, entry)
+
+    def _pop_from(self, queue: list) -> typing.Optional[ScheduledFile]:
+        while queue:
+            item = heapq.heappop(queue)[-1]
+            if not item.is_large:
+                return item
+            if item.sequence not in self._popped_large:
+                self._popped_large.add(item.sequence)
+                return item
+            # Popped from the other heap already.
+            self._popped_large.discard(item.sequence)
+        return None
+
+    def pop(self) -> typing.Optional[ScheduledFile]:
+        """
+        Return the next file to upload, None if the queue is empty.
+        """
+        with self._lock:
+            item = None
+            if self._running_large < self.reserved_workers:
+                item = self._pop_from(self._large_queue)
+            if item is None:
+                item = self._pop_from(self._queue)
+            if item is not None:
+                self._count -= 1
+                self._running_large += item.is_large
+            return item
+
+    def done(self, item: ScheduledFile):
+        with self._lock:
+            if item.is_large:
+                self._running_large -= 1
+
+    def __len__(self):
+        return self._count
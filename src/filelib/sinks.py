@@ -0,0 +1,135 @@
+"""
+Destinations for upload results.
+
+`Client.upload(sink=...)` writes the result of every file to the sink as soon as the file
+is finished instead of keeping it in `Client.PROCESSED_FILES`.
+Manifest sinks(JSONL, CSV) append to their file, so a job can be resumed with the same manifest:
+files recorded as completed are skipped.
+"""
+import csv
+import json
+import os
+import threading
+import typing
+
+from .constants import UPLOAD_COMPLETED
+from .results import UploadResult, result_key
+
+
+class BaseResultSink:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def write(self, result: UploadResult):
+        with self._lock:
+            self._write(result)
+
+    def _write(self, result: UploadResult):
+        raise NotImplementedError
+
+    def completed(self) -> typing.Set[str]:
+        """
+        Return keys(`UploadResult.key`) of the uploads already recorded as completed.
+        """
+        return set()
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+
+class CallbackResultSink(BaseResultSink):
+    """
+    Call `callback` with every UploadResult.
+    """
+
+    def __init__(self, callback: typing.Callable[[UploadResult], typing.Any]):
+        super().__init__()
+        self.callback = callback
+
+    def _write(self, result: UploadResult):
+        self.callback(result)
+
+
+class _FileResultSink(BaseResultSink):
+    """
+    Append results to a file. Every result is flushed once written.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._file = None
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, "a", newline="", encoding="utf8")
+        return self._file
+
+    def _write(self, result: UploadResult):
+        file = self._open()
+        self._write_record(file, result.to_dict())
+        file.flush()
+
+    def _write_record(self, file, record: dict):
+        raise NotImplementedError
+
+    def _read_records(self, file) -> typing.Iterator[dict]:
+        raise NotImplementedError
+
+    def completed(self):
+        if not os.path.exists(self.path):
+            return set()
+        with open(self.path, newline="", encoding="utf8") as file:
+            return {
+                result_key(record.get("prefix"), record["file_name"]) for record in self._read_records(file)
+                if record.get("status") == UPLOAD_COMPLETED
+            }
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class JSONLResultSink(_FileResultSink):
+    """
+    A JSON object per line.
+    """
+
+    def _write_record(self, file, record):
+        file.write(json.dumps(record) + "\n")
+
+    def _read_records(self, file):
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Last line is incomplete if the process died while writing it.
+                continue
+
+
+class CSVResultSink(_FileResultSink):
+    """
+    A row per result with a header of UploadResult fields.
+    """
+    FIELDS = UploadResult.__slots__
+
+    def _write_record(self, file, record):
+        writer = csv.DictWriter(file, fieldnames=self.FIELDS)
+        if file.tell() == 0:
+            writer.writeheader()
+        writer.writerow(record)
+
+    def _read_records(self, file):
+        yield from csv.DictReader(file)
@@ -0,0 +1,110 @@
+"""
+Files that are opened only when their upload starts.
+
+`Client.add_file` stores a `FileSource` for a path instead of an open file object,
+so the number of files enqueued is not bound by the open file descriptor limit.
+Other sources(e.g. `filelib.packing.TarPackSource`) are opened the same way.
+
+In-memory buffers(bytes, bytearray, memoryview, mmap, NumPy arrays...) are read through a `BufferReader`:
+parts are memoryview slices of the buffer, so uploading it takes no memory beyond the buffer itself.
+"""
+import io
+import mmap
+import os
+
+from .constants import FILE_OPEN_MODE
+from .exceptions import ValidationError
+from .utils import resolve_path
+
+
+def is_buffer(obj) -> bool:
+    """
+    Return True for objects supporting the buffer protocol, other than file objects(memory maps are buffers).
+    """
+    if isinstance(obj, str) or (hasattr(obj, "read") and not isinstance(obj, mmap.mmap)):
+        return False
+    try:
+        memoryview(obj).release()
+    except TypeError:
+        return False
+    return True
+
+
+class Source:
+    """
+    Subclasses provide `name`, `size` and `open()` returning a readable, seekable file object.
+    """
+    __slots__ = ()
+
+    def open(self):
+        raise NotImplementedError
+
+
+class FileSource(Source):
+    __slots__ = ("path", "size", "mtime")
+
+    def __init__(self, path: str, size: int, mtime: float):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+
+    @classmethod
+    def from_path(cls, path: str) -> "FileSource":
+        """
+        Validate the file at `path` and record its size and modification time without opening it.
+        """
+        path = resolve_path(path)
+        stat = os.stat(path)
+        return cls(path, stat.st_size, stat.st_mtime)
+
+    @property
+    def name(self):
+        return self.path
+
+    def open(self):
+        return open(self.path, FILE_OPEN_MODE)
+
+    def __repr__(self):
+        return "<FileSource %s>" % self.path
+
+
+class BufferReader(io.RawIOBase):
+    """
+    Seekable, read-only file object over a buffer. `getbuffer` returns the content without copying it.
+    """
+
+    def __init__(self, buffer):
+        super().__init__()
+        view = memoryview(buffer)
+        if not view.c_contiguous:
+            raise ValidationError("Buffer must be C-contiguous to be uploaded without copying.")
+        self._view = view.cast("B")
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        if offset < 0:
+            raise ValueError("Negative seek position %d" % offset)
+        self._position = offset
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        data = self._view[self._position:self._position + len(buffer)]
+        memoryview(buffer).cast("B")[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def getbuffer(self) -> memoryview:
+        return self._view
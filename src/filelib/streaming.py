@@ -0,0 +1,277 @@
+"""
+Upload from streams that cannot be seeked and whose size is not known in advance: pipes, stdin, generators.
+
+The stream is read into a bounded ring of part buffers and every part is sent as soon as it is filled,
+so nothing is spilled to disk. A part is kept in its buffer until it is acknowledged, which is the only window
+a failed part can be sent again from. The size and the part count are known once the stream ends;
+a part is known to be the last one when reading the next one hits the end of the stream.
+
+Stream uploads cannot be resumed: their content is gone once read.
+"""
+import concurrent.futures
+import functools
+import hashlib
+import io
+import itertools
+import os
+import time
+import typing
+import zlib
+from uuid import uuid4
+
+import httpx
+
+from .buffers import BufferPool
+from .constants import UPLOAD_COMPLETED, UPLOAD_FAILED, UPLOAD_STARTED
+from .dedup import DIGEST_ALGORITHM
+from .exceptions import (
+    FilelibAPIException,
+    FileNameRequiredError,
+    FileObjectNotReadableError,
+    NoChunksToUpload,
+    UploadAbortedError
+)
+from .sources import Source, is_buffer
+from .upload_manager import UploadManager
+from .utils import parse_api_err
+
+
+def is_stream(file) -> bool:
+    """
+    Return True for file objects that cannot be seeked and iterables of bytes.
+    """
+    if isinstance(file, (str, Source)) or is_buffer(file):
+        return False
+    if hasattr(file, "read"):
+        return hasattr(file, "seekable") and not file.seekable()
+    return hasattr(file, "__iter__")
+
+
+class IterStream(io.RawIOBase):
+    """
+    Readable file object over an iterable of bytes, e.g. a generator.
+    """
+
+    def __init__(self, iterable: typing.Iterable[bytes]):
+        super().__init__()
+        self._iterator = iter(iterable)
+        self._pending = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not len(self._pending):
+            block = next(self._iterator, None)
+            if block is None:
+                return 0
+            self._pending = memoryview(block).cast("B")
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+class StreamUploadManager(UploadManager):
+    """
+    UploadManager for streams. See `is_stream`
+    Takes the same arguments; the cache is never used since stream uploads cannot be resumed.
+    Parts are read into a ring of its own instead of `buffer_pool`: the reader holds a buffer while it waits for the next one,
+    which could wait forever on buffers held by other uploads of a shared pool.
+    Parts are sent by `workers` threads when `multithreading`, one at a time otherwise.
+    """
+    # Times a part that failed is sent again from its buffer before the upload fails.
+    STREAM_PART_RETRIES = 2
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ignore_cache = True
+        self._stream_size = 0
+        self._stream_part_count = 0
+        self._stream_digest = hashlib.new(DIGEST_ALGORITHM)
+        # Start of the first part, to decide whether to compress.
+        self._stream_sample = b""
+        self._ring: typing.Optional[BufferPool] = None
+
+    @staticmethod
+    def process_file(file_name, file):
+        if not hasattr(file, "read"):
+            file = IterStream(file)
+        if not (hasattr(file, "readable")) or not file.readable():
+            raise FileObjectNotReadableError("Provided file object is not readable.")
+        name = getattr(file, "name", None)
+        if not file_name and not isinstance(name, str):
+            raise FileNameRequiredError("Stream does not have a name. Provide a `file_name` value.")
+        return os.path.basename(file_name or name), file
+
+    def get_cache_namespace(self):
+        # Content cannot be read ahead, every stream upload is a new one.
+        return zlib.crc32(bytes(self.file_name + uuid4().hex, "utf8"))
+
+    def get_file_size(self) -> typing.Optional[int]:
+        """
+        Size of the stream, None until it ends.
+        """
+        return self._FILE_SIZE
+
+    def calculate_part_count(self) -> int:
+        # Parts are numbered as they are read.
+        return self._stream_part_count
+
+    def _get_create_payload(self) -> dict:
+        return {
+            "file_name": self.file_name,
+            "mimetype": self.content_type
+        }
+
+    def get_compression_samples(self) -> typing.List[bytes]:
+        return [self._stream_sample]
+
+    @staticmethod
+    def is_fatal_error(exc: Exception) -> bool:
+        # A part that failed cannot be read again.
+        return True
+
+    def _read_stream_chunk(self) -> memoryview:
+        buffer = self._ring.acquire(self.UPLOAD_CHUNK_SIZE)
+        try:
+            chunk = self._read_into(memoryview(buffer)[:self.UPLOAD_CHUNK_SIZE])
+        except BaseException:
+            self._ring.release(buffer)
+            raise
+        self._stream_size += len(chunk)
+        self._stream_digest.update(chunk)
+        return chunk
+
+    def iter_stream_parts(self) -> typing.Iterator[typing.Tuple[int, memoryview, bool]]:
+        """
+        Read the stream into pooled buffers. Yield (part_number, chunk, is_last).
+        Chunks are released by the consumer. The size and the part count are set before the last part is yielded.
+        """
+        if self._ring is None:
+            # The part yielded and the part read ahead.
+            self._ring = BufferPool(2)
+        chunk = self._read_stream_chunk()
+        # Buffer read but not yielded yet, released if the consumer stops early.
+        held = chunk
+        try:
+            for part_number in itertools.count(1):
+                if not len(chunk):
+                    return
+                if part_number == 1:
+                    self._stream_sample = bytes(chunk[:self.COMPRESSION_SAMPLE_SIZE])
+                # A short part is the last one, a full one needs a read ahead to know.
+                next_chunk = self._read_stream_chunk() if len(chunk) == self.UPLOAD_CHUNK_SIZE else None
+                held = next_chunk
+                is_last = next_chunk is None or not len(next_chunk)
+                if is_last:
+                    self._FILE_SIZE = self._stream_size
+                    self._stream_part_count = part_number
+                    self.digest = "%s:%s" % (DIGEST_ALGORITHM, self._stream_digest.hexdigest())
+                yield part_number, chunk, is_last
+                if is_last:
+                    return
+                chunk = next_chunk
+        finally:
+            if held is not None:
+                self._release_chunk(held)
+
+    def send_stream_part(self, part_number, chunk):
+        """
+        Send a part, again from its buffer if it fails, up to STREAM_PART_RETRIES times.
+        """
+        for attempt in range(self.STREAM_PART_RETRIES + 1):
+            try:
+                return self.upload_chunk(part_number, chunk)
+            except UploadAbortedError:
+                raise
+            except Exception:
+                if attempt == self.STREAM_PART_RETRIES:
+                    raise
+
+    def stream_upload(self):
+        self.set_upload_status(UPLOAD_STARTED)
+        workers = self.get_worker_count() if self.multithreading else 1
+        if workers < 1:
+            raise ValueError("Stream upload requires at least one worker. Worker value provided: %d" % workers)
+        # Parts being sent, the part read ahead and the part being read.
+        self._ring = BufferPool(workers + 2)
+        self._abort_event.clear()
+        self._fatal_error = None
+        parts = self.iter_stream_parts()
+        last = None
+        try:
+            first = next(parts, None)
+            if first is None:
+                raise NoChunksToUpload("Stream `%s` does not have any content to upload." % self.file_name)
+            try:
+                self.init_compression()
+            except BaseException:
+                self._release_chunk(first[1])
+                raise
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                pending = set()
+                for part_number, chunk, is_last in itertools.chain([first], parts):
+                    # Without an explicit completion step, the last part is sent once every other part is.
+                    if is_last and not self._FILE_COMPLETE_URL:
+                        last = (part_number, chunk)
+                        break
+                    if len(pending) >= workers:
+                        pending = self._wait_for_parts(pending)
+                    if self._abort_event.is_set():
+                        self._release_chunk(chunk)
+                        break
+                    future = executor.submit(self.send_stream_part, part_number, chunk)
+                    future.add_done_callback(functools.partial(self._release_part, chunk))
+                    pending.add(future)
+                while pending:
+                    pending = self._wait_for_parts(pending)
+        finally:
+            parts.close()
+        try:
+            if self._fatal_error is not None:
+                raise self._fatal_error
+            if last is None:
+                return self.complete()
+            self.send_stream_part(*last)
+        finally:
+            if last is not None:
+                self._release_chunk(last[1])
+        self.set_upload_status(UPLOAD_COMPLETED)
+
+    def _release_chunk(self, chunk):
+        if isinstance(chunk, memoryview):
+            self._ring.release(chunk.obj)
+
+    def _release_part(self, chunk, _future=None):
+        self._release_chunk(chunk)
+
+    def complete(self):
+        """
+        Tell Filelib API the stream ended, with its size and part count.
+        """
+        payload = {"file_size": self.get_file_size(), "part_count": self.calculate_part_count()}
+        with httpx.Client() as client:
+            req = self._send_request(lambda: client.post(self._FILE_COMPLETE_URL, json=payload, headers=self.auth.to_headers()))
+            if not req.is_success:
+                raise FilelibAPIException(*parse_api_err(req))
+        self.set_upload_status(UPLOAD_COMPLETED)
+
+    def upload(self):
+        """
+        Upload the stream to Filelib API. Stream is read to its end.
+        """
+        self.started_at = time.time()
+        self.init_upload()
+        try:
+            self.stream_upload()
+        except NoChunksToUpload:
+            raise
+        except Exception as e:
+            self.set_upload_status(UPLOAD_FAILED)
+            self.error = str(e)
+            if self.abort_on_fail:
+                self.cancel()
+        self.finished_at = time.time()
+        if self.dedup_index is not None and self.get_upload_status() == UPLOAD_COMPLETED and self._FILE_ENTITY_URL:
+            self.dedup_index.add(self.digest, self.get_file_size(), self._FILE_ENTITY_URL)
@@ -1,17 +1,30 @@
 import concurrent.futures
+import functools
 import math
 import os.path
+import threading
+import time
 import typing
 import zlib
 
 import httpx
 from jmstorage import Cache
 
-from . import Authentication
+from .authentication import Authentication
+from .buffers import BufferPool
+from .cache import CACHE_STATUS_KEY, BaseCacheBackend
+from .compression import Codec, get_codec, get_ratio
 from .config import FilelibConfig
 from .constants import (
+    CACHE_REFRESH_INTERVAL,
+    CONTENT_ENCODING_HEADER,
+    CONTENT_LENGTH_HEADER,
+    FATAL_UPLOAD_STATUS_CODES,
+    FILE_UPLOAD_COPY_URL,
+    FILE_UPLOAD_SINGLE_URL,
     FILE_UPLOAD_STATUS_HEADER,
     FILE_UPLOAD_URL,
+    UNSUPPORTED_ENDPOINT_STATUS_CODES,
     UPLOAD_CANCELLED,
     UPLOAD_CHUNK_SIZE_HEADER,
     UPLOAD_COMPLETED,
@@ -25,13 +38,20 @@ from .constants import (
     UPLOAD_PENDING,
     UPLOAD_STARTED
 )
+from .dedup import DedupIndex, get_digest
 from .exceptions import (
     ChunkUploadFailedError,
     FilelibAPIException,
-    NoChunksToUpload
+    FilelibBaseException,
+    NoChunksToUpload,
+    UploadAbortedError
 )
 from .parsers import UploadErrorParser
-from .utils import parse_api_err, process_file as proc_file
+from .prefetch import ChunkPrefetcher
+from .ratelimit import BandwidthLimiter, RateLimitState, send_throttled
+from .results import UploadResult
+from .sources import BufferReader, is_buffer
+from .utils import advise_file, parse_api_err, process_file as proc_file
 
 
 class UploadManager:
@@ -48,6 +68,22 @@ class UploadManager:
 
     # Key name for storing unique file URL
     _CACHE_ENTITY_KEY = "LOCATION"
+    # Key name for storing the upload status so finished uploads can be garbage collected.
+    _CACHE_STATUS_KEY = CACHE_STATUS_KEY
+
+    # How many parts per worker can be queued in the executor at any given time.
+    SUBMISSION_WINDOW_FACTOR = 2
+
+    # Chunks are sent in blocks of this size so an in-flight upload can be interrupted.
+    STREAM_BLOCK_SIZE = 256 * 2 ** 10
+
+    # O_DIRECT reads must start and end on a multiple of the device block size.
+    DIRECT_IO_ALIGNMENT = 4096
+
+    # Compression is used only if samples of this size from a few parts compress at least by this ratio.
+    COMPRESSION_SAMPLE_SIZE = 64 * 2 ** 10
+    COMPRESSION_SAMPLE_PARTS = 3
+    COMPRESSION_MIN_RATIO = 1.2
 
     def __init__(
             self,
@@ -61,31 +97,87 @@ class UploadManager:
             content_type=None,
             ignore_cache=False,
             abort_on_fail=False,
-            clear_cache=False
+            clear_cache=False,
+            prefetch: int = 2,
+            buffer_pool: typing.Optional[BufferPool] = None,
+            drop_page_cache=False,
+            direct_io=False,
+            cache_backend: typing.Optional[BaseCacheBackend] = None,
+            small_file_threshold: int = 0,
+            compression: typing.Optional[str] = None,
+            dedup_index: typing.Optional[DedupIndex] = None,
+            rate_limiter: typing.Optional[BandwidthLimiter] = None,
+            rate_limit_state: typing.Optional[RateLimitState] = None
     ):
         self.file_name, self.file = self.process_file(file_name, file)
+        # Parts of in-memory buffers are sliced out of them instead of read into pooled buffers.
+        self._zero_copy = isinstance(self.file, BufferReader)
+        # seek + read must not interleave between threads.
+        self._file_lock = threading.Lock()
         self.config = config
         self.auth = auth
         self.multithreading = multithreading
         self.workers = workers
+        # Number of parts to read ahead of the workers while multithreading. 0 disables.
+        self.prefetch = prefetch
+        # Chunks are read into reusable buffers. Can be shared between files.
+        self.buffer_pool = buffer_pool or BufferPool()
+        # Keep bulk uploads from evicting pages other processes need from the page cache.
+        self.drop_page_cache = drop_page_cache
+        # Read path based files with O_DIRECT, bypassing the page cache entirely.
+        self.direct_io = direct_io
+        self._direct_fd: typing.Optional[int] = None
+        # Files up to this size are created and uploaded with a single request. 0 disables.
+        self.small_file_threshold = small_file_threshold
+        # Compress parts sent to Filelib API: "auto", "zstd", "gzip". None disables. See `filelib.compression`
+        self.compression = compression
+        self._codec: typing.Optional[Codec] = None
+        # Bytes of parts sent and bytes they took on the wire, compressed or not.
+        self._sent_size = 0
+        self._compressed_size = 0
+        self._size_lock = threading.Lock()
+        # Skip sending content that is uploaded already. See `filelib.dedup`
+        self.dedup_index = dedup_index
+        # Bandwidth limit, can be shared between files. See `filelib.ratelimit`
+        self.rate_limiter = rate_limiter
+        # Pause of throttled requests, shared by every worker. Can be shared between files and processes.
+        self.rate_limit_state = rate_limit_state or RateLimitState()
 
         # Filelib API response based params
         self.is_direct_upload = False
         self._FILE_SIZE: typing.Optional[int, None] = None
         self._FILE_ENTITY_URL: typing.Optional[str, None] = None
         self._FILE_ENTITY_URL_MAP = None
+        # When provided, server waits for an explicit completion request instead of the last part.
+        self._FILE_COMPLETE_URL: typing.Optional[str] = None
+        # Entity is created already. See `set_entity`
+        self._entity_prepared = False
+        # Per instance; files can be uploaded concurrently.
+        self._UPLOAD_PART_NUMBER_SET = set()
 
         # Allow the user to start over an upload from scratch
         self.ignore_cache = ignore_cache
-        self.cache = cache or Cache(namespace=str(self.get_cache_namespace()), path="./subdir")
+        self.cache = cache or self.get_namespace_cache(self.get_cache_namespace(), cache_backend)
+        # Last time the cache was written while parts are sent. See `refresh_cache`
+        self._cache_refreshed_at = 0.0
+        self._cache_refresh_lock = threading.Lock()
         self.content_type = content_type
         self.clear_cache = clear_cache
         self.abort_on_fail = abort_on_fail
         # Set Error prop
         self.error = ""
+        # Set when a part fails with an error that all other parts will fail with as well.
+        self._abort_event = threading.Event()
+        self._fatal_error: typing.Optional[Exception] = None
+        # Reported in UploadResult
+        self.started_at: typing.Optional[float] = None
+        self.finished_at: typing.Optional[float] = None
+        self.digest: typing.Optional[str] = None
 
     @staticmethod
     def process_file(file_name, file):
+        if is_buffer(file):
+            file = BufferReader(file)
         return proc_file(file_name, file)
 
     def has_cache(self):
@@ -102,6 +194,18 @@ class UploadManager:
             return False
         self.cache.set(key, value)
 
+    def refresh_cache(self):
+        """
+        Mark the upload as running in the cache, at most every CACHE_REFRESH_INTERVAL seconds,
+        so `Client.sweep_stale_uploads` does not take an upload that takes long for an abandoned one.
+        """
+        now = time.time()
+        with self._cache_refresh_lock:
+            if now - self._cache_refreshed_at < CACHE_REFRESH_INTERVAL:
+                return
+            self._cache_refreshed_at = now
+        self.set_cache(self._CACHE_STATUS_KEY, UPLOAD_STARTED)
+
     def delete_cache(self, key):
         return self.cache.delete(key)
 
@@ -112,12 +216,26 @@ class UploadManager:
         """
         Generate checksum of the first 1000 bytes
         """
-        return zlib.crc32(self.get_chunk(1, 1000) + bytes(self.file_name, "utf8"))
+        return self.make_cache_namespace(self.get_chunk(1, 1000), self.file_name)
+
+    @staticmethod
+    def make_cache_namespace(head: bytes, file_name: str) -> int:
+        """
+        Cache namespace of a file from its first 1000 bytes and its name.
+        """
+        return zlib.crc32(head + bytes(file_name, "utf8"))
+
+    @staticmethod
+    def get_namespace_cache(namespace: int, cache_backend: typing.Optional[BaseCacheBackend] = None):
+        if cache_backend is not None:
+            return cache_backend.namespace(str(namespace))
+        return Cache(namespace=str(namespace), path="./subdir")
 
-    def get_chunk(self, part_number, chunk_size=None):
+    def get_chunk(self, part_number, chunk_size=None, buffer=None):
         """
         Get chunk corresponding to the part number provided
         chunk_size to overwrite how to read for chunk.
+        If `buffer` is provided, chunk is read into it and a memoryview of it is returned.
         """
         _chunk_size = chunk_size or self.UPLOAD_CHUNK_SIZE
         seek_start = (part_number - 1) * _chunk_size
@@ -125,15 +243,102 @@ class UploadManager:
         # Prevent reading from further than last byte.
         if seek_start + _chunk_size > file_size:
             _chunk_size = file_size - seek_start
-        self.file.seek(seek_start)
-        return self.file.read(_chunk_size)
+        if buffer is not None and self.direct_io:
+            chunk = self._read_direct(seek_start, _chunk_size, buffer)
+            if chunk is not None:
+                return chunk
+        with self._file_lock:
+            self.file.seek(seek_start)
+            if buffer is None:
+                return self.file.read(_chunk_size)
+            return self._read_into(memoryview(buffer)[:_chunk_size])
+
+    def _get_direct_fd(self) -> typing.Optional[int]:
+        """
+        Open the file at the path of the file object with O_DIRECT.
+        Return None if not possible: platform, not a path based file, file system does not support it.
+        """
+        if self._direct_fd is None:
+            path = getattr(self.file, "name", None)
+            if not hasattr(os, "O_DIRECT") or not hasattr(os, "preadv") or type(path) is not str:
+                self.direct_io = False
+                return None
+            try:
+                self._direct_fd = os.open(path, os.O_RDONLY | os.O_DIRECT)
+            except OSError:
+                self.direct_io = False
+                return None
+        return self._direct_fd
+
+    def _read_direct(self, offset, size, buffer) -> typing.Optional[memoryview]:
+        """
+        Read with O_DIRECT into a page aligned buffer.
+        Return None if the read cannot be aligned so the caller falls back to a regular read.
+        """
+        alignment = self.DIRECT_IO_ALIGNMENT
+        aligned_size = -(-size // alignment) * alignment
+        if offset % alignment or aligned_size > len(buffer):
+            return None
+        fd = self._get_direct_fd()
+        if fd is None:
+            return None
+        view = memoryview(buffer)
+        try:
+            read = os.preadv(fd, [view[:aligned_size]], offset)
+        except OSError:
+            self.direct_io = False
+            return None
+        return view[:min(read, size)]
+
+    def _read_into(self, view: memoryview) -> memoryview:
+        """
+        Fill the view from the current position of the file. Return the filled part.
+        """
+        readinto = getattr(self.file, "readinto", None)
+        filled = 0
+        while filled < len(view):
+            if readinto:
+                read = readinto(view[filled:]) or 0
+            else:
+                data = self.file.read(len(view) - filled)
+                read = len(data)
+                view[filled:filled + read] = data
+            if not read:
+                break
+            filled += read
+        return view[:filled]
+
+    def _read_pooled_chunk(self, part_number):
+        if self._zero_copy:
+            return self.get_chunk_view(part_number)
+        return self.get_chunk(part_number, buffer=self.buffer_pool.acquire(self.UPLOAD_CHUNK_SIZE))
+
+    def get_chunk_view(self, part_number) -> memoryview:
+        """
+        Slice of the in-memory buffer for the part number. See `filelib.sources.BufferReader`
+        """
+        seek_start = (part_number - 1) * self.UPLOAD_CHUNK_SIZE
+        return self.file.getbuffer()[seek_start:seek_start + self.UPLOAD_CHUNK_SIZE]
+
+    def _release_chunk(self, chunk):
+        # Chunks read into a pooled buffer are memoryviews of the buffer.
+        if isinstance(chunk, memoryview) and not self._zero_copy:
+            self.buffer_pool.release(chunk.obj)
 
     def get_file_size(self) -> int:
         if not self._FILE_SIZE:
-            self._FILE_SIZE = self.file.seek(0, os.SEEK_END)
-            self.file.seek(0)
+            with self._file_lock:
+                self._FILE_SIZE = self.file.seek(0, os.SEEK_END)
+                self.file.seek(0)
         return self._FILE_SIZE
 
+    def advise_part(self, part_number, advice):
+        """
+        Give the OS a hint(posix_fadvise) about the byte range of the part number.
+        """
+        offset = (part_number - 1) * self.UPLOAD_CHUNK_SIZE
+        return advise_file(self.file, offset, self.UPLOAD_CHUNK_SIZE, advice)
+
     def calculate_part_count(self) -> int:
         """
         Calculate how many parts file will be chunked into by size/chunk_size
@@ -149,7 +354,7 @@ class UploadManager:
         if not file_url:
             raise ValueError("No file url to get status")
         with httpx.Client() as client:
-            req = client.get(file_url, headers=self.auth.to_headers())
+            req = self._send_request(lambda: client.get(file_url, headers=self.auth.to_headers()))
             # IF 404, means that our cache is out of sync
             # Re-initialize upload.
             if req.status_code == 404:
@@ -206,20 +411,34 @@ class UploadManager:
         Filelib api might provide log url if direct upload can be achieved to prevent data loss.
 
         """
+        if self._entity_prepared:
+            # Created in a batch, see `set_entity`.
+            return
         if not self.ignore_cache and not is_retry and self.has_cache():
             return self.fetch_upload_status()
 
         headers = self.auth.to_headers()
         headers.update(self.config.to_headers())
         with httpx.Client() as client:
-            req = client.post(FILE_UPLOAD_URL, data=self._get_create_payload(), headers=headers)
+            req = self._send_request(lambda: client.post(FILE_UPLOAD_URL, data=self._get_create_payload(), headers=headers))
             if not req.is_success:
                 raise FilelibAPIException(*parse_api_err(req))
             self._set_upload_params(req)
 
+    def set_entity(self, headers: typing.Mapping[str, str], data: typing.Optional[dict] = None):
+        """
+        Use a file entity created on Filelib API already, e.g. by `filelib.batch.EntityBatcher`.
+        `headers` and `data` are what the create request responds with for a single file.
+        `init_upload` does not create another one.
+        """
+        self._apply_upload_params(httpx.Headers(headers), data or {})
+        self._entity_prepared = True
+
     def _set_upload_params(self, response: httpx.Response):
         data = response.json()['data'] if response.request.method.lower() in ["post", "get"] else {}
-        headers = response.headers
+        self._apply_upload_params(response.headers, data)
+
+    def _apply_upload_params(self, headers: httpx.Headers, data: dict):
         self._parse_headers(headers)
         if data:
             is_direct_upload = data.get("is_direct_upload", False)
@@ -227,13 +446,32 @@ class UploadManager:
             upload_urls: typing.Mapping[str, dict] = data.get("upload_urls")
             if upload_urls:
                 self._FILE_ENTITY_URL_MAP = upload_urls
+            self._FILE_COMPLETE_URL = data.get("complete_url")
         self.set_cache(self._CACHE_ENTITY_KEY, self._FILE_ENTITY_URL)
 
-    def upload_chunk(self, part_number):
+    def upload_chunk(self, part_number, chunk=None):
         """
         Send the chunk that belongs to the provided part number to Filelib API
+        `chunk` can be provided if it is already read.
         """
-        chunk = self.get_chunk(part_number)
+        if self._abort_event.is_set():
+            raise UploadAbortedError("Upload of `%s` was aborted before part %d was sent." % (self.file_name, part_number))
+        if chunk is not None:
+            return self._send_chunk(part_number, chunk)
+        chunk = self._read_pooled_chunk(part_number)
+        try:
+            self._send_chunk(part_number, chunk)
+        finally:
+            self._release_chunk(chunk)
+
+    def _send_chunk(self, part_number, chunk):
+        self._send_part(part_number, chunk)
+        self.refresh_cache()
+        # Part is acknowledged, its pages will not be read again.
+        if self.drop_page_cache:
+            self.advise_part(part_number, "POSIX_FADV_DONTNEED")
+
+    def _send_part(self, part_number, chunk):
         headers = self.auth.to_headers()
         headers[UPLOAD_PART_CHUNK_NUM_HEADER] = str(part_number)
         headers[UPLOAD_CHUNK_SIZE_HEADER] = str(self.UPLOAD_CHUNK_SIZE)
@@ -251,30 +489,82 @@ class UploadManager:
                 upload_url = self._FILE_ENTITY_URL_MAP[str(part_number)]["url"]
                 log_url = self._FILE_ENTITY_URL_MAP[str(part_number)]["log_url"]
 
-            _headers = headers if not self.is_direct_upload else {}
-            req = method(upload_url, content=chunk, headers=_headers)
+            _headers = dict(headers) if not self.is_direct_upload else {}
+            content = chunk
+            # Direct uploads go to storage platforms that store the body as is.
+            if self._codec is not None and not self.is_direct_upload:
+                compressed = self._codec.compress(chunk)
+                # Sent as is if it does not get smaller.
+                if len(compressed) < len(chunk):
+                    content = compressed
+                    _headers[CONTENT_ENCODING_HEADER] = self._codec.name
+            # Content is streamed in blocks; length must be explicit or it is sent as chunked encoding.
+            _headers[CONTENT_LENGTH_HEADER] = str(len(content))
+            req = self._send_throttled(lambda: method(upload_url, content=self._iter_chunk(content), headers=_headers))
             if not req.is_success:
                 parser = UploadErrorParser(response=req, platform=platform)
                 error = parser.format()
                 raise ChunkUploadFailedError(*error)
+            with self._size_lock:
+                self._sent_size += len(chunk)
+                self._compressed_size += len(content)
             # send log if successful
             if log_url:
                 client.post(log_url, headers=headers)
 
+    def _send_throttled(self, send: typing.Callable[[], httpx.Response]) -> httpx.Response:
+        """
+        Send a part once the shared pause is over, see `send_throttled`. Return the last response.
+        """
+        response = send_throttled(send, self.rate_limit_state, self._abort_event)
+        if response is None:
+            raise UploadAbortedError("Upload of `%s` was aborted while waiting for the rate limit." % self.file_name)
+        return response
+
+    def _send_request(self, send: typing.Callable[[], httpx.Response]) -> httpx.Response:
+        """
+        Send a Filelib API request other than a part once the shared pause is over, see `send_throttled`.
+        Not interrupted by an abort: cancelling an aborted upload goes through it as well.
+        """
+        return send_throttled(send, self.rate_limit_state)
+
+    def _iter_chunk(self, chunk):
+        """
+        Yield the chunk in blocks of STREAM_BLOCK_SIZE.
+        Checking for abort between blocks interrupts a request that is already in flight.
+        """
+        view = memoryview(chunk)
+        for offset in range(0, len(view), self.STREAM_BLOCK_SIZE):
+            if self._abort_event.is_set():
+                raise UploadAbortedError("Upload of `%s` was aborted while sending a part." % self.file_name)
+            block = view[offset:offset + self.STREAM_BLOCK_SIZE]
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(len(block), self.config.storage)
+            yield block
+
+    @staticmethod
+    def is_fatal_error(exc: Exception) -> bool:
+        """
+        Errors like 401, 403, 404 will not succeed for any other part or on retry.
+        """
+        return isinstance(exc, FilelibBaseException) and exc.code in FATAL_UPLOAD_STATUS_CODES
+
     def single_thread_upload(self):
         self.set_upload_status(UPLOAD_STARTED)
-        for _part_number in self.get_upload_part_number_set():
-            self.upload_chunk(_part_number)
+        # The part being sent.
+        self.buffer_pool.reserve(1)
+        try:
+            for _part_number in self.get_upload_part_number_set():
+                self.upload_chunk(_part_number)
+        finally:
+            self.buffer_pool.unreserve(1)
+        if self._FILE_COMPLETE_URL:
+            return self.complete()
         self.set_upload_status(UPLOAD_COMPLETED)
 
     def multithread_upload(self):
         self.set_upload_status(UPLOAD_STARTED)
 
-        # Upload the highest part number last(out of multithread) so server can decide to mark file completed.
-        part_nums = list(self.get_upload_part_number_set())
-        last_part_number = max(part_nums)
-        part_nums.remove(last_part_number)
-
         # Python3.8+ max_workers=None behaves differently from max_workers=<int>
         # Ref: https://docs.python.org/3/library/concurrent.futures.html#concurrent.futures.ThreadPoolExecutor
         workers = self.workers
@@ -283,22 +573,156 @@ class UploadManager:
             Multithreading worker requires at least one worker or it must be None.
             Worker value provided: %d
             """ % workers)
-        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
-            # Start the load operations and mark each future with its URL
-            _pn_chunk = {executor.submit(self.upload_chunk, pn): pn for pn in part_nums}
-            for _processed_chunk in concurrent.futures.as_completed(_pn_chunk):
-                # Can access the completed part number as below if we need to.
-                # completed_part_number = _pn_chunk[_processed_chunk]
-                try:
-                    _processed_chunk.result()
-                except Exception as exc:
-                    self.error = str(exc)
-        self.upload_chunk(last_part_number)
+
+        part_nums = sorted(self.get_upload_part_number_set())
+        # Without an explicit completion step,
+        # upload the highest part number last(out of multithread) so server can decide to mark file completed.
+        last_part_number = None if self._FILE_COMPLETE_URL else part_nums.pop()
+        window = self.get_submission_window()
+        if self.prefetch:
+            # Parts waiting for a worker are held by the prefetcher, each submitted part is being sent.
+            window = self.get_worker_count()
+        # Parts being sent and parts read ahead.
+        reserved = window + self.prefetch
+        self.buffer_pool.reserve(reserved)
+        try:
+            self._send_parts(part_nums, window)
+            # Do not send the last part when the upload is already doomed.
+            if self._fatal_error is not None:
+                raise self._fatal_error
+            if last_part_number is not None:
+                self.upload_chunk(last_part_number)
+        finally:
+            self.buffer_pool.unreserve(reserved)
+        if last_part_number is None:
+            return self.complete()
+        self.set_upload_status(UPLOAD_COMPLETED)
+
+    def _send_parts(self, part_nums: typing.List[int], window: int):
+        """
+        Send the parts by `workers` threads, `window` parts submitted at a time.
+        """
+        workers = self.workers
+        prefetcher = None
+        # (part_number, chunk) pairs, chunk is read by the worker when None.
+        parts = ((part_number, None) for part_number in part_nums)
+        if self.prefetch:
+            prefetcher = ChunkPrefetcher(
+                self._read_pooled_chunk,
+                part_nums,
+                capacity=window + self.prefetch,
+                advise=lambda pn: self.advise_part(pn, "POSIX_FADV_WILLNEED"),
+                discard=self._release_chunk
+            )
+            parts = prefetcher.start()
+        self._abort_event.clear()
+        self._fatal_error = None
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                # Only a window of parts is submitted at a time, the next part is submitted as one completes.
+                pending = set()
+                for part_number, chunk in parts:
+                    if len(pending) >= window:
+                        pending = self._wait_for_parts(pending)
+                    if self._abort_event.is_set():
+                        self._release_chunk(chunk)
+                        break
+                    future = executor.submit(self.upload_chunk, part_number, chunk)
+                    if prefetcher:
+                        future.add_done_callback(functools.partial(self._release_prefetched, prefetcher, chunk))
+                    pending.add(future)
+                while pending:
+                    pending = self._wait_for_parts(pending)
+        finally:
+            if prefetcher:
+                prefetcher.close()
+
+    def _release_prefetched(self, prefetcher, chunk, _future=None):
+        self._release_chunk(chunk)
+        prefetcher.release()
+
+    def get_worker_count(self) -> int:
+        # Same default ThreadPoolExecutor uses when max_workers=None
+        return self.workers or min(32, (os.cpu_count() or 1) + 4)
+
+    def get_submission_window(self) -> int:
+        """
+        Maximum number of parts that can be submitted to the executor at once.
+        """
+        return self.get_worker_count() * self.SUBMISSION_WINDOW_FACTOR
+
+    def _wait_for_parts(self, pending: set) -> set:
+        """
+        Block until at least one of the pending parts is completed.
+        Return the parts that are still pending.
+        """
+        done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        for _processed_chunk in done:
+            if _processed_chunk.cancelled():
+                continue
+            try:
+                _processed_chunk.result()
+            except UploadAbortedError:
+                # Interrupted because of a fatal error in another part.
+                continue
+            except Exception as exc:
+                self.error = str(exc)
+                if self._fatal_error is None and self.is_fatal_error(exc):
+                    self._fatal_error = exc
+                    self.abort(pending)
+        return pending
+
+    def abort(self, pending=()):
+        """
+        Stop sending parts. Queued parts are cancelled, in-flight parts are interrupted.
+        """
+        self._abort_event.set()
+        for future in pending:
+            future.cancel()
+
+    def complete(self):
+        """
+        Tell Filelib API all parts are sent so the file can be finalized.
+        Only used when server provides a `complete_url`.
+        """
+        with httpx.Client() as client:
+            req = self._send_request(lambda: client.post(self._FILE_COMPLETE_URL, headers=self.auth.to_headers()))
+            if not req.is_success:
+                raise FilelibAPIException(*parse_api_err(req))
         self.set_upload_status(UPLOAD_COMPLETED)
 
     def cleanup(self):
         # so this works when used in a process.
         self.file = None
+        if self._direct_fd is not None:
+            os.close(self._direct_fd)
+            self._direct_fd = None
+
+    def close(self, close_file=False):
+        """
+        Release what the upload holds on to once it is finished.
+        `close_file` closes the file object as well.
+        """
+        if close_file and self.file is not None:
+            self.file.close()
+        self._FILE_ENTITY_URL_MAP = None
+        self.cache = None
+        self.cleanup()
+
+    def to_result(self) -> UploadResult:
+        return UploadResult(
+            file_name=self.file_name,
+            prefix=self.config.prefix,
+            url=self._FILE_ENTITY_URL,
+            size=self._FILE_SIZE,
+            status=self.get_upload_status(),
+            error=self.get_error(),
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            digest=self.digest,
+            compressed_size=self._compressed_size if self._codec else None,
+            compression_ratio=round(self._sent_size / self._compressed_size, 3) if self._codec and self._compressed_size else None
+        )
 
     def cancel(self):
         """
@@ -306,10 +730,11 @@ class UploadManager:
         and will delete all previously uploaded parts.
         """
         with httpx.Client() as client:
-            req = client.delete(self._FILE_ENTITY_URL, headers=self.auth.to_headers())
+            req = self._send_request(lambda: client.delete(self._FILE_ENTITY_URL, headers=self.auth.to_headers()))
             if not req.is_success:
                 raise FilelibAPIException(*parse_api_err(req))
             self.set_upload_status(UPLOAD_CANCELLED)
+            self.set_cache(self._CACHE_STATUS_KEY, UPLOAD_CANCELLED)
 
     def get_error(self):
         return self.error
@@ -320,21 +745,119 @@ class UploadManager:
         """
         return self._UPLOAD_PART_NUMBER_SET
 
+    def is_small_file(self) -> bool:
+        """
+        Small files are sent with a single request, unless there is an upload to resume.
+        """
+        if self._entity_prepared or not self.small_file_threshold or self.get_file_size() > self.small_file_threshold:
+            return False
+        return self.ignore_cache or not self.has_cache()
+
+    def single_request_upload(self) -> bool:
+        """
+        Create the file entity and send its content with a single multipart request.
+        Return False if Filelib API does not support it so the chunked upload can be used instead.
+        """
+        headers = self.auth.to_headers()
+        headers.update(self.config.to_headers())
+        with self._file_lock:
+            self.file.seek(0)
+            content = self.file.read()
+        files = {"file": (self.file_name, content, self.content_type or "application/octet-stream")}
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(len(content), self.config.storage)
+        with httpx.Client() as client:
+            req = self._send_throttled(
+                lambda: client.post(FILE_UPLOAD_SINGLE_URL, data=self._get_create_payload(), files=files, headers=headers)
+            )
+            if req.status_code in UNSUPPORTED_ENDPOINT_STATUS_CODES:
+                return False
+            if not req.is_success:
+                raise FilelibAPIException(*parse_api_err(req))
+        self._FILE_ENTITY_URL = req.headers.get(UPLOAD_LOCATION_HEADER)
+        self.set_upload_status(UPLOAD_COMPLETED)
+        return True
+
+    def get_compression_samples(self) -> typing.List[bytes]:
+        """
+        Read COMPRESSION_SAMPLE_SIZE bytes from the start of up to COMPRESSION_SAMPLE_PARTS parts spread over the file.
+        """
+        part_count = self.calculate_part_count()
+        step = max(1, part_count // self.COMPRESSION_SAMPLE_PARTS)
+        samples = []
+        for part_number in range(1, part_count + 1, step)[:self.COMPRESSION_SAMPLE_PARTS]:
+            with self._file_lock:
+                self.file.seek((part_number - 1) * self.UPLOAD_CHUNK_SIZE)
+                samples.append(self.file.read(self.COMPRESSION_SAMPLE_SIZE))
+        return samples
+
+    def init_compression(self):
+        """
+        Choose the codec to compress parts with, unless the content is already compressed(e.g. video, zip).
+        """
+        self._codec = None
+        if not self.compression or self.is_direct_upload:
+            return
+        codec = get_codec(self.compression)
+        if get_ratio(codec, self.get_compression_samples()) >= self.COMPRESSION_MIN_RATIO:
+            self._codec = codec
+
+    def deduplicate(self) -> bool:
+        """
+        Create the file as a copy of an uploaded file with the same content, if there is one.
+        Return False if there is none, or it cannot be copied, so the content is uploaded instead.
+        """
+        self.digest = get_digest(self.file, self._file_lock)
+        source_url = self.dedup_index.get(self.digest, self.get_file_size(), auth=self.auth, rate_limit_state=self.rate_limit_state)
+        if not source_url:
+            return False
+        headers = self.auth.to_headers()
+        headers.update(self.config.to_headers())
+        payload = dict(self._get_create_payload(), source_url=source_url, digest=self.digest)
+        with httpx.Client() as client:
+            req = self._send_request(lambda: client.post(FILE_UPLOAD_COPY_URL, data=payload, headers=headers))
+        if req.status_code in UNSUPPORTED_ENDPOINT_STATUS_CODES:
+            # Source is deleted, or copying is not supported.
+            self.dedup_index.discard(self.digest, self.get_file_size())
+            return False
+        if not req.is_success:
+            raise FilelibAPIException(*parse_api_err(req))
+        self._FILE_ENTITY_URL = req.headers.get(UPLOAD_LOCATION_HEADER)
+        self.set_upload_status(UPLOAD_COMPLETED)
+        return True
+
     def upload(self):
         """
         Upload file object to Filelib API
         """
+        self.started_at = time.time()
+        if self.dedup_index is not None and self.deduplicate():
+            self.finished_at = time.time()
+            return
+        if self.is_small_file() and self.single_request_upload():
+            # Nothing to resume.
+            self.finished_at = time.time()
+            if self.dedup_index is not None and self._FILE_ENTITY_URL:
+                self.dedup_index.add(self.digest, self.get_file_size(), self._FILE_ENTITY_URL)
+            return
         self.init_upload()
-        # return
+        if self.drop_page_cache:
+            advise_file(self.file, 0, 0, "POSIX_FADV_SEQUENTIAL")
         try:
 
             if not self.get_upload_part_number_set():
-                raise NoChunksToUpload("File `%s` does not have any parts to upload.", self.file_name)
-
-            if self.multithreading:
-                self.multithread_upload()
+                if self._FILE_COMPLETE_URL and self.get_upload_status() not in (UPLOAD_COMPLETED, UPLOAD_CANCELLED):
+                    # Every part was sent before the upload was interrupted, but it was not completed.
+                    self.complete()
+                else:
+                    raise NoChunksToUpload("File `%s` does not have any parts to upload.", self.file_name)
             else:
-                self.single_thread_upload()
+                self.init_compression()
+
+                if self.multithreading:
+                    self.multithread_upload()
+                else:
+                    self.single_thread_upload()
         except NoChunksToUpload:
             if self.get_upload_status() != UPLOAD_COMPLETED:
                 raise
@@ -344,6 +867,10 @@ class UploadManager:
             self.error = str(e)
             if self.abort_on_fail:
                 self.cancel()
+        self.finished_at = time.time()
+        if self.dedup_index is not None and self.get_upload_status() == UPLOAD_COMPLETED and self._FILE_ENTITY_URL:
+            self.dedup_index.add(self.digest, self.get_file_size(), self._FILE_ENTITY_URL)
+        self.set_cache(self._CACHE_STATUS_KEY, self.get_upload_status())
         # Clear cache after successful upload is opted in
         if self.clear_cache:
             self.truncate_cache()
@@ -1,9 +1,7 @@
 import os
 import random
 import string
-from multiprocessing import shared_memory
-
-import httpx
+import typing
 
 from filelib.constants import (
     ERROR_CODE_HEADER,
@@ -21,28 +19,39 @@ from filelib.exceptions import (
     FileObjectNotReadableError
 )
 
+if typing.TYPE_CHECKING:
+    import httpx
+
 # Create utility functions/classes here that can be shared
 
 
+def resolve_path(file: str) -> str:
+    """
+    Return the absolute path of given file path.
+    Validate it exists, readable, accessible
+    """
+    # Update if user dir: ~
+    path = os.path.expanduser(file)
+    # expand if relative.
+    path = os.path.abspath(path)
+
+    # Check if exists
+    if not os.path.isfile(path):
+        raise FileDoesNotExistError("File not found at given path: %s as real path: %s" % (file, path))
+
+    if not os.access(path, os.R_OK):
+        AccessToFileDeniedError("Filelib/python does not have permission to read file at: %s" % path)
+    return path
+
+
 def process_file(file_name, file):
     """
     Prepare file to be processed by UploadManager
     If file is a string, validate it exists, readable, accessible
     """
     if type(file) is str:
-        # Update if user dir: ~
-        path = os.path.expanduser(file)
-        # expand if relative.
-        path = os.path.abspath(path)
-
-        # Check if exists
-        if not os.path.isfile(path):
-            raise FileDoesNotExistError("File not found at given path: %s as real path: %s" % (file, path))
-
-        if not os.access(path, os.R_OK):
-            AccessToFileDeniedError("Filelib/python does not have permission to read file at: %s" % path)
         # all good. Open and assign file.
-        file = open(path, FILE_OPEN_MODE)
+        file = open(resolve_path(file), FILE_OPEN_MODE)
 
     # If file(-like object), must be readable
     if not (hasattr(file, "readable")) or not file.readable():
@@ -59,13 +68,31 @@ def process_file(file_name, file):
     return file_name, file
 
 
+def advise_file(file, offset: int, length: int, advice: str) -> bool:
+    """
+    Tell the OS how a range of the file is going to be accessed. (posix_fadvise)
+    `advice` is the name of the flag in `os` module. e.g. "POSIX_FADV_WILLNEED"
+    Does nothing where it is not supported(platform, in-memory file objects)
+    Return True if the advice is given.
+    """
+    flag = getattr(os, advice, None)
+    if flag is None or not hasattr(os, "posix_fadvise"):
+        return False
+    try:
+        fd = file.fileno()
+        os.posix_fadvise(fd, offset, length, flag)
+    except (AttributeError, OSError, ValueError):
+        return False
+    return True
+
+
 def get_random_string(length):
     # choose from all lowercase letter
     letters = string.ascii_letters
     return ''.join(random.choice(letters) for i in range(length))
 
 
-def parse_api_err(res: httpx.Response) -> tuple:
+def parse_api_err(res: "httpx.Response") -> tuple:
 
     error = res.headers.get(ERROR_MESSAGE_HEADER)
     code = res.status_code
@@ -74,12 +101,20 @@ def parse_api_err(res: httpx.Response) -> tuple:
 
 
 # Allow multiprocessing module to share memory between each process.
-def get_shared_memory(size=10):
+def get_shared_memory(size=10, name=SHARED_MEMORY_NAME, initial: typing.Union[str, bytes] = SHARED_MEMORY_START):
+    """
+    Create the shared memory block `name`, with `initial` written at its start, or attach to it if it exists.
+    Return (SharedMemory, is_new)
+    """
+    from multiprocessing import shared_memory
+
     try:
-        shared_mem = shared_memory.SharedMemory(create=True, name=SHARED_MEMORY_NAME, size=size)
+        shared_mem = shared_memory.SharedMemory(create=True, name=name, size=size)
         is_new = True
-        shared_mem.buf[:len(SHARED_MEMORY_START)] = bytearray(SHARED_MEMORY_START, "utf8")
+        if isinstance(initial, str):
+            initial = initial.encode("utf8")
+        shared_mem.buf[:len(initial)] = initial
     except FileExistsError:
-        shared_mem = shared_memory.SharedMemory(name=SHARED_MEMORY_NAME)
+        shared_mem = shared_memory.SharedMemory(name=name)
         is_new = False
     return shared_mem, is_new
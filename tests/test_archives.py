@@ -0,0 +1,102 @@
+import io
+import os
+import tarfile
+import tempfile
+import zipfile
+from unittest import TestCase
+
+from filelib.archives import (
+    ArchiveRangeReader,
+    MemberStream,
+    TarMemberSource,
+    ZipMemberSource,
+    iter_archive
+)
+from filelib.exceptions import ValidationError
+from filelib.streaming import is_stream
+
+
+class ArchivesTestCase(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.members = {"a.txt": b"a" * 1000, "docs/b.txt": b"b" * 10, "docs/c.bin": os.urandom(600)}
+
+    def gen_path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def read_members(self, path, **kwargs):
+        contents = {}
+        for relative_path, source in iter_archive(path, **kwargs):
+            file = source.open()
+            try:
+                contents[relative_path] = (file.read(), source.compressed, is_stream(file))
+            finally:
+                file.close()
+            self.assertEqual(source.size, len(contents[relative_path][0]))
+        return contents
+
+    def test_zip(self):
+        """
+        Stored members must be read in place through a seekable view, compressed ones streamed.
+        """
+        path = self.gen_path("bundle.zip")
+        with zipfile.ZipFile(path, "w") as archive:
+            archive.writestr("a.txt", self.members["a.txt"], compress_type=zipfile.ZIP_DEFLATED)
+            archive.writestr("docs/", b"")
+            archive.writestr("docs/b.txt", self.members["docs/b.txt"], compress_type=zipfile.ZIP_STORED)
+            archive.writestr("docs/c.bin", self.members["docs/c.bin"], compress_type=zipfile.ZIP_STORED)
+            archive.writestr("../evil.txt", b"evil")
+        contents = self.read_members(path)
+        self.assertEqual(contents, {
+            "a.txt": (self.members["a.txt"], True, True),
+            "docs/b.txt": (self.members["docs/b.txt"], False, False),
+            "docs/c.bin": (self.members["docs/c.bin"], False, False)
+        })
+        source = dict(iter_archive(path))["docs/c.bin"]
+        self.assertIsInstance(source, ZipMemberSource)
+        with source.open() as reader:
+            self.assertIsInstance(reader, ArchiveRangeReader)
+            reader.seek(500)
+            self.assertEqual(reader.read(), self.members["docs/c.bin"][500:])
+            self.assertEqual(reader.read(), b"")
+            self.assertEqual(reader.seek(0, io.SEEK_END), 600)
+        self.assertEqual(sorted(dict(iter_archive(path, include="*.txt", exclude="docs"))), ["a.txt"])
+
+    def test_tar(self):
+        """
+        Members of plain tar archives must be read in place, members of compressed ones streamed.
+        """
+        for name, mode, compressed in (("bundle.tar", "w", False), ("bundle.tar.gz", "w:gz", True)):
+            path = self.gen_path(name)
+            with tarfile.open(path, mode) as archive:
+                for member_name, content in self.members.items():
+                    info = tarfile.TarInfo(member_name)
+                    info.size = len(content)
+                    archive.addfile(info, io.BytesIO(content))
+                link = tarfile.TarInfo("link.txt")
+                link.type = tarfile.SYMTYPE
+                link.linkname = "a.txt"
+                archive.addfile(link)
+            contents = self.read_members(path)
+            self.assertEqual(contents, {key: (value, compressed, compressed) for key, value in self.members.items()})
+            source = dict(iter_archive(path))["a.txt"]
+            self.assertIsInstance(source, TarMemberSource)
+            if compressed:
+                with source.open() as reader:
+                    self.assertIsInstance(reader, MemberStream)
+                    self.assertFalse(reader.seekable())
+                # Reading every member of many is quadratic.
+                with self.assertRaises(ValidationError):
+                    iter_archive(path, max_compressed_members=len(self.members) - 1)
+                self.assertEqual(len(list(iter_archive(path, include="a.txt", max_compressed_members=1))), 1)
+            else:
+                self.assertEqual(len(list(iter_archive(path, max_compressed_members=0))), len(self.members))
+
+    def test_not_an_archive(self):
+        path = self.gen_path("plain.txt")
+        with open(path, "wb") as f:
+            f.write(b"plain")
+        with self.assertRaises(ValidationError):
+            iter_archive(path)
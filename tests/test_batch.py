@@ -0,0 +1,140 @@
+import io
+import threading
+from unittest import TestCase, mock
+
+import httpx
+
+from filelib import FilelibConfig
+from filelib.batch import EntityBatcher
+from filelib.cache import MemoryCache
+from filelib.constants import (
+    FILE_UPLOAD_BATCH_URL,
+    RETRY_AFTER_HEADER,
+    UPLOAD_LOCATION_HEADER
+)
+from filelib.exceptions import FilelibAPIException
+from filelib.ratelimit import RateLimitState
+from filelib.sources import FileSource
+from filelib.upload_manager import UploadManager
+from tests.mocks import mock_authentication, mock_request
+
+
+class EntityBatcherTestCase(TestCase):
+
+    def setUp(self):
+        self.auth = mock_authentication()
+        self.auth.to_headers.return_value = {}
+        self.config = FilelibConfig(storage="test_storage")
+
+    def gen_file_args(self, name, size=10, config=None):
+        return {"file": io.BytesIO(b"a" * size), "file_name": name, "config": config or self.config, "content_type": None}
+
+    def test_create(self):
+        """
+        Files of a batch must be created with a single request and an entity returned per file.
+        """
+        batcher = EntityBatcher(self.auth)
+        batch = [self.gen_file_args("a.txt", 1), self.gen_file_args("b.txt", 2)]
+        entities = [{"headers": {UPLOAD_LOCATION_HEADER: "https://filelib.com/%d" % i}, "data": {}} for i in range(2)]
+        with mock_request("post", response={"data": entities}) as post:
+            self.assertEqual(batcher.create(batch), entities)
+        post.assert_called_once()
+        self.assertEqual(post.call_args[0][0], FILE_UPLOAD_BATCH_URL)
+        self.assertEqual(
+            post.call_args[1]["json"]["files"],
+            [{"file_name": "a.txt", "file_size": 1, "mimetype": None}, {"file_name": "b.txt", "file_size": 2, "mimetype": None}]
+        )
+        # Mismatching entity count
+        with mock_request("post", response={"data": entities[:1]}):
+            with self.assertRaises(FilelibAPIException):
+                batcher.create(batch)
+        with mock_request("post", status_code=400):
+            with self.assertRaises(FilelibAPIException):
+                batcher.create(batch)
+        self.assertTrue(batcher.supported)
+        # Not supported by the API
+        with mock_request("post", status_code=404):
+            self.assertEqual(batcher.create(batch), [None, None])
+        self.assertFalse(batcher.supported)
+        with self.assertRaises(ValueError):
+            EntityBatcher(self.auth, batch_size=0)
+
+        # Throttled requests pause the shared state and are sent again.
+        state = mock.Mock(spec=RateLimitState)
+        state.wait.return_value = True
+        batcher = EntityBatcher(self.auth, rate_limit_state=state)
+        request = httpx.Request(method="post", url="")
+        throttled = httpx.Response(status_code=429, request=request, headers={RETRY_AFTER_HEADER: "2"})
+        with mock_request("post", response={"data": entities}) as post:
+            post.side_effect = [throttled, post.return_value]
+            self.assertEqual(batcher.create(batch), entities)
+        self.assertEqual(post.call_count, 2)
+        state.pause.assert_called_once_with(2.0)
+
+    def test_iter_created(self):
+        """
+        Files must be batched by config, big files must not wait for a batch,
+        and the next batch must be created before the files of the current one are handed out.
+        """
+        created = []
+        next_batch_created = threading.Event()
+        batcher = EntityBatcher(self.auth, batch_size=2, max_file_size=10)
+
+        def create(batch):
+            names = [args["file_name"] for args in batch]
+            created.append(names)
+            if names == ["c.txt"]:
+                next_batch_created.set()
+            if "e.txt" in names:
+                raise FilelibAPIException("error")
+            return [{"headers": {}, "data": {"name": name}} for name in names]
+
+        other_config = FilelibConfig(storage="test_storage", prefix="other")
+        files = [
+            ("a", self.gen_file_args("a.txt")),
+            ("big", {"file": FileSource("/big", 11, 0), "file_name": "big", "config": self.config}),
+            ("b", self.gen_file_args("b.txt")),
+            ("c", self.gen_file_args("c.txt")),
+            ("d", self.gen_file_args("d.txt", config=other_config)),
+            ("e", self.gen_file_args("e.txt", config=other_config))
+        ]
+        yielded = []
+        with mock.patch.object(batcher, "create", side_effect=create), self.assertLogs("filelib.batch", "WARNING"):
+            for key, file_args, entity in batcher.iter_created(files):
+                if key == "a":
+                    # Next batch is being created while the current one is handed out.
+                    self.assertTrue(next_batch_created.wait(timeout=5))
+                yielded.append((key, entity))
+        self.assertEqual(created, [["a.txt", "b.txt"], ["c.txt"], ["d.txt", "e.txt"]])
+        self.assertEqual(yielded, [
+            ("big", None),
+            ("a", {"headers": {}, "data": {"name": "a.txt"}}),
+            ("b", {"headers": {}, "data": {"name": "b.txt"}}),
+            ("c", {"headers": {}, "data": {"name": "c.txt"}}),
+            # Failed batch falls back to creating files on their own.
+            ("d", None),
+            ("e", None)
+        ])
+        self.assertEqual(str(batcher.error), "error")
+
+    def test_resume_not_batched(self):
+        """
+        Files with an interrupted upload in their cache must be resumed instead of created again in a batch.
+        """
+        batcher = EntityBatcher(self.auth)
+        backend = MemoryCache()
+        resumed = self.gen_file_args("resumed.txt")
+        resumed["cache_backend"] = backend
+        namespace = UploadManager.make_cache_namespace(b"a" * 10, "resumed.txt")
+        backend.namespace(str(namespace)).set(UploadManager._CACHE_ENTITY_KEY, "https://filelib.com/resumed")
+        self.assertFalse(batcher.is_batchable(resumed))
+        # Reading the head must not move the file.
+        self.assertEqual(resumed["file"].tell(), 0)
+        resumed["ignore_cache"] = True
+        self.assertTrue(batcher.is_batchable(resumed))
+        other = self.gen_file_args("other.txt")
+        other["cache_backend"] = backend
+        self.assertTrue(batcher.is_batchable(other))
+        cache = mock.Mock()
+        cache.get.return_value = "https://filelib.com/resumed"
+        self.assertFalse(batcher.is_batchable(dict(other, cache=cache)))
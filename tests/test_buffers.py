@@ -0,0 +1,73 @@
+import mmap
+import threading
+from unittest import TestCase
+
+from filelib.buffers import BufferPool
+
+
+class BufferPoolTestCase(TestCase):
+
+    def test_buffers_are_reused(self):
+        """
+        Released buffers must be handed out again instead of allocating new ones.
+        """
+        pool = BufferPool(count=2)
+        first = pool.acquire(10)
+        self.assertIsInstance(first, mmap.mmap)
+        self.assertEqual(len(first), 10)
+        pool.release(first)
+        self.assertIs(pool.acquire(5), first)
+        # A buffer too small for the requested size must be replaced.
+        pool.release(first)
+        bigger = pool.acquire(20)
+        self.assertEqual(len(bigger), 20)
+        self.assertEqual(pool._allocated, 1)
+
+    def test_acquire_blocks_at_count(self):
+        """
+        acquire must block when every buffer is in use until one is released or the pool grows.
+        """
+        pool = BufferPool(count=1)
+        buffer = pool.acquire(10)
+        acquired = []
+        thread = threading.Thread(target=lambda: acquired.append(pool.acquire(10)))
+        thread.start()
+        thread.join(0.05)
+        self.assertEqual(acquired, [])
+        pool.release(buffer)
+        thread.join(1)
+        self.assertEqual(acquired, [buffer])
+
+        thread = threading.Thread(target=lambda: acquired.append(pool.acquire(10)))
+        thread.start()
+        thread.join(0.05)
+        self.assertEqual(len(acquired), 1)
+        pool.reserve(2)
+        thread.join(1)
+        self.assertEqual(len(acquired), 2)
+        self.assertEqual(pool.count, 2)
+
+        with self.assertRaises(ValueError):
+            BufferPool(count=0)
+
+    def test_reserve_is_additive(self):
+        """
+        Reservations of uploads sharing the pool must add up, and buffers must be dropped once they are given back.
+        """
+        pool = BufferPool(count=1)
+        pool.reserve(1)
+        pool.reserve(3)
+        self.assertEqual(pool.count, 4)
+        buffers = [pool.acquire(10) for _ in range(4)]
+        pool.unreserve(3)
+        self.assertEqual(pool.count, 1)
+        # Buffers released above the count are not kept.
+        for buffer in buffers:
+            pool.release(buffer)
+        self.assertEqual(pool._allocated, 1)
+        self.assertEqual(len(pool._free), 1)
+        pool.unreserve(1)
+        self.assertEqual(pool.count, 1)
+        # Unreserving more than is reserved must never shrink the pool below its count.
+        pool.unreserve(5)
+        self.assertEqual(pool.count, 1)
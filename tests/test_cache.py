@@ -0,0 +1,159 @@
+import os
+import shutil
+import time
+from unittest import TestCase, mock
+
+from filelib.cache import (
+    CACHE_STATUS_KEY,
+    RESERVED_NAMESPACE_PREFIX,
+    CacheNamespace,
+    KVCache,
+    LocalKVStore,
+    MemoryCache,
+    SQLiteCache
+)
+from filelib.constants import (
+    UPLOAD_CANCELLED,
+    UPLOAD_COMPLETED,
+    UPLOAD_STARTED
+)
+
+
+class CacheBackendTestMixin:
+    """
+    Behaviour every cache backend must have.
+    """
+    # Expired entries are kept until gc and can be read with `include_expired`.
+    keeps_expired = True
+
+    def gen_backend(self, ttl=60):
+        raise NotImplementedError
+
+    def test_namespace_methods(self):
+        """
+        namespace() must return a view with jmstorage.Cache methods.
+        """
+        backend = self.gen_backend()
+        cache = backend.namespace("123")
+        self.assertIsInstance(cache, CacheNamespace)
+        self.assertIsNone(cache.get("LOCATION"))
+        cache.set("LOCATION", "https://testserver/upload/1")
+        cache.set("other", {"a": 1})
+        self.assertEqual(cache.get("LOCATION"), "https://testserver/upload/1")
+        self.assertEqual(cache.get("other"), {"a": 1})
+        # Namespaces must not share values.
+        self.assertIsNone(backend.namespace("456").get("LOCATION"))
+        self.assertEqual(cache.pop("other"), {"a": 1})
+        self.assertIsNone(cache.get("other"))
+        cache.delete("LOCATION")
+        self.assertIsNone(cache.get("LOCATION"))
+        cache.set("LOCATION", "url")
+        cache.truncate()
+        self.assertIsNone(cache.get("LOCATION"))
+
+    def test_ttl(self):
+        """
+        Entries must expire ttl seconds after they are written.
+        """
+        backend = self.gen_backend(ttl=60)
+        backend.namespace("1").set("LOCATION", "url")
+        self.assertEqual([ns for ns, _t in backend.namespaces()], ["1"])
+        with mock.patch("time.time", return_value=time.time() + 61):
+            if self.keeps_expired:
+                self.assertEqual(backend.get("1", "LOCATION", include_expired=True), "url")
+                self.assertEqual([ns for ns, _t in backend.namespaces(include_expired=True)], ["1"])
+            self.assertIsNone(backend.namespace("1").get("LOCATION"))
+            self.assertEqual(list(backend.namespaces()), [])
+
+    def test_gc(self):
+        """
+        gc must remove finished uploads, uploads older than max_age and expired entries.
+        """
+        backend = self.gen_backend(ttl=60)
+        backend.namespace("completed").set(CACHE_STATUS_KEY, UPLOAD_COMPLETED)
+        backend.namespace("cancelled").set(CACHE_STATUS_KEY, UPLOAD_CANCELLED)
+        backend.namespace("started").set(CACHE_STATUS_KEY, UPLOAD_STARTED)
+        backend.namespace("started").set("LOCATION", "url")
+        self.assertEqual(backend.gc(), 2)
+        self.assertEqual([ns for ns, _t in backend.namespaces()], ["started"])
+        # Not stale yet
+        self.assertEqual(backend.gc(max_age=30), 0)
+        with mock.patch("time.time", return_value=time.time() + 31):
+            self.assertEqual(backend.gc(max_age=30), 1)
+        self.assertEqual(list(backend.namespaces()), [])
+
+    def test_reserved_namespaces(self):
+        """
+        Reserved namespaces must not be listed nor removed by gc as uploads.
+        """
+        backend = self.gen_backend(ttl=60)
+        reserved = backend.namespace(RESERVED_NAMESPACE_PREFIX + "dedup")
+        reserved.set("sha256:abc:7", "https://testserver/file/1")
+        backend.namespace("started").set(CACHE_STATUS_KEY, UPLOAD_STARTED)
+        self.assertEqual([ns for ns, _t in backend.namespaces()], ["started"])
+        with mock.patch("time.time", return_value=time.time() + 31):
+            self.assertEqual(backend.gc(max_age=30), 1)
+        self.assertEqual(reserved.get("sha256:abc:7"), "https://testserver/file/1")
+
+
+class MemoryCacheTestCase(CacheBackendTestMixin, TestCase):
+
+    def gen_backend(self, ttl=60):
+        return MemoryCache(ttl=ttl)
+
+    def test_lru_eviction(self):
+        """
+        Least recently used namespace must be evicted after max_namespaces.
+        """
+        backend = MemoryCache(max_namespaces=2)
+        backend.namespace("1").set("LOCATION", "1")
+        backend.namespace("2").set("LOCATION", "2")
+        backend.namespace("1").get("LOCATION")
+        backend.namespace("3").set("LOCATION", "3")
+        self.assertEqual(backend.namespace("1").get("LOCATION"), "1")
+        self.assertIsNone(backend.namespace("2").get("LOCATION"))
+
+
+class SQLiteCacheTestCase(CacheBackendTestMixin, TestCase):
+    test_path = "./test_tmp_sqlite"
+
+    def gen_backend(self, ttl=60):
+        os.makedirs(self.test_path, exist_ok=True)
+        return SQLiteCache(path=os.path.join(self.test_path, "cache_%d.sqlite3" % time.perf_counter_ns()), ttl=ttl)
+
+    def test_persists_in_single_file(self):
+        """
+        Every namespace must be stored in the same file and survive reopening it.
+        """
+        backend = self.gen_backend()
+        backend.namespace("1").set("LOCATION", "1")
+        backend.namespace("2").set("LOCATION", "2")
+        backend.close()
+        reopened = SQLiteCache(path=backend.path)
+        self.assertEqual(reopened.namespace("2").get("LOCATION"), "2")
+        self.assertEqual(sorted(ns for ns, _t in reopened.namespaces()), ["1", "2"])
+        # WAL journal files are named after the database.
+        self.assertTrue(all(name.startswith(os.path.basename(backend.path)) for name in os.listdir(self.test_path)))
+        reopened.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_path, ignore_errors=True)
+
+
+class KVCacheTestCase(CacheBackendTestMixin, TestCase):
+    # The store drops expired keys.
+    keeps_expired = False
+
+    def gen_backend(self, ttl=60):
+        return KVCache(LocalKVStore(), ttl=ttl)
+
+    def test_ttl_is_passed_to_store(self):
+        """
+        Expiry must be delegated to the store.
+        """
+        store = mock.Mock(wraps=LocalKVStore())
+        backend = KVCache(store, prefix="test:", ttl=60)
+        backend.namespace("1").set("LOCATION", "url")
+        key, _value = store.set.call_args.args
+        self.assertEqual(key, "test:1:LOCATION")
+        self.assertEqual(store.set.call_args.kwargs, {"ex": 60})
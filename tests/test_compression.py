@@ -0,0 +1,40 @@
+import gzip
+import os
+import sys
+from unittest import TestCase, mock
+
+from filelib.compression import GzipCodec, get_codec, get_ratio
+
+
+class CompressionTestCase(TestCase):
+
+    def test_get_codec(self):
+        """
+        `auto` must prefer zstd and fall back to gzip if zstandard is not installed.
+        """
+        with mock.patch.dict(sys.modules, {"zstandard": None}):
+            self.assertIsInstance(get_codec("auto"), GzipCodec)
+            with self.assertRaises(ImportError):
+                get_codec("zstd")
+        zstandard = mock.Mock()
+        zstandard.ZstdCompressor.return_value.compress.return_value = b"compressed"
+        with mock.patch.dict(sys.modules, {"zstandard": zstandard}):
+            codec = get_codec("auto")
+            self.assertEqual(codec.name, "zstd")
+            self.assertEqual(codec.compress(b"data"), b"compressed")
+        self.assertIsInstance(get_codec("gzip"), GzipCodec)
+        with self.assertRaises(ValueError):
+            get_codec("brotli")
+
+    def test_gzip_codec(self):
+        data = b"timestamp,level,message\n" * 1000
+        self.assertEqual(gzip.decompress(GzipCodec().compress(memoryview(data))), data)
+
+    def test_get_ratio(self):
+        """
+        Text must compress well, random(already compressed) data must not.
+        """
+        codec = GzipCodec()
+        self.assertGreater(get_ratio(codec, [b"a,b,c\n" * 10000, b"x" * 100]), 10)
+        self.assertLess(get_ratio(codec, [os.urandom(10000)]), 1.1)
+        self.assertEqual(get_ratio(codec, [b""]), 1.0)
@@ -0,0 +1,57 @@
+import hashlib
+import io
+from unittest import TestCase
+
+from filelib.cache import MemoryCache
+from filelib.constants import FILE_DEDUP_URL
+from filelib.dedup import DedupIndex, get_digest
+from filelib.exceptions import FilelibAPIException
+from tests.mocks import mock_authentication, mock_request
+
+
+class DedupIndexTestCase(TestCase):
+
+    def setUp(self):
+        self.auth = mock_authentication()
+        self.auth.to_headers.return_value = {}
+        self.digest = "sha256:" + "a" * 64
+
+    def test_get_digest(self):
+        content = b"iamfile" * 100000
+        self.assertEqual(get_digest(io.BytesIO(content), block_size=1000), "sha256:" + hashlib.sha256(content).hexdigest())
+        self.assertEqual(get_digest(io.BytesIO(b"")), "sha256:" + hashlib.sha256(b"").hexdigest())
+
+    def test_local_index(self):
+        """
+        Entries must be found by digest and size.
+        """
+        index = DedupIndex(backend=MemoryCache())
+        self.assertIsNone(index.get(self.digest, 10))
+        index.add(self.digest, 10, "https://filelib.com/file/")
+        self.assertEqual(index.get(self.digest, 10), "https://filelib.com/file/")
+        self.assertIsNone(index.get(self.digest, 11))
+        index.discard(self.digest, 10)
+        self.assertIsNone(index.get(self.digest, 10))
+
+    def test_remote_lookup(self):
+        """
+        Digests missing locally must be looked up from Filelib API if `remote`, and kept locally.
+        """
+        index = DedupIndex(remote=True)
+        with mock_request("get", response={"data": {"url": "https://filelib.com/file/"}}) as get:
+            self.assertEqual(index.get(self.digest, 10, auth=self.auth), "https://filelib.com/file/")
+            self.assertEqual(get.call_args[0][0], FILE_DEDUP_URL)
+            self.assertEqual(get.call_args[1]["params"], {"digest": self.digest, "file_size": 10})
+            index.get(self.digest, 10, auth=self.auth)
+            get.assert_called_once()
+        with mock_request("get", status_code=404):
+            self.assertIsNone(index.get(self.digest, 11, auth=self.auth))
+        with mock_request("get", status_code=500):
+            with self.assertRaises(FilelibAPIException):
+                index.get(self.digest, 11, auth=self.auth)
+        # Not supported: not asked again.
+        with mock_request("get", status_code=501) as get:
+            self.assertIsNone(index.get(self.digest, 11, auth=self.auth))
+            self.assertIsNone(index.get(self.digest, 11, auth=self.auth))
+            get.assert_called_once()
+        self.assertIsNone(DedupIndex().get(self.digest, 12, auth=self.auth))
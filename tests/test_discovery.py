@@ -0,0 +1,75 @@
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from filelib.discovery import walk_directory
+from filelib.sources import FileSource
+
+
+class WalkDirectoryTestCase(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = self.tmp_dir.name
+        self.files = {
+            "a.txt": b"a",
+            "b.jpg": b"bb",
+            "docs/c.txt": b"ccc",
+            "docs/deep/d.txt": b"dddd",
+            "node_modules/e.txt": b"e"
+        }
+        for relative_path, content in self.files.items():
+            path = os.path.join(self.root, *relative_path.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(content)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_walk_directory(self):
+        """
+        Every file must be yielded with its path relative to root and a FileSource with its size.
+        """
+        found = dict(walk_directory(self.root, workers=3))
+        self.assertEqual(sorted(found), sorted(self.files))
+        for relative_path, source in found.items():
+            self.assertIsInstance(source, FileSource)
+            self.assertEqual(source.size, len(self.files[relative_path]))
+            self.assertEqual(source.path, os.path.join(self.root, *relative_path.split("/")))
+        with self.assertRaises(ValueError):
+            list(walk_directory(self.root, workers=0))
+
+    def test_walk_directory_patterns(self):
+        """
+        Files must match `include`. Excluded directories must not be scanned.
+        """
+        scanned = []
+        scandir = os.scandir
+
+        def track(path):
+            scanned.append(path)
+            return scandir(path)
+
+        with mock.patch("os.scandir", side_effect=track):
+            found = dict(walk_directory(self.root, include="*.txt", exclude=["node_modules", "docs/deep/*"]))
+        self.assertEqual(sorted(found), ["a.txt", "docs/c.txt"])
+        self.assertNotIn(os.path.join(self.root, "node_modules"), scanned)
+
+    def test_walk_directory_onerror(self):
+        """
+        Directories that cannot be scanned must be reported to `onerror` and skipped.
+        """
+        errors = []
+        scandir = os.scandir
+
+        def fail_docs(path):
+            if path.endswith("docs"):
+                raise PermissionError("denied")
+            return scandir(path)
+
+        with mock.patch("os.scandir", side_effect=fail_docs):
+            found = dict(walk_directory(self.root, onerror=errors.append))
+        self.assertEqual(sorted(found), ["a.txt", "b.jpg", "node_modules/e.txt"])
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], PermissionError)
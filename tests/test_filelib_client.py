@@ -1,19 +1,41 @@
+import datetime
 import io
+import json
 import os
 import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
 from copy import deepcopy
 from unittest import TestCase, mock
 
+import httpx
 from jmstorage import Cache
 
 from filelib import Authentication, Client, FilelibConfig, UploadManager
+from filelib.cache import CACHE_STATUS_KEY, MemoryCache
 from filelib.constants import (
     CREDENTIAL_SOURCE_OPTION_ENV,
     CREDENTIAL_SOURCE_OPTION_FILE,
     ENV_API_KEY_IDENTIFIER,
-    ENV_API_SECRET_IDENTIFIER
+    ENV_API_SECRET_IDENTIFIER,
+    UPLOAD_COMPLETED,
+    UPLOAD_FAILED,
+    UPLOAD_STARTED
 )
-from filelib.exceptions import FileNameRequiredError
+from filelib.dedup import DedupIndex
+from filelib.exceptions import (
+    FileDoesNotExistError,
+    FileNameRequiredError,
+    ValidationError
+)
+from filelib.ratelimit import RateLimitState
+from filelib.results import UploadResult
+from filelib.sinks import BaseResultSink, JSONLResultSink
+from filelib.sources import BufferReader, FileSource
+from tests.mocks import mock_request
 
 
 class FilelibClientTestCase(TestCase):
@@ -111,7 +133,9 @@ class FilelibClientTestCase(TestCase):
         self.assertEqual(type(added_file), dict)
         # values dict must contain the following keys
         expected_key_list = ['file_name', 'file', 'config', 'cache', 'auth', 'multithreading', 'workers',
-                             'content_type', 'ignore_cache', 'abort_on_fail', 'clear_cache']
+                             'content_type', 'ignore_cache', 'abort_on_fail', 'clear_cache', 'prefetch',
+                             'buffer_pool', 'drop_page_cache', 'direct_io', 'cache_backend', 'small_file_threshold',
+                             'compression', 'dedup_index', 'rate_limiter', 'rate_limit_state']
         self.assertEqual(list(added_file.keys()), expected_key_list)
 
         # Test default values assigned to optional parameters
@@ -134,6 +158,15 @@ class FilelibClientTestCase(TestCase):
         self.assertEqual(added_file["multithreading"], False)
         # workers must be None
         self.assertEqual(added_file["workers"], None)
+        # prefetch must default to 2
+        self.assertEqual(added_file["prefetch"], 2)
+        # Buffers must be shared between files of the client.
+        self.assertEqual(added_file["buffer_pool"], client.buffer_pool)
+        # Page cache friendly options must be off by default
+        self.assertEqual(added_file["drop_page_cache"], False)
+        self.assertEqual(added_file["direct_io"], False)
+        # cache_backend must be the client's backend.
+        self.assertEqual(added_file["cache_backend"], client.cache_backend)
 
         # Providing all parameters to `add_file`
         file = self.file
@@ -181,18 +214,551 @@ class FilelibClientTestCase(TestCase):
         """
         Initializing the Client with multiprocess False must use single process upload.
         Must call `Client.single_process`
-        Aftermath must set Client.PROCESSED_FILES[instance_index][file_index] to instance of UploadManager
+        Aftermath must set Client.PROCESSED_FILES[instance_index][file_index] to an UploadResult
+        and release the added file.
 
         """
         client = self.gen_client()
         params = deepcopy(self.add_file_params)
         client.add_file(**params)
+        file_index = list(client.get_files().keys())[0]
         with mock.patch("filelib.UploadManager.upload", return_value=lambda x: None):
             client.upload()
-            file_index = list(client.get_files().keys())[0]
             self.assertTrue(file_index in client.get_processed_files())
             processed_file = client.get_processed_files()[file_index]
-            self.assertEqual(type(processed_file), UploadManager)
+            self.assertEqual(type(processed_file), UploadResult)
+            self.assertEqual(processed_file.file_name, self.file_name)
+            self.assertEqual(client.get_files(), {})
+
+    def test_single_process_releases_files(self):
+        """
+        Files added by path must not be opened until their upload starts, and closed once uploaded.
+        Open files must be bound by `max_open_files`.
+        File objects provided by the user must be left open, but not referenced.
+        An UploadResult must be recorded even if upload raises.
+        """
+        client = self.gen_client(max_open_files=1)
+        opened = []
+
+        def upload(up):
+            if opened:
+                raise ValueError("error")
+            opened.append(up.file)
+            # The budget of open files is taken.
+            self.assertFalse(client._open_files.acquire(blocking=False))
+
+        with tempfile.NamedTemporaryFile() as tmp:
+            tmp.write(b"iamfile")
+            tmp.flush()
+            client.add_file(file=tmp.name, config=self.config, cache=self.cache)
+            client.add_file(**deepcopy(self.add_file_params))
+            source = list(client.get_files().values())[0]["file"]
+            self.assertIsInstance(source, FileSource)
+            self.assertEqual(source.size, 7)
+            self.assertEqual(list(client.get_files().values())[0]["file_name"], os.path.basename(source.path))
+            with mock.patch("filelib.UploadManager.upload", autospec=True, side_effect=upload):
+                with self.assertRaises(ValueError):
+                    client.upload()
+        self.assertEqual(len(opened), 1)
+        self.assertTrue(opened[0].closed)
+        self.assertFalse(self.file.closed)
+        self.assertEqual(client.get_files(), {})
+        self.assertEqual(len(client.get_processed_files()), 2)
+        # Budget is given back.
+        self.assertTrue(client._open_files.acquire(blocking=False))
+
+    def test_upload_deleted_file(self):
+        """
+        A file that cannot be opened once its upload starts must be recorded as failed without stopping the rest.
+        """
+        client = self.gen_client()
+        with tempfile.TemporaryDirectory() as root:
+            paths = [os.path.join(root, name) for name in ("deleted.txt", "kept.txt")]
+            for path in paths:
+                with open(path, "wb") as f:
+                    f.write(b"iamfile")
+                client.add_file(file=path, config=self.config, cache=self.cache)
+            os.remove(paths[0])
+            with mock.patch("filelib.UploadManager.upload", autospec=True) as upload:
+                client.upload()
+        upload.assert_called_once()
+        results = {result.file_name: result for result in client.get_processed_files().values()}
+        self.assertEqual(sorted(results), ["deleted.txt", "kept.txt"])
+        self.assertEqual(results["deleted.txt"].status, UPLOAD_FAILED)
+        self.assertIn(paths[0], results["deleted.txt"].error)
+        self.assertNotEqual(results["kept.txt"].status, UPLOAD_FAILED)
+
+    def test_upload_continues_after_failure(self):
+        """
+        Files queued behind a failed one must be uploaded before its error is raised.
+        """
+        for workers in (1, 2):
+            client = self.gen_client()
+            for i in range(3):
+                client.add_file(file=io.BytesIO(b"iamfile"), config=self.config, file_name="f%d.txt" % i, cache=self.cache)
+
+            def upload(up):
+                if up.file_name == "f0.txt":
+                    raise ValueError("error")
+                up.set_upload_status(UPLOAD_COMPLETED)
+
+            with mock.patch("filelib.UploadManager.upload", autospec=True, side_effect=upload):
+                with self.assertRaises(ValueError):
+                    client.upload(workers=workers)
+            results = {result.file_name: result.status for result in client.get_processed_files().values()}
+            self.assertEqual(results, {"f0.txt": UPLOAD_FAILED, "f1.txt": UPLOAD_COMPLETED, "f2.txt": UPLOAD_COMPLETED})
+            self.assertEqual(client.get_files(), {})
+
+    def test_upload_workers_share_buffer_pool(self):
+        """
+        Files uploaded by concurrent workers must each get a buffer of the shared pool.
+        """
+        client = self.gen_client()
+        for name in ("first.txt", "second.txt"):
+            client.add_file(file=io.BytesIO(b"0"), config=self.config, file_name=name, cache=self.cache, multithreading=False)
+        # Passed only if both files are being sent at once.
+        barrier = threading.Barrier(2, timeout=5)
+        sent = []
+
+        def upload(up):
+            up.single_thread_upload()
+
+        def send_part(up, part_number, chunk):
+            barrier.wait()
+            sent.append(up.file_name)
+
+        with mock.patch("filelib.UploadManager.upload", autospec=True, side_effect=upload):
+            with mock.patch("filelib.UploadManager.get_upload_part_number_set", return_value={1}):
+                with mock.patch("filelib.UploadManager._send_part", autospec=True, side_effect=send_part):
+                    client.upload(workers=2)
+        self.assertEqual(sorted(sent), ["first.txt", "second.txt"])
+        self.assertEqual(client.buffer_pool.count, 1)
+
+    def test_upload_schedule(self):
+        """
+        Added files must be uploaded in the order of the scheduling policy, on up to `workers` threads.
+        Scheduling arguments must not be passed to UploadManager.
+        """
+        uploaded = []
+        lock = threading.Lock()
+
+        def upload(up):
+            with lock:
+                uploaded.append(up.file_name)
+
+        files = (("large.bin", b"0" * 100, 0, None), ("small.txt", b"0", 1, None), ("urgent.txt", b"0" * 10, 0, time.time()))
+        expected = {
+            "priority": ["small.txt", "large.bin", "urgent.txt"],
+            "sjf": ["small.txt", "urgent.txt", "large.bin"],
+            "edf": ["urgent.txt", "small.txt", "large.bin"]
+        }
+        for policy, names in expected.items():
+            client = self.gen_client()
+            for name, content, priority, deadline in files:
+                client.add_file(file=io.BytesIO(content), config=self.config, file_name=name, cache=self.cache, priority=priority, deadline=deadline)
+            uploaded.clear()
+            with mock.patch("filelib.UploadManager.upload", autospec=True, side_effect=upload):
+                client.upload(policy=policy)
+            self.assertEqual(uploaded, names)
+            self.assertEqual(client.FILE_SCHEDULES[client.instance_index], {})
+
+        client = self.gen_client()
+        deadline = datetime.datetime(2030, 1, 1, tzinfo=datetime.timezone.utc)
+        client.add_file(file=io.BytesIO(b"0"), config=self.config, file_name="first.txt", cache=self.cache, deadline=deadline)
+        self.assertEqual(list(client.FILE_SCHEDULES[client.instance_index].values()), [{"priority": 0, "deadline": deadline.timestamp()}])
+        client.ADDED_ITERABLES.append(iter([
+            {"file": io.BytesIO(b"0"), "file_name": name, "config": self.config, "cache": self.cache, "priority": priority}
+            for name, priority in (("low.txt", -1), ("high.txt", 1))
+        ]))
+        uploaded.clear()
+        with mock.patch("filelib.UploadManager.upload", autospec=True, side_effect=upload):
+            client.upload()
+        self.assertEqual(uploaded, ["high.txt", "first.txt", "low.txt"])
+        self.assertEqual(len(client.get_processed_files()), 3)
+
+        client = self.gen_client()
+        for name in ("first.txt", "second.txt", "third.txt"):
+            client.add_file(file=io.BytesIO(b"0"), config=self.config, file_name=name, cache=self.cache)
+        uploaded.clear()
+        with mock.patch("filelib.UploadManager.upload", autospec=True, side_effect=upload):
+            client.upload(workers=2)
+        self.assertEqual(sorted(uploaded), ["first.txt", "second.txt", "third.txt"])
+        self.assertEqual(len(client.get_processed_files()), 3)
+        with self.assertRaises(ValidationError):
+            client.upload(workers=0)
+
+    def test_upload_streams(self):
+        """
+        Streams must be uploaded with StreamUploadManager, concurrently, without waiting on each other's buffers.
+        """
+        client = self.gen_client()
+        sent = {}
+        lock = threading.Lock()
+
+        def send_part(up, part_number, chunk):
+            with lock:
+                sent[up.file_name] = sent.get(up.file_name, b"") + bytes(chunk)
+
+        for i in range(3):
+            client.add_file(file=iter([b"part%d" % i] * 3), config=self.config, file_name="stream_%d.bin" % i)
+        with mock.patch("filelib.streaming.StreamUploadManager.init_upload"):
+            with mock.patch("filelib.streaming.StreamUploadManager._send_part", autospec=True, side_effect=send_part):
+                client.upload(workers=3)
+        self.assertEqual(sent, {"stream_%d.bin" % i: b"part%d" % i * 3 for i in range(3)})
+        statuses = {result.file_name: result.status for result in client.get_processed_files().values()}
+        self.assertEqual(statuses, {"stream_%d.bin" % i: UPLOAD_COMPLETED for i in range(3)})
+
+    def test_upload_buffer(self):
+        """
+        Buffers must be added like files, not as streams.
+        """
+        client = self.gen_client()
+        client.add_file(file=memoryview(b"iamfile"), config=self.config, file_name="buffer.bin", cache=self.cache)
+        file = list(client.get_files().values())[0]["file"]
+        self.assertIsInstance(file, BufferReader)
+        with mock.patch("filelib.UploadManager.upload") as upload:
+            client.upload()
+        upload.assert_called_once()
+        self.assertEqual([result.file_name for result in client.get_processed_files().values()], ["buffer.bin"])
+
+    def test_add_archive(self):
+        """
+        Archive members must be uploaded as files of their own under their directory in the archive.
+        Stored members must be uploaded as files, compressed ones as streams.
+        """
+        client = self.gen_client()
+        uploaded = {}
+
+        def upload(up):
+            uploaded[(up.config.prefix, up.file_name)] = (type(up).__name__, up.file.read())
+
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "bundle.zip")
+            with zipfile.ZipFile(path, "w") as archive:
+                archive.writestr("a.txt", b"stored", compress_type=zipfile.ZIP_STORED)
+                archive.writestr("docs/b.txt", b"deflated" * 100, compress_type=zipfile.ZIP_DEFLATED)
+            config = FilelibConfig(storage="test_storage", prefix="bundle")
+            client.add_archive(path, config, cache=self.cache)
+            with mock.patch("filelib.UploadManager.upload", autospec=True, side_effect=upload):
+                with mock.patch("filelib.streaming.StreamUploadManager.upload", autospec=True, side_effect=upload):
+                    client.upload()
+            not_archive = os.path.join(root, "a.txt")
+            with open(not_archive, "w") as f:
+                f.write("not an archive")
+            with self.assertRaises(ValidationError):
+                client.add_archive(not_archive, config)
+        self.assertEqual(uploaded, {
+            ("bundle", "a.txt"): ("UploadManager", b"stored"),
+            ("bundle/docs", "b.txt"): ("StreamUploadManager", b"deflated" * 100)
+        })
+
+    def test_upload_with_sink(self):
+        """
+        Results must be written to the sink instead of PROCESSED_FILES.
+        Files the sink recorded as completed must be skipped.
+        """
+        client = self.gen_client()
+        for name in ("first.txt", "second.txt"):
+            client.add_file(file=io.BytesIO(b"iamfile"), config=self.config, file_name=name, cache=self.cache)
+        sink = mock.Mock(spec=BaseResultSink)
+        sink.completed.return_value = {"first.txt"}
+        with mock.patch("filelib.UploadManager.upload") as upload:
+            client.upload(sink=sink)
+        upload.assert_called_once()
+        sink.write.assert_called_once()
+        self.assertEqual(sink.write.call_args[0][0].file_name, "second.txt")
+        self.assertEqual(client.get_processed_files(), {})
+        self.assertEqual(client.get_files(), {})
+
+    def test_resume_with_sink(self):
+        """
+        Files added by path and recorded as completed in the sink by a previous run must be skipped.
+        """
+        def upload(up):
+            up.set_upload_status(UPLOAD_COMPLETED)
+
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "a.txt")
+            with open(path, "wb") as f:
+                f.write(b"iamfile")
+            manifest = os.path.join(root, "manifest.jsonl")
+            uploads = (
+                lambda client, sink: client.add_file(file=path, config=self.config, cache=self.cache) or client.upload(sink=sink),
+                lambda client, sink: list(client.upload_iter([path], config=self.config, cache=self.cache, sink=sink))
+            )
+            for run in uploads:
+                with mock.patch("filelib.UploadManager.upload", autospec=True, side_effect=upload) as mock_upload:
+                    for _ in range(2):
+                        with JSONLResultSink(manifest) as sink:
+                            run(self.gen_client(), sink)
+                mock_upload.assert_called_once()
+                os.remove(manifest)
+
+    def test_upload_iter(self):
+        """
+        Client.upload_iter must consume files lazily and yield results as files finish.
+        At most `concurrency` files can be taken from the iterable ahead of finished ones.
+        """
+        client = self.gen_client()
+        counter = {"pulled": 0, "started": 0, "finished": 0}
+        lock = threading.Lock()
+
+        def files():
+            for i in range(6):
+                with lock:
+                    self.assertLessEqual(counter["started"] - counter["finished"], 2)
+                counter["pulled"] += 1
+                yield {"file": io.BytesIO(b"iamfile"), "file_name": "file_%d.txt" % i}
+
+        def upload():
+            with lock:
+                counter["started"] += 1
+            time.sleep(0.01)
+            with lock:
+                counter["finished"] += 1
+
+        with mock.patch("filelib.UploadManager.upload", side_effect=upload):
+            results = client.upload_iter(files(), config=self.config, cache=self.cache, concurrency=2)
+            first = next(results)
+            # Uploading started before the iterable is exhausted.
+            self.assertLess(counter["pulled"], 6)
+            self.assertIsInstance(first, UploadResult)
+            rest = list(results)
+        self.assertEqual(len(rest), 5)
+        self.assertEqual(
+            sorted(result.file_name for result in [first] + rest),
+            ["file_%d.txt" % i for i in range(6)]
+        )
+        self.assertEqual(client.get_processed_files(), {})
+        with self.assertRaises(ValidationError):
+            list(client.upload_iter([], config=self.config, concurrency=0))
+
+    def test_upload_iter_failures(self):
+        """
+        A failing file must be reported in its result without stopping the rest.
+        Files the sink recorded as completed must be skipped.
+        """
+        client = self.gen_client()
+        sink = mock.Mock(spec=BaseResultSink)
+        sink.completed.return_value = {"done.txt"}
+        files = [
+            "/does/not/exist.txt",
+            {"file": io.BytesIO(b"iamfile"), "file_name": "done.txt"},
+            {"file": io.BytesIO(b"iamfile"), "file_name": "fails.txt"},
+            {"file": io.BytesIO(b"iamfile"), "file_name": "ok.txt"}
+        ]
+
+        def upload(up):
+            if up.file_name == "fails.txt":
+                raise ValueError("upload failed")
+
+        with mock.patch("filelib.UploadManager.upload", autospec=True, side_effect=upload):
+            results = {result.file_name: result for result in client.upload_iter(files, config=self.config, cache=self.cache, sink=sink)}
+        self.assertEqual(sorted(results), ["/does/not/exist.txt", "fails.txt", "ok.txt"])
+        self.assertEqual(results["/does/not/exist.txt"].status, UPLOAD_FAILED)
+        self.assertEqual(results["fails.txt"].status, UPLOAD_FAILED)
+        self.assertEqual(results["fails.txt"].error, "upload failed")
+        self.assertEqual(sink.write.call_count, 3)
+
+        # Failing before the upload starts must be reported as well.
+        files = [{"file": io.BytesIO(b"iamfile"), "file_name": "broken.txt"}]
+        with mock.patch("filelib.UploadManager.__init__", side_effect=ValueError("cannot create")):
+            results = list(client.upload_iter(files, config=self.config, cache=self.cache))
+        self.assertEqual([(result.file_name, result.status, result.error) for result in results], [("broken.txt", UPLOAD_FAILED, "cannot create")])
+
+    def test_add_directory(self):
+        """
+        Files of an added directory must be uploaded with their relative directory mapped onto config prefix.
+        Characters of directory names that are not allowed in prefixes must be replaced.
+        """
+        client = self.gen_client()
+        config = FilelibConfig(storage="test_storage", prefix="backup")
+        with tempfile.TemporaryDirectory() as root:
+            for relative_path in ("a.txt", "docs/b.txt", "docs/2024/c.txt", "bad dir/d.txt", "v1.2/e.txt"):
+                path = os.path.join(root, relative_path)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(b"iamfile")
+            items = list(client.iter_directory(root, config, cache=self.cache))
+            self.assertEqual(
+                sorted((item["config"].prefix, item["file_name"]) for item in items),
+                [
+                    ("backup", "a.txt"),
+                    ("backup/bad_dir", "d.txt"),
+                    ("backup/docs", "b.txt"),
+                    ("backup/docs/2024", "c.txt"),
+                    ("backup/v1_2", "e.txt")
+                ]
+            )
+            items = list(client.iter_directory(root, config, include="*.txt", exclude="docs"))
+            self.assertEqual(sorted(item["file_name"] for item in items), ["a.txt", "d.txt", "e.txt"])
+
+            client.add_directory(root, config, exclude=["bad dir", "v1.2"], cache=self.cache)
+            with mock.patch("filelib.UploadManager.upload"):
+                client.upload()
+            processed = client.get_processed_files().values()
+            self.assertEqual(sorted(result.key for result in processed), ["backup/a.txt", "backup/docs/2024/c.txt", "backup/docs/b.txt"])
+            self.assertEqual(client.ADDED_ITERABLES, [])
+        with self.assertRaises(FileDoesNotExistError):
+            client.add_directory("/does/not/exist", config)
+
+    def test_upload_batch_size(self):
+        """
+        With `batch_size`, small files must be created in batches and handed their entities.
+        """
+        entities = [{"headers": {"Location": "https://filelib.com/%d" % i}, "data": {}} for i in range(2)]
+
+        def gen_files():
+            return [
+                {"file": io.BytesIO(b"iamfile"), "file_name": name, "config": self.config, "cache": self.cache}
+                for name in ("first.txt", "second.txt")
+            ]
+
+        client = self.gen_client()
+        for file_args in gen_files():
+            client.add_file(**file_args)
+        uploads = (
+            lambda: client.upload(batch_size=10),
+            lambda: list(client.upload_iter(gen_files(), batch_size=10))
+        )
+        for upload in uploads:
+            with mock.patch("filelib.batch.EntityBatcher.create", return_value=entities) as create:
+                with mock.patch("filelib.UploadManager.set_entity", autospec=True) as set_entity:
+                    with mock.patch("filelib.UploadManager.upload"):
+                        upload()
+            create.assert_called_once()
+            self.assertEqual(len(create.call_args[0][0]), 2)
+            locations = sorted(call[1]["headers"]["Location"] for call in set_entity.call_args_list)
+            self.assertEqual(locations, ["https://filelib.com/0", "https://filelib.com/1"])
+
+    def test_add_packed(self):
+        """
+        Small files must be packed into archives of up to `max_pack_size`, each uploaded with its index.
+        Bigger files and file objects must be uploaded on their own.
+        """
+        client = self.gen_client()
+        uploaded = {}
+
+        def upload(up):
+            up.file.seek(0)
+            uploaded[up.file_name] = up.file.read()
+
+        with tempfile.TemporaryDirectory() as root:
+            os.mkdir(os.path.join(root, "docs"))
+            for name, size in (("a.txt", 100), ("b.txt", 100), ("docs/c.txt", 100), ("big.bin", 2000)):
+                with open(os.path.join(root, name), "wb") as f:
+                    f.write(os.path.basename(name).encode() * size)
+            # Members are named by their path in the directory.
+            files = client.iter_directory(root, self.config, cache=self.cache)
+            files = sorted(files, key=lambda item: item["file_name"])
+            with open(os.path.join(root, "a.txt"), "rb") as file:
+                # Named by the file object.
+                files.append({"file": file})
+                client.add_packed(files, self.config, "pack", max_pack_size=3000, max_member_size=1000, cache=self.cache)
+                with mock.patch("filelib.UploadManager.upload", autospec=True, side_effect=upload):
+                    client.upload()
+        self.assertEqual(uploaded.pop("a.txt"), b"a.txt" * 100)
+        self.assertEqual(
+            sorted(uploaded),
+            ["big.bin", "pack-00000.tar", "pack-00000.tar.index.json", "pack-00001.tar", "pack-00001.tar.index.json"]
+        )
+        with tarfile.open(fileobj=io.BytesIO(uploaded["pack-00000.tar"])) as archive:
+            self.assertEqual(archive.getnames(), ["a.txt", "b.txt"])
+        index = json.loads(uploaded["pack-00001.tar.index.json"])
+        self.assertEqual([entry["name"] for entry in index], ["docs/c.txt"])
+        data = uploaded["pack-00001.tar"][index[0]["offset"]:index[0]["offset"] + index[0]["size"]]
+        self.assertEqual(data, b"c.txt" * 100)
+
+    def test_bandwidth_limit(self):
+        """
+        Every added file must share the client's rate limiter, which can be changed at runtime.
+        """
+        client = self.gen_client(bandwidth_limit=1000, storage_bandwidth_limits={"other": 5000})
+        client.add_file(**deepcopy(self.add_file_params))
+        client.add_file(file=io.BytesIO(b"iamfile"), config=self.config, file_name="other.txt", cache=self.cache)
+        limiters = [file_args["rate_limiter"] for file_args in client.get_files().values()]
+        self.assertIs(limiters[0], client.rate_limiter)
+        self.assertIs(limiters[1], client.rate_limiter)
+        self.assertEqual(client.rate_limiter.get_bucket("other").rate, 5000)
+        client.set_bandwidth_limit(2000)
+        self.assertEqual(client.rate_limiter.rate, 2000)
+        client.set_bandwidth_limit(3000, storage="test_storage")
+        self.assertEqual(client.rate_limiter.get_bucket("test_storage").rate, 3000)
+
+    def test_rate_limit_state(self):
+        """
+        Every added file must pause together with the others when one of them is throttled.
+        """
+        client = self.gen_client()
+        client.add_file(**deepcopy(self.add_file_params))
+        client.add_file(file=io.BytesIO(b"iamfile"), config=self.config, file_name="other.txt", cache=self.cache)
+        states = [file_args["rate_limit_state"] for file_args in client.get_files().values()]
+        self.assertIs(states[0], client.rate_limit_state)
+        self.assertIs(states[1], client.rate_limit_state)
+        state = RateLimitState()
+        self.assertIs(self.gen_client(rate_limit_state=state).rate_limit_state, state)
+
+    def test_sweep_stale_uploads(self):
+        """
+        Uploads not updated for `older_than` seconds must be cancelled on the server and purged locally.
+        * fresh and finished uploads must be left alone.
+        * failed cancels must be kept for the next sweep.
+        * uploads past the backend ttl must be cancelled as well.
+        """
+        backend = MemoryCache(ttl=1800)
+        client = self.gen_client(cache_backend=backend)
+        for namespace in ["stale", "stale_404", "stale_error"]:
+            backend.namespace(namespace).set(UploadManager._CACHE_ENTITY_KEY, "https://testserver/upload/%s" % namespace)
+            backend.namespace(namespace).set(CACHE_STATUS_KEY, UPLOAD_STARTED)
+        with mock.patch("time.time", return_value=time.time() - 3600):
+            backend.namespace("expired").set(UploadManager._CACHE_ENTITY_KEY, "https://testserver/upload/expired")
+        backend.namespace("stale_no_location").set(CACHE_STATUS_KEY, UPLOAD_STARTED)
+        backend.namespace("stale_completed").set(CACHE_STATUS_KEY, UPLOAD_COMPLETED)
+        # Dedup index sharing the backend is not an upload.
+        dedup_index = DedupIndex(backend)
+        dedup_index.add("sha256:abc", 7, "https://testserver/file/1")
+
+        with mock.patch("time.time", return_value=time.time() + 600):
+            backend.namespace("fresh").set(UploadManager._CACHE_ENTITY_KEY, "https://testserver/upload/fresh")
+
+            def delete(url, **kwargs):
+                status_code = {"stale": 204, "stale_404": 404, "expired": 204}.get(url.rsplit("/", 1)[-1], 500)
+                return httpx.Response(status_code=status_code, request=httpx.Request("delete", url))
+
+            with mock_request("delete") as req:
+                req.side_effect = delete
+                result = client.sweep_stale_uploads(older_than=60)
+                self.assertEqual(req.call_count, 4)
+
+        self.assertEqual(sorted(result["cancelled"]), ["expired", "stale", "stale_404"])
+        self.assertEqual(list(result["failed"]), ["stale_error"])
+        remaining = sorted(ns for ns, _t in backend.namespaces())
+        self.assertEqual(remaining, ["fresh", "stale_completed", "stale_error"])
+        self.assertEqual(dedup_index.get("sha256:abc", 7), "https://testserver/file/1")
+
+        # A backend is required to scan.
+        with self.assertRaises(ValidationError):
+            self.gen_client().sweep_stale_uploads(older_than=60)
+
+    def test_sweep_skips_running_uploads(self):
+        """
+        Uploads sending parts for longer than `older_than` must not be taken for abandoned ones.
+        """
+        backend = MemoryCache()
+        client = self.gen_client(cache_backend=backend)
+        up = UploadManager(file=io.BytesIO(b"iamfile"), config=self.config, auth=client.auth, file_name="a.txt", cache_backend=backend)
+        up.set_cache(UploadManager._CACHE_ENTITY_KEY, "https://testserver/upload/a")
+        up.set_cache(CACHE_STATUS_KEY, UPLOAD_STARTED)
+        started_at = time.time()
+        with mock.patch("filelib.UploadManager._send_part"):
+            for elapsed in range(0, 3600, 30):
+                with mock.patch("time.time", return_value=started_at + elapsed):
+                    up.upload_chunk(1, b"i")
+        with mock.patch("time.time", return_value=started_at + 3600):
+            with mock_request("delete") as req:
+                result = client.sweep_stale_uploads(older_than=300)
+        req.assert_not_called()
+        self.assertEqual(result["cancelled"], [])
 
     def tearDown(self):
         # Remove Cache storage path after tests are done.
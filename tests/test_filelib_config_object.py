@@ -1,6 +1,6 @@
 from unittest import TestCase
 
-from filelib.config import FilelibConfig
+from filelib.config import FilelibConfig, sanitize_prefix
 from filelib.exceptions import ConfigPrefixInvalidError, ConfigValidationError
 
 
@@ -29,6 +29,11 @@ class FilelibConfigTestCase(TestCase):
         config = FilelibConfig(storage="my_storage", prefix=prefix_name)
         self.assertEqual(prefix_name, config.prefix)
 
+        # Test sanitized prefixes are valid
+        prefix = sanitize_prefix("my docs/v1.2")
+        self.assertEqual(prefix, "my_docs/v1_2")
+        FilelibConfig(storage="my_storage", prefix=prefix)
+
     def test_access_config_option(self):
         # Test must be a string
         with self.assertRaises(ConfigValidationError):
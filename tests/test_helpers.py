@@ -1,11 +1,17 @@
 import io
 import os.path
-from unittest import TestCase
+import tempfile
+from unittest import TestCase, mock
 
 import httpx
 
 from filelib.constants import ERROR_CODE_HEADER, ERROR_MESSAGE_HEADER
-from filelib.utils import get_random_string, parse_api_err, process_file
+from filelib.utils import (
+    advise_file,
+    get_random_string,
+    parse_api_err,
+    process_file
+)
 
 
 class HelpersTestCase(TestCase):
@@ -46,3 +52,16 @@ class HelpersTestCase(TestCase):
         self.assertEqual(error, error_headers[ERROR_MESSAGE_HEADER])
         self.assertEqual(code, 400)
         self.assertEqual(error_code, error_headers[ERROR_CODE_HEADER])
+
+    def test_advise_file(self):
+        """
+        advise_file must call os.posix_fadvise for files with a descriptor.
+        Must return False instead of raising where it is not supported.
+        """
+        self.assertFalse(advise_file(io.BytesIO(b"in_memory"), 0, 10, "POSIX_FADV_WILLNEED"))
+        self.assertFalse(advise_file(io.BytesIO(b"in_memory"), 0, 10, "NOT_AN_ADVICE"))
+        with tempfile.TemporaryFile() as file:
+            with mock.patch("os.posix_fadvise", create=True) as fadvise:
+                with mock.patch("os.POSIX_FADV_WILLNEED", 3, create=True):
+                    self.assertTrue(advise_file(file, 10, 20, "POSIX_FADV_WILLNEED"))
+                    fadvise.assert_called_once_with(file.fileno(), 10, 20, 3)
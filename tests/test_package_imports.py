@@ -0,0 +1,57 @@
+import subprocess
+import sys
+from unittest import TestCase
+
+import filelib
+
+
+class PackageImportTestCase(TestCase):
+    # Modules that must not be loaded by a bare `import filelib`
+    heavy_modules = [
+        "httpx",
+        "jwt",
+        "pytz",
+        "jmstorage",
+        "xmltojson",
+        "multiprocessing.shared_memory",
+        "filelib.authentication",
+        "filelib.client",
+        "filelib.upload_manager"
+    ]
+
+    def loaded_modules(self, code):
+        """
+        Run `code` in a fresh interpreter and return the names of the loaded heavy modules.
+        """
+        script = "import sys\n%s\nprint(','.join(m for m in %r if m in sys.modules))" % (code, self.heavy_modules)
+        output = subprocess.check_output([sys.executable, "-c", script], text=True)
+        return [m for m in output.strip().split(",") if m]
+
+    def test_import_does_not_load_heavy_dependencies(self):
+        """
+        `import filelib` and building a FilelibConfig must stay cheap for short-lived processes.
+        """
+        self.assertEqual(self.loaded_modules("import filelib"), [])
+        self.assertEqual(self.loaded_modules("from filelib import FilelibConfig; FilelibConfig(storage='s3')"), [])
+
+    def test_cli_import_does_not_load_heavy_dependencies(self):
+        """
+        `filelib --help` must not pay for the upload stack.
+        """
+        self.assertEqual(self.loaded_modules("import filelib.cli.entrypoint"), [])
+
+    def test_lazy_attributes(self):
+        """
+        Lazy attributes must resolve to the same objects as their modules.
+        """
+        from filelib.authentication import Authentication
+        from filelib.client import Client
+        from filelib.upload_manager import UploadManager
+
+        self.assertIs(filelib.Authentication, Authentication)
+        self.assertIs(filelib.Client, Client)
+        self.assertIs(filelib.UploadManager, UploadManager)
+        for name in filelib.__all__:
+            self.assertIn(name, dir(filelib))
+        with self.assertRaises(AttributeError):
+            filelib.DoesNotExist
@@ -0,0 +1,85 @@
+import io
+import os
+import tarfile
+import tempfile
+from unittest import TestCase
+
+from filelib.exceptions import SourceChangedError
+from filelib.packing import TarPackSource
+from filelib.sources import FileSource
+
+
+class TarPackSourceTestCase(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.contents = {
+            "a.txt": b"a" * 700,
+            "empty.txt": b"",
+            "dir/b.bin": os.urandom(512),
+            "long/" + "n" * 150 + ".txt": b"long name"
+        }
+        self.members = []
+        for i, (name, content) in enumerate(self.contents.items()):
+            path = os.path.join(self.tmp_dir.name, str(i))
+            with open(path, "wb") as f:
+                f.write(content)
+            self.members.append((name, FileSource.from_path(path)))
+        self.pack = TarPackSource("pack.tar", self.members)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def read_pack(self):
+        with self.pack.open() as reader:
+            return reader.read()
+
+    def test_archive(self):
+        """
+        Archive must be readable by tarfile with every member and its content.
+        """
+        data = self.read_pack()
+        self.assertEqual(len(data), self.pack.size)
+        with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+            self.assertEqual(archive.getnames(), list(self.contents))
+            for name, content in self.contents.items():
+                self.assertEqual(archive.extractfile(name).read(), content)
+
+    def test_index(self):
+        """
+        Index offsets must point to the content of members in the archive.
+        Size estimate must not be smaller than what a member takes.
+        """
+        data = self.read_pack()
+        index = self.pack.index()
+        self.assertEqual([entry["name"] for entry in index], list(self.contents))
+        for entry in index:
+            self.assertEqual(data[entry["offset"]:entry["offset"] + entry["size"]], self.contents[entry["name"]])
+        estimate = sum(TarPackSource.get_member_size(len(content), name) for name, content in self.contents.items())
+        self.assertGreaterEqual(estimate + 2 * tarfile.BLOCKSIZE, self.pack.size)
+
+    def test_seek_and_read(self):
+        """
+        Reader must read any byte range like a file, as UploadManager reads parts.
+        """
+        data = self.read_pack()
+        with self.pack.open() as reader:
+            self.assertTrue(reader.seekable())
+            self.assertEqual(reader.seek(0, io.SEEK_END), len(data))
+            for offset, size in ((0, 1000), (600, 1500), (len(data) - 100, 1000), (len(data), 10)):
+                reader.seek(offset)
+                self.assertEqual(reader.read(size), data[offset:offset + size])
+            buffer = bytearray(777)
+            reader.seek(1)
+            self.assertEqual(reader.readinto(buffer), 777)
+            self.assertEqual(bytes(buffer), data[1:778])
+
+    def test_changed_member(self):
+        """
+        A member that shrank after it was packed must raise an error instead of corrupting the archive.
+        """
+        with open(self.members[0][1].path, "wb") as f:
+            f.write(b"a")
+        with self.pack.open() as reader:
+            with self.assertRaises(SourceChangedError):
+                reader.read()
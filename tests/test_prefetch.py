@@ -0,0 +1,80 @@
+import threading
+from unittest import TestCase
+
+from filelib.prefetch import ChunkPrefetcher
+
+
+class ChunkPrefetcherTestCase(TestCase):
+
+    def test_reads_every_part_in_order(self):
+        """
+        Must yield (part_number, chunk) for each part number in the given order.
+        `advise` must be called for each part number before it is read.
+        """
+        advised = []
+        part_numbers = [1, 2, 3, 4, 5]
+        with ChunkPrefetcher(lambda pn: b"chunk%d" % pn, part_numbers, capacity=10, advise=advised.append) as prefetcher:
+            parts = list(prefetcher)
+        self.assertEqual(parts, [(pn, b"chunk%d" % pn) for pn in part_numbers])
+        self.assertEqual(advised, part_numbers)
+
+    def test_capacity_bounds_chunks_in_memory(self):
+        """
+        Reader must not read more than `capacity` chunks until they are released.
+        """
+        read = []
+        reading_blocked = threading.Event()
+
+        def read_chunk(part_number):
+            read.append(part_number)
+            if len(read) == 2:
+                reading_blocked.set()
+            return b"x"
+
+        with ChunkPrefetcher(read_chunk, range(1, 11), capacity=2) as prefetcher:
+            reading_blocked.wait(1)
+            parts = iter(prefetcher)
+            next(parts)
+            next(parts)
+            # Nothing is released, reader must be waiting for a slot.
+            prefetcher._thread.join(0.05)
+            self.assertTrue(prefetcher._thread.is_alive())
+            self.assertEqual(read, [1, 2])
+            for _ in range(8):
+                prefetcher.release()
+                next(parts)
+            self.assertEqual(read, list(range(1, 11)))
+
+    def test_read_error_is_raised_to_consumer(self):
+        """
+        An error while reading must be raised while iterating.
+        """
+        def read_chunk(part_number):
+            if part_number == 2:
+                raise OSError("disk error")
+            return b"x"
+
+        with ChunkPrefetcher(read_chunk, [1, 2, 3], capacity=3) as prefetcher:
+            parts = iter(prefetcher)
+            self.assertEqual(next(parts), (1, b"x"))
+            with self.assertRaises(OSError):
+                next(parts)
+
+    def test_close_stops_reading(self):
+        """
+        Closing must stop the reader even if it is waiting for a slot.
+        """
+        prefetcher = ChunkPrefetcher(lambda pn: b"x", range(1, 1000), capacity=1).start()
+        next(iter(prefetcher))
+        prefetcher.close()
+        self.assertFalse(prefetcher._thread.is_alive())
+
+        # Chunks that are read but not consumed must be handed to `discard`
+        discarded = []
+        prefetcher = ChunkPrefetcher(lambda pn: b"chunk%d" % pn, [1, 2, 3], capacity=3, discard=discarded.append).start()
+        prefetcher._thread.join(1)
+        prefetcher.close()
+        self.assertEqual(discarded, [b"chunk1", b"chunk2", b"chunk3"])
+
+        with self.assertRaises(ValueError):
+            ChunkPrefetcher(lambda pn: b"x", [1], capacity=0)
@@ -0,0 +1,168 @@
+import threading
+from email.utils import formatdate
+from unittest import TestCase, mock
+from uuid import uuid4
+
+import httpx
+
+from filelib.constants import (
+    MAX_THROTTLE_DELAY,
+    RATE_LIMIT_REMAINING_HEADER,
+    RATE_LIMIT_RESET_HEADER,
+    RETRY_AFTER_HEADER
+)
+from filelib.ratelimit import (
+    BandwidthLimiter,
+    RateLimitState,
+    SharedRateLimitState,
+    TokenBucket,
+    get_throttle_delay
+)
+
+
+class TokenBucketTestCase(TestCase):
+
+    def setUp(self):
+        self.now = 100.0
+        self.slept = []
+        patchers = [
+            mock.patch("time.monotonic", side_effect=lambda: self.now),
+            mock.patch("time.sleep", side_effect=self.slept.append)
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_unlimited(self):
+        bucket = TokenBucket()
+        bucket.acquire(10 ** 9)
+        self.assertEqual(self.slept, [])
+
+    def test_acquire(self):
+        """
+        Senders must wait for what they take beyond the bucket, at `rate` bytes per second.
+        """
+        bucket = TokenBucket(rate=1000)
+        self.assertEqual(bucket.burst, 100)
+        # Starts full
+        bucket.acquire(100)
+        self.assertEqual(self.slept, [])
+        bucket.acquire(500)
+        self.assertEqual(self.slept, [0.5])
+        # Time spent waiting refills the debt.
+        self.now += 0.5
+        bucket.acquire(100)
+        self.assertEqual(self.slept, [0.5, 0.1])
+        # Idle time does not accumulate more than burst.
+        self.now += 100
+        bucket.acquire(300)
+        self.assertEqual(self.slept[-1], 0.2)
+
+    def test_set_rate(self):
+        bucket = TokenBucket(rate=1000)
+        bucket.set_rate(100, burst=10)
+        bucket.acquire(110)
+        self.assertEqual(self.slept, [1.0])
+        bucket.set_rate(None)
+        bucket.acquire(10 ** 9)
+        self.assertEqual(self.slept, [1.0])
+        with self.assertRaises(ValueError):
+            bucket.set_rate(0)
+
+    def test_bandwidth_limiter(self):
+        """
+        Uploads to a storage with an override must draw from the override only.
+        """
+        limiter = BandwidthLimiter(rate=1000, storage_rates={"fast": 10000})
+        self.assertEqual(limiter.rate, 1000)
+        self.assertEqual(limiter.get_bucket("fast").rate, 10000)
+        self.assertIs(limiter.get_bucket("other"), limiter.get_bucket())
+        limiter.acquire(1000, storage="fast")
+        self.assertEqual(self.slept, [])
+        limiter.acquire(1100, storage="other")
+        self.assertEqual(self.slept, [1.0])
+        limiter.set_rate(20000, storage="fast")
+        self.assertEqual(limiter.get_bucket("fast").rate, 20000)
+        limiter.set_rate(None, storage="fast")
+        self.assertIs(limiter.get_bucket("fast"), limiter.get_bucket())
+        limiter.set_rate(None)
+        self.assertIsNone(limiter.rate)
+
+
+class RateLimitStateTestCase(TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        self.slept = []
+
+        def sleep(seconds):
+            self.slept.append(seconds)
+            self.now += seconds
+
+        patchers = [
+            mock.patch("time.time", side_effect=lambda: self.now),
+            mock.patch("time.sleep", side_effect=sleep)
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def gen_response(status_code, headers=None):
+        return httpx.Response(status_code=status_code, request=httpx.Request(method="patch", url=""), headers=headers)
+
+    def test_get_throttle_delay(self):
+        self.assertIsNone(get_throttle_delay(self.gen_response(201)))
+        self.assertIsNone(get_throttle_delay(self.gen_response(400, {RETRY_AFTER_HEADER: "5"})))
+        self.assertEqual(get_throttle_delay(self.gen_response(429, {RETRY_AFTER_HEADER: "5"})), 5)
+        http_date = formatdate(self.now + 7, usegmt=True)
+        self.assertEqual(get_throttle_delay(self.gen_response(429, {RETRY_AFTER_HEADER: http_date})), 7)
+        self.assertEqual(get_throttle_delay(self.gen_response(429, {RATE_LIMIT_RESET_HEADER: "2"})), 2)
+        self.assertEqual(get_throttle_delay(self.gen_response(429, {RETRY_AFTER_HEADER: "3600"})), MAX_THROTTLE_DELAY)
+        # S3 SlowDown does not say how long to wait.
+        self.assertEqual(get_throttle_delay(self.gen_response(503), attempt=0), 1)
+        self.assertEqual(get_throttle_delay(self.gen_response(503), attempt=3), 8)
+        # Last request of the window succeeds, the next ones would be throttled.
+        headers = {RATE_LIMIT_REMAINING_HEADER: "0", RATE_LIMIT_RESET_HEADER: "4"}
+        self.assertEqual(get_throttle_delay(self.gen_response(201, headers)), 4)
+        headers = {RATE_LIMIT_REMAINING_HEADER: "10", RATE_LIMIT_RESET_HEADER: "4"}
+        self.assertIsNone(get_throttle_delay(self.gen_response(201, headers)))
+
+    def test_pause(self):
+        """
+        Pauses must extend, never shorten, the current pause; waiters must sleep until it ends.
+        """
+        state = RateLimitState()
+        self.assertTrue(state.wait())
+        self.assertEqual(self.slept, [])
+        state.pause(2)
+        state.pause(1)
+        self.assertEqual(state.get_paused_until(), 1002)
+        self.assertTrue(state.wait())
+        self.assertEqual(sum(self.slept), 2)
+        self.assertTrue(all(seconds <= RateLimitState.WAIT_INTERVAL for seconds in self.slept))
+
+    def test_wait_interrupted(self):
+        state = RateLimitState()
+        state.pause(10)
+        interrupt = threading.Event()
+        interrupt.set()
+        self.assertFalse(state.wait(interrupt))
+        self.assertEqual(self.slept, [])
+
+    def test_shared_state(self):
+        """
+        Every state attached to the same name must see the pause of the others.
+        """
+        name = "filelib-test-%s" % uuid4().hex[:8]
+        state = SharedRateLimitState(name=name)
+        self.addCleanup(state.unlink)
+        self.addCleanup(state.close)
+        other = SharedRateLimitState(name=name)
+        self.addCleanup(other.close)
+        self.assertTrue(state.is_new)
+        self.assertFalse(other.is_new)
+        self.assertEqual(other.get_paused_until(), 0)
+        state.pause(5)
+        self.assertEqual(other.get_paused_until(), 1005)
+        self.assertEqual(other.get_delay(), 5)
@@ -0,0 +1,78 @@
+from unittest import TestCase
+
+from filelib.scheduling import SCHEDULE_EDF, SCHEDULE_SJF, FileScheduler
+
+
+class FileSchedulerTestCase(TestCase):
+
+    @staticmethod
+    def gen_files(scheduler, files):
+        for name, size, priority, deadline in files:
+            scheduler.push(name, {"file_name": name}, size, priority=priority, deadline=deadline)
+
+    @staticmethod
+    def drain(scheduler):
+        names = []
+        item = scheduler.pop()
+        while item is not None:
+            names.append(item.index)
+            scheduler.done(item)
+            item = scheduler.pop()
+        return names
+
+    def test_policies(self):
+        """
+        Files must be ordered by the policy, ties broken by priority and the order they are added in.
+        """
+        files = [
+            ("archive", 200, 0, None),
+            ("report", 10, 5, 300.0),
+            ("avatar", 1, 0, 100.0),
+            ("log", 10, 0, None),
+            ("invoice", 10, 5, None)
+        ]
+        expected = {
+            None: ["report", "invoice", "archive", "avatar", "log"],
+            SCHEDULE_SJF: ["avatar", "report", "invoice", "log", "archive"],
+            SCHEDULE_EDF: ["avatar", "report", "invoice", "archive", "log"]
+        }
+        for policy, names in expected.items():
+            scheduler = FileScheduler(policy) if policy else FileScheduler()
+            self.gen_files(scheduler, files)
+            self.assertEqual(len(scheduler), 5)
+            self.assertEqual(self.drain(scheduler), names)
+            self.assertEqual(len(scheduler), 0)
+        with self.assertRaises(ValueError):
+            FileScheduler("lifo")
+        with self.assertRaises(ValueError):
+            FileScheduler(large_file_share=2)
+
+    def test_large_file_share(self):
+        """
+        Large files must get their share of workers ahead of small files with higher priority,
+        and compete with the rest in policy order beyond it.
+        """
+        scheduler = FileScheduler(workers=4, large_file_size=100, large_file_share=0.25)
+        self.assertEqual(scheduler.reserved_workers, 1)
+        self.gen_files(scheduler, [("big_1", 500, 0, None), ("big_2", 500, 0, None)])
+        self.gen_files(scheduler, [("small_%d" % i, 1, 10, None) for i in range(4)])
+        first = scheduler.pop()
+        self.assertEqual(first.index, "big_1")
+        self.assertTrue(first.is_large)
+        # A large file is running: the rest go by priority.
+        self.assertEqual([scheduler.pop().index for _i in range(3)], ["small_0", "small_1", "small_2"])
+        scheduler.done(first)
+        self.assertEqual(scheduler.pop().index, "big_2")
+        self.assertEqual(scheduler.pop().index, "small_3")
+        self.assertIsNone(scheduler.pop())
+        self.assertEqual(len(scheduler), 0)
+        # At least one of a few workers is reserved.
+        scheduler = FileScheduler(SCHEDULE_SJF, workers=2, large_file_size=100)
+        self.assertEqual(scheduler.reserved_workers, 1)
+        self.gen_files(scheduler, [("big", 500, 0, None), ("small_1", 1, 0, None), ("small_2", 1, 0, None)])
+        self.assertEqual(scheduler.pop().index, "big")
+        self.assertEqual(FileScheduler(workers=2, large_file_share=0).reserved_workers, 0)
+        # A single worker is not reserved.
+        scheduler = FileScheduler(workers=1, large_file_size=100)
+        self.gen_files(scheduler, [("big", 500, 0, None), ("small", 1, 10, None)])
+        self.assertEqual(self.drain(scheduler), ["small", "big"])
@@ -0,0 +1,59 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from filelib.constants import UPLOAD_COMPLETED, UPLOAD_FAILED
+from filelib.results import UploadResult
+from filelib.sinks import CallbackResultSink, CSVResultSink, JSONLResultSink
+
+
+class ResultSinkTestCase(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.results = [
+            UploadResult(file_name="a.txt", url="https://filelib.com/a", size=1, status=UPLOAD_COMPLETED),
+            UploadResult(file_name="b.txt", status=UPLOAD_FAILED, error="error"),
+            UploadResult(file_name="c,\"d\".txt", prefix="docs", size=3, status=UPLOAD_COMPLETED)
+        ]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def assert_manifest(self, sink_class, file_name):
+        path = os.path.join(self.tmp_dir.name, file_name)
+        with sink_class(path) as sink:
+            self.assertEqual(sink.completed(), set())
+            sink.write(self.results[0])
+            sink.write(self.results[1])
+        # Resuming appends to the same manifest.
+        with sink_class(path) as sink:
+            self.assertEqual(sink.completed(), {"a.txt"})
+            sink.write(self.results[2])
+            self.assertEqual(sink.completed(), {"a.txt", "docs/c,\"d\".txt"})
+        return path
+
+    def test_jsonl_sink(self):
+        path = self.assert_manifest(JSONLResultSink, "manifest.jsonl")
+        with open(path) as f:
+            self.assertEqual(len(f.readlines()), 3)
+        # Incomplete last line of a died process must be ignored.
+        with open(path, "a") as f:
+            f.write('{"file_name": "e.txt", "sta')
+        self.assertEqual(JSONLResultSink(path).completed(), {"a.txt", "docs/c,\"d\".txt"})
+
+    def test_csv_sink(self):
+        path = self.assert_manifest(CSVResultSink, "manifest.csv")
+        with open(path) as f:
+            lines = f.read().splitlines()
+        # A single header
+        self.assertEqual(lines[0], ",".join(UploadResult.__slots__))
+        self.assertEqual(len(lines), 4)
+
+    def test_callback_sink(self):
+        received = []
+        sink = CallbackResultSink(received.append)
+        for result in self.results:
+            sink.write(result)
+        self.assertEqual(received, self.results)
+        self.assertEqual(sink.completed(), set())
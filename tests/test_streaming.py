@@ -0,0 +1,152 @@
+import io
+import os
+import threading
+from unittest import TestCase, mock
+
+from filelib import FilelibConfig
+from filelib.constants import (
+    UPLOAD_COMPLETED,
+    UPLOAD_FAILED,
+    UPLOAD_LOCATION_HEADER
+)
+from filelib.exceptions import (
+    ChunkUploadFailedError,
+    FileNameRequiredError,
+    NoChunksToUpload
+)
+from filelib.sources import FileSource
+from filelib.streaming import IterStream, StreamUploadManager, is_stream
+from tests.mocks import mock_authentication, mock_request
+
+
+class NonSeekableStream(io.BytesIO):
+    # Like a pipe or stdin.
+
+    def seekable(self):
+        return False
+
+
+class StreamUploadManagerTestCase(TestCase):
+
+    def setUp(self):
+        self.config = FilelibConfig(storage="test_storage")
+        self.auth = mock_authentication()
+        self.auth.to_headers.return_value = {}
+        self.sent = {}
+        self.lock = threading.Lock()
+
+    def gen_up(self, file, complete_url=None, **kwargs):
+        up = StreamUploadManager(file=file, config=self.config, auth=self.auth, file_name="export.csv", **kwargs)
+        up.UPLOAD_CHUNK_SIZE = 4
+        up._FILE_COMPLETE_URL = complete_url
+        return up
+
+    def send_part(self, part_number, chunk):
+        with self.lock:
+            self.sent[part_number] = bytes(chunk)
+
+    def test_is_stream(self):
+        self.assertTrue(is_stream(NonSeekableStream(b"")))
+        self.assertTrue(is_stream(iter([b"a"])))
+        self.assertFalse(is_stream(io.BytesIO(b"")))
+        self.assertFalse(is_stream("/path/to/file"))
+        self.assertFalse(is_stream(b"content"))
+        self.assertFalse(is_stream(FileSource("/path/to/file", 1, 0)))
+        stream = IterStream([b"ab", b"", memoryview(b"cde")])
+        self.assertEqual(stream.read(), b"abcde")
+        with self.assertRaises(FileNameRequiredError):
+            StreamUploadManager.process_file(None, iter([b"a"]))
+
+    def test_iter_stream_parts(self):
+        """
+        Parts must be read as they are consumed, the last one flagged once the next read hits the end.
+        Size and part count must be known by the last part.
+        """
+        for content, expected in ((b"0123456789", [b"0123", b"4567", b"89"]), (b"01234567", [b"0123", b"4567"])):
+            up = self.gen_up(NonSeekableStream(content))
+            parts = []
+            for part_number, chunk, is_last in up.iter_stream_parts():
+                parts.append((part_number, bytes(chunk), is_last))
+                self.assertEqual(up.get_file_size(), len(content) if is_last else None)
+                up._release_chunk(chunk)
+            self.assertEqual(parts, [(i + 1, chunk, i == len(expected) - 1) for i, chunk in enumerate(expected)])
+            self.assertEqual(up.calculate_part_count(), len(expected))
+            self.assertTrue(up.digest.startswith("sha256:"))
+
+    def test_stream_upload(self):
+        """
+        Parts must be sent as they are read; without a complete URL the last part is sent last.
+        Every buffer of the ring must be given back.
+        """
+        content = os.urandom(38)
+        generator = (content[i:i + 5] for i in range(0, len(content), 5))
+        up = self.gen_up(generator, multithreading=True, workers=3)
+        order = []
+
+        def send_part(part_number, chunk):
+            self.send_part(part_number, chunk)
+            order.append(part_number)
+
+        with mock.patch.object(up, "_send_part", side_effect=send_part):
+            up.stream_upload()
+        self.assertEqual(b"".join(self.sent[i] for i in sorted(self.sent)), content)
+        self.assertEqual(order[-1], 10)
+        self.assertEqual(up.get_upload_status(), UPLOAD_COMPLETED)
+        self.assertEqual(up.to_result().size, 38)
+        # Bounded ring: parts in flight, the part read ahead and the part being read.
+        self.assertEqual(up._ring.count, 5)
+        self.assertLessEqual(up._ring._allocated, 5)
+        self.assertEqual(len(up._ring._free), up._ring._allocated)
+
+    def test_stream_upload_complete(self):
+        """
+        With a complete URL, size and part count must be sent once the stream ends.
+        """
+        up = self.gen_up(NonSeekableStream(b"0123456789"), complete_url="https://filelib.com/complete/")
+        with mock.patch.object(up, "_send_part", side_effect=self.send_part):
+            with mock_request("post") as post:
+                up.stream_upload()
+        self.assertEqual(self.sent, {1: b"0123", 2: b"4567", 3: b"89"})
+        self.assertEqual(post.call_args[1]["json"], {"file_size": 10, "part_count": 3})
+        self.assertEqual(up.get_upload_status(), UPLOAD_COMPLETED)
+
+    def test_stream_upload_retries(self):
+        """
+        Failed parts must be sent again from their buffer, and fail the upload once retries are exhausted.
+        """
+        attempts = []
+
+        def send_part(part_number, chunk):
+            attempts.append(part_number)
+            if part_number == 2 and attempts.count(2) < 3:
+                raise ChunkUploadFailedError("error")
+            self.send_part(part_number, chunk)
+
+        up = self.gen_up(NonSeekableStream(b"0123456789"))
+        with mock.patch.object(up, "_send_part", side_effect=send_part):
+            up.stream_upload()
+        self.assertEqual(self.sent[2], b"4567")
+        self.assertEqual(attempts, [1, 2, 2, 2, 3])
+
+        up = self.gen_up(NonSeekableStream(b"0123456789"))
+        with mock.patch.object(up, "_send_part", side_effect=ChunkUploadFailedError("error")) as send:
+            with mock.patch.object(up, "init_upload"):
+                up.upload()
+        self.assertEqual(send.call_count, StreamUploadManager.STREAM_PART_RETRIES + 1)
+        self.assertEqual(up.get_upload_status(), UPLOAD_FAILED)
+        self.assertEqual(len(up._ring._free), up._ring._allocated)
+
+    def test_upload(self):
+        """
+        Entity must be created without a size and nothing must be cached.
+        """
+        up = self.gen_up(NonSeekableStream(b"0123456789"))
+        with mock.patch.object(up, "_send_part", side_effect=self.send_part):
+            headers = {UPLOAD_LOCATION_HEADER: "https://filelib.com/export"}
+            with mock_request("post", response={"data": {}}, status_code=201, headers=headers) as post:
+                up.upload()
+        self.assertNotIn("file_size", post.call_args[1]["data"])
+        self.assertEqual(up.get_upload_status(), UPLOAD_COMPLETED)
+        self.assertFalse(up.has_cache())
+        with self.assertRaises(NoChunksToUpload):
+            self.gen_up(NonSeekableStream(b"")).stream_upload()
@@ -1,6 +1,14 @@
+import array
+import concurrent.futures
+import gzip
 import io
+import mmap
+import os
 import shutil
 import string
+import tempfile
+import threading
+import time
 from copy import deepcopy
 from unittest import TestCase, mock
 from uuid import uuid4
@@ -9,15 +17,23 @@ import httpx
 from jmstorage import Cache
 
 from filelib import FilelibConfig, UploadManager
+from filelib.cache import CacheNamespace, MemoryCache
 from filelib.constants import (
+    CONTENT_ENCODING_HEADER,
+    CONTENT_LENGTH_HEADER,
     CONTENT_TYPE_HEADER,
     CONTENT_TYPE_JSON,
     CONTENT_TYPE_XML,
     ERROR_CODE_HEADER,
     ERROR_MESSAGE_HEADER,
+    FILE_UPLOAD_COPY_URL,
+    FILE_UPLOAD_SINGLE_URL,
     FILE_UPLOAD_STATUS_HEADER,
+    MAX_THROTTLE_RETRIES,
+    RETRY_AFTER_HEADER,
     UPLOAD_CANCELLED,
     UPLOAD_CHUNK_SIZE_HEADER,
+    UPLOAD_COMPLETED,
     UPLOAD_FAILED,
     UPLOAD_LOCATION_HEADER,
     UPLOAD_MAX_CHUNK_SIZE_HEADER,
@@ -27,11 +43,16 @@ from filelib.constants import (
     UPLOAD_PENDING,
     UPLOAD_STARTED
 )
+from filelib.dedup import DedupIndex
 from filelib.exceptions import (
     ChunkUploadFailedError,
     FilelibAPIException,
-    FileNameRequiredError
+    FileNameRequiredError,
+    UploadAbortedError,
+    ValidationError
 )
+from filelib.ratelimit import BandwidthLimiter, RateLimitState
+from filelib.sources import BufferReader, is_buffer
 from tests.mocks import (
     GET_UPLOAD_STATUS_RESPONSE_BODY,
     DummyExecutor,
@@ -152,6 +173,9 @@ class UploadManagerTestCase(TestCase):
         # Test default value: abort_on_fail=False.
         self.assertEqual(up.abort_on_fail, False)
 
+        # Test default value: prefetch=2.
+        self.assertEqual(up.prefetch, 2)
+
         # Test default value: error="".
         self.assertEqual(up.error, "")
 
@@ -223,6 +247,24 @@ class UploadManagerTestCase(TestCase):
                 self.assertEqual(up.set_cache(cache_key, cache_val), False)
                 self.assertEqual(up.get_cache(cache_key), None)
 
+    def test_cache_backend(self):
+        """
+        Without `cache`, `cache_backend` must provide the cache for the file's namespace.
+        Upload status must be stored so finished uploads can be garbage collected.
+        """
+        backend = MemoryCache()
+        up = self.gen_up(cache=None, cache_backend=backend)
+        self.assertIsInstance(up.cache, CacheNamespace)
+        self.assertEqual(up.cache.namespace, str(up.get_cache_namespace()))
+
+        with mock_request("post", response=GET_UPLOAD_STATUS_RESPONSE_BODY, headers=self.init_upload_201_res_headers):
+            with mock.patch("filelib.UploadManager.single_thread_upload", new=lambda x: x.set_upload_status(UPLOAD_COMPLETED)):
+                up.upload()
+        self.assertEqual(up.get_cache(up._CACHE_ENTITY_KEY), self.init_upload_201_res_headers[UPLOAD_LOCATION_HEADER])
+        self.assertEqual(up.get_cache(up._CACHE_STATUS_KEY), UPLOAD_COMPLETED)
+        self.assertEqual(backend.gc(), 1)
+        self.assertFalse(up.has_cache())
+
     # get_cache_namespace
     def test_get_cache_namespace(self):
         """
@@ -618,6 +660,295 @@ class UploadManagerTestCase(TestCase):
             up = self.gen_up(workers=0)
             up.multithread_upload()
 
+    def test_multithread_upload_submission_window(self):
+        """
+        multithread_upload must not submit every part at once.
+        At most `get_submission_window()` parts can be waiting in the executor.
+        """
+        counter = {"submitted": 0, "done": 0, "peak": 0}
+        lock = threading.Lock()
+        submit = concurrent.futures.ThreadPoolExecutor.submit
+
+        def counting_submit(executor, fn, *args, **kwargs):
+            with lock:
+                counter["submitted"] += 1
+                counter["peak"] = max(counter["peak"], counter["submitted"] - counter["done"])
+            return submit(executor, fn, *args, **kwargs)
+
+        def upload_chunk(part_number, chunk=None):
+            time.sleep(0.001)
+            with lock:
+                counter["done"] += 1
+
+        with mock.patch("concurrent.futures.ThreadPoolExecutor.submit", new=counting_submit):
+            with mock.patch("filelib.UploadManager.get_upload_part_number_set", return_value=set(range(1, 51))):
+                with mock.patch("filelib.UploadManager.upload_chunk", side_effect=upload_chunk) as up_chunk:
+                    up = self.gen_up(multithreading=True, workers=2)
+                    self.assertEqual(up.get_submission_window(), 2 * up.SUBMISSION_WINDOW_FACTOR)
+                    up.multithread_upload()
+                    # Every part must be uploaded, last part is uploaded outside the executor.
+                    self.assertEqual(up_chunk.call_count, 50)
+                    self.assertEqual(counter["submitted"], 49)
+                    self.assertLessEqual(counter["peak"], up.get_submission_window())
+
+        # workers=None must fall back to ThreadPoolExecutor default worker count.
+        up = self.gen_up(workers=None)
+        self.assertTrue(up.get_submission_window() >= up.SUBMISSION_WINDOW_FACTOR)
+
+    def test_multithread_upload_fails_fast_on_fatal_error(self):
+        """
+        A part failing with 401, 403, 404 must stop the upload.
+        * Remaining parts must not be submitted.
+        * Last part must not be uploaded.
+        * Error must be raised so `upload` can mark it failed and cancel if `abort_on_fail`.
+        """
+        uploaded = []
+
+        def upload_chunk(part_number, chunk=None):
+            if part_number == 3:
+                raise ChunkUploadFailedError("Access Denied", 403, "AccessDenied")
+            uploaded.append(part_number)
+
+        with mock.patch("concurrent.futures.ThreadPoolExecutor.__enter__", return_value=DummyExecutor()):
+            with mock.patch("filelib.UploadManager.get_upload_part_number_set", return_value=set(range(1, 101))):
+                with mock.patch("filelib.UploadManager.upload_chunk", side_effect=upload_chunk):
+                    up = self.gen_up(multithreading=True, workers=2)
+                    with self.assertRaises(ChunkUploadFailedError):
+                        up.multithread_upload()
+                    # Only parts that were already submitted within the window can be uploaded.
+                    self.assertLessEqual(len(uploaded), up.get_submission_window())
+                    self.assertNotIn(100, uploaded)
+                    self.assertTrue(up._abort_event.is_set())
+
+                    # Non-fatal errors must not stop the other parts.
+                    uploaded.clear()
+
+                    def upload_chunk_503(part_number, chunk=None):
+                        if part_number == 3:
+                            raise ChunkUploadFailedError("Slow Down", 503)
+                        uploaded.append(part_number)
+
+                    with mock.patch("filelib.UploadManager.upload_chunk", side_effect=upload_chunk_503):
+                        up.multithread_upload()
+                        self.assertEqual(len(uploaded), 99)
+                        self.assertFalse(up._abort_event.is_set())
+                        self.assertEqual(up.get_error(), "Slow Down")
+
+        # `upload` must go straight to cancel with abort_on_fail=True
+        with mock.patch("filelib.UploadManager.init_upload"):
+            with mock.patch("filelib.UploadManager.get_upload_part_number_set", return_value=set(range(1, 101))):
+                with mock.patch("filelib.UploadManager.upload_chunk", side_effect=upload_chunk) as up_chunk:
+                    with mock.patch("filelib.UploadManager.cancel") as cancel:
+                        up = self.gen_up(multithreading=True, workers=2, abort_on_fail=True)
+                        up.upload()
+                        cancel.assert_called_once()
+                        self.assertEqual(up.get_upload_status(), UPLOAD_FAILED)
+                        self.assertEqual(up.get_error(), "Access Denied")
+                        self.assertTrue(up_chunk.call_count < 100)
+
+    def test_abort_interrupts_chunk_upload(self):
+        """
+        Aborted upload must not send parts, and chunks in flight must stop between blocks.
+        """
+        up = self.gen_up()
+        up.STREAM_BLOCK_SIZE = 4
+        blocks = up._iter_chunk(b"iamtestfile")
+        self.assertEqual(bytes(next(blocks)), b"iamt")
+        up.abort()
+        with self.assertRaises(UploadAbortedError):
+            next(blocks)
+        with self.assertRaises(UploadAbortedError):
+            up.upload_chunk(1)
+
+        self.assertTrue(up.is_fatal_error(ChunkUploadFailedError("Not Found", 404)))
+        self.assertTrue(up.is_fatal_error(FilelibAPIException("Unauthorized", 401)))
+        self.assertFalse(up.is_fatal_error(ChunkUploadFailedError("Internal Error", 500)))
+        self.assertFalse(up.is_fatal_error(ValueError("404")))
+
+    def test_explicit_completion(self):
+        """
+        When server provides a `complete_url`:
+        * every part, including the last, must be uploaded in parallel.
+        * `complete` must be called once all parts are uploaded.
+        """
+        response = deepcopy(GET_UPLOAD_STATUS_RESPONSE_BODY)
+        response["data"]["complete_url"] = "http://testserver/file_id/complete/"
+        up = self.gen_up(multithreading=True)
+        with mock_request("post", response=response, headers=self.init_upload_201_res_headers):
+            up.init_upload()
+        self.assertEqual(up._FILE_COMPLETE_URL, response["data"]["complete_url"])
+
+        with mock.patch("concurrent.futures.ThreadPoolExecutor.__enter__", return_value=DummyExecutor()) as executor:
+            with mock.patch("filelib.UploadManager.get_upload_part_number_set", return_value={1, 2, 3}):
+                with mock.patch("filelib.UploadManager.upload_chunk") as up_chunk:
+                    with mock.patch("filelib.UploadManager.complete") as complete:
+                        up.multithread_upload()
+                        executor.assert_called_once()
+                        self.assertEqual(sorted(c.args[0] for c in up_chunk.call_args_list), [1, 2, 3])
+                        complete.assert_called_once()
+
+                        # single thread upload must complete the same way.
+                        up.single_thread_upload()
+                        self.assertEqual(complete.call_count, 2)
+
+        # Error response must raise FilelibAPIException
+        with mock_request("post", status_code=400, response=None) as req:
+            with self.assertRaises(FilelibAPIException):
+                up.complete()
+        # Success must mark upload completed.
+        with mock_request("post", status_code=200, response=None) as req:
+            up.complete()
+            complete_url, = req.call_args.args
+            self.assertEqual(complete_url, response["data"]["complete_url"])
+            self.assertEqual(up.get_upload_status(), UPLOAD_COMPLETED)
+
+    def test_resume_completes_sent_upload(self):
+        """
+        An upload interrupted after every part is sent but before it is completed must be completed on resume.
+        """
+        up = self.gen_up()
+
+        def init_upload():
+            # Resumed: no parts missing on the server.
+            up._FILE_COMPLETE_URL = "http://testserver/file_id/complete/"
+            up.set_upload_status(UPLOAD_STARTED)
+
+        with mock.patch.object(up, "init_upload", side_effect=init_upload):
+            with mock.patch("filelib.UploadManager.get_upload_part_number_set", return_value=set()):
+                with mock_request("post", status_code=200, response=None) as req:
+                    up.upload()
+        req.assert_called_once()
+        self.assertEqual(req.call_args.args, ("http://testserver/file_id/complete/",))
+        self.assertEqual(up.get_upload_status(), UPLOAD_COMPLETED)
+
+    def test_multithread_upload_prefetch(self):
+        """
+        With `prefetch`, parts must be read ahead into pooled buffers and handed to `upload_chunk`.
+        Every buffer must be given back to the pool.
+        With `prefetch=0`, workers must read their own parts.
+        """
+        data = bytes(string.ascii_letters, "utf8")
+        sent = {}
+
+        def upload_chunk(part_number, chunk=None):
+            # Buffers are reused once the part is sent, copy it.
+            sent[part_number] = None if chunk is None else bytes(chunk)
+
+        with mock.patch("filelib.UploadManager.get_upload_part_number_set", return_value=set(range(1, len(data) + 1))):
+            with mock.patch("filelib.UploadManager.upload_chunk", side_effect=upload_chunk):
+                with mock.patch("filelib.UploadManager.advise_part") as advise_part:
+                    up = self.gen_up(file=io.BytesIO(data), multithreading=True, workers=2, prefetch=2)
+                    up.UPLOAD_CHUNK_SIZE = 1
+                    up.multithread_upload()
+                    # Last part is uploaded on its own after the rest.
+                    self.assertEqual(len(sent), len(data))
+                    for part_number in range(1, len(data)):
+                        self.assertEqual(sent[part_number], data[part_number - 1:part_number])
+                    self.assertEqual(advise_part.call_count, len(data) - 1)
+                    # Buffers are bounded and all returned, the reservation with them.
+                    self.assertLessEqual(up.buffer_pool._allocated, 2 + 2)
+                    self.assertEqual(up.buffer_pool.count, 1)
+                    self.assertEqual(len(up.buffer_pool._free), up.buffer_pool._allocated)
+
+                sent.clear()
+                up = self.gen_up(file=io.BytesIO(data), multithreading=True, workers=2, prefetch=0)
+                up.UPLOAD_CHUNK_SIZE = 1
+                up.multithread_upload()
+                self.assertEqual(len(sent), len(data))
+                self.assertTrue(all(chunk is None for chunk in sent.values()))
+
+    def test_upload_chunk_uses_buffer_pool(self):
+        """
+        upload_chunk must read the part into a pooled buffer and return it once the part is sent.
+        get_chunk with a buffer must return a memoryview of that buffer.
+        """
+        data = bytes(string.ascii_letters, "utf8")
+        up = self.gen_up(file=io.BytesIO(data))
+        up.UPLOAD_CHUNK_SIZE = 10
+        buffer = up.buffer_pool.acquire(10)
+        chunk = up.get_chunk(6, buffer=buffer)
+        self.assertIsInstance(chunk, memoryview)
+        self.assertIs(chunk.obj, buffer)
+        self.assertEqual(bytes(chunk), data[50:])
+
+        up.buffer_pool.release(buffer)
+        with mock.patch("filelib.UploadManager._send_chunk") as send_chunk:
+            up.upload_chunk(1)
+            _, sent_chunk = send_chunk.call_args.args
+            self.assertIs(sent_chunk.obj, buffer)
+            self.assertEqual(up.buffer_pool._free, [buffer])
+            # Buffer must be returned even if sending fails.
+            send_chunk.side_effect = ChunkUploadFailedError("fail")
+            with self.assertRaises(ChunkUploadFailedError):
+                up.upload_chunk(2)
+            self.assertEqual(up.buffer_pool._free, [buffer])
+
+    def test_drop_page_cache(self):
+        """
+        With `drop_page_cache=True`:
+        * file must be advised as sequential when upload starts.
+        * range of each part must be dropped from page cache once the part is acknowledged.
+        * failed parts must not be dropped as they will be read again.
+        """
+        up = self.gen_up(drop_page_cache=True)
+        with mock.patch("filelib.UploadManager._send_part") as send_part:
+            with mock.patch("filelib.UploadManager.advise_part") as advise_part:
+                up.upload_chunk(1)
+                advise_part.assert_called_once_with(1, "POSIX_FADV_DONTNEED")
+                send_part.side_effect = ChunkUploadFailedError("fail")
+                with self.assertRaises(ChunkUploadFailedError):
+                    up.upload_chunk(2)
+                advise_part.assert_called_once()
+
+        with mock.patch("filelib.UploadManager.init_upload"):
+            with mock.patch("filelib.UploadManager.single_thread_upload"):
+                with mock.patch("filelib.upload_manager.advise_file") as advise_file:
+                    with mock.patch("filelib.UploadManager.get_upload_part_number_set", return_value={1}):
+                        up.upload()
+                        advise_file.assert_called_once_with(up.file, 0, 0, "POSIX_FADV_SEQUENTIAL")
+                        # Must be opt in.
+                        advise_file.reset_mock()
+                        self.gen_up().upload()
+                        advise_file.assert_not_called()
+
+    def test_direct_io(self):
+        """
+        With `direct_io=True`, path based files must be read with O_DIRECT into pooled buffers.
+        Must fall back to regular reads when it is not possible.
+        """
+        data = bytes(range(256)) * 40
+        with tempfile.NamedTemporaryFile() as tmp:
+            tmp.write(data)
+            tmp.flush()
+            with open(tmp.name, "rb") as file:
+                up = self.gen_up(file=file, direct_io=True)
+                up.UPLOAD_CHUNK_SIZE = up.DIRECT_IO_ALIGNMENT
+                with mock.patch("filelib.UploadManager._read_direct", side_effect=up._read_direct) as read_direct:
+                    for part_number in range(1, up.calculate_part_count() + 1):
+                        buffer = up.buffer_pool.acquire(up.UPLOAD_CHUNK_SIZE)
+                        chunk = up.get_chunk(part_number, buffer=buffer)
+                        start = (part_number - 1) * up.UPLOAD_CHUNK_SIZE
+                        self.assertEqual(bytes(chunk), data[start:start + up.UPLOAD_CHUNK_SIZE])
+                        up.buffer_pool.release(buffer)
+                    self.assertEqual(read_direct.call_count, 3)
+                if hasattr(os, "O_DIRECT"):
+                    self.assertIsNotNone(up._direct_fd)
+                up.cleanup()
+                self.assertIsNone(up._direct_fd)
+
+                # Offsets not aligned to block size must use regular reads.
+                up = self.gen_up(file=file, direct_io=True)
+                up.UPLOAD_CHUNK_SIZE = 1000
+                buffer = up.buffer_pool.acquire(up.UPLOAD_CHUNK_SIZE)
+                self.assertEqual(bytes(up.get_chunk(2, buffer=buffer)), data[1000:2000])
+                self.assertIsNone(up._direct_fd)
+
+        # In memory files cannot be opened with O_DIRECT
+        up = self.gen_up(direct_io=True)
+        buffer = up.buffer_pool.acquire(up.UPLOAD_CHUNK_SIZE)
+        self.assertEqual(bytes(up.get_chunk(1, buffer=buffer)), self.file.getvalue())
+        self.assertFalse(up.direct_io)
+
     def test_cleanup(self):
         """
         cleanup method must set file property to None
@@ -766,6 +1097,217 @@ class UploadManagerTestCase(TestCase):
                                 self.assertEqual(up.get_error(), error_msg)
                                 self.assertEqual(up.get_upload_status(), UPLOAD_FAILED)
 
+    def test_upload_small_file(self):
+        """
+        Files up to `small_file_threshold` must be created and uploaded with a single request.
+        Must fall back to chunked upload if the API does not support it, or the file is bigger.
+        """
+        location = "https://api.filelib.com/upload/file_id/"
+        with mock.patch("filelib.UploadManager.init_upload") as init_upload:
+            with mock_request("post", status_code=201, headers={UPLOAD_LOCATION_HEADER: location}) as post:
+                up = self.gen_up(small_file_threshold=len(self.file.getvalue()), ignore_cache=True)
+                up.upload()
+                init_upload.assert_not_called()
+                post.assert_called_once()
+                self.assertEqual(post.call_args[0][0], FILE_UPLOAD_SINGLE_URL)
+                _name, content, _content_type = post.call_args[1]["files"]["file"]
+                self.assertEqual(content, self.file.getvalue())
+                self.assertEqual(up.get_upload_status(), UPLOAD_COMPLETED)
+                self.assertEqual(up.to_result().url, location)
+
+            # Not supported by the API
+            with mock_request("post", status_code=404):
+                with mock.patch("filelib.UploadManager.get_upload_part_number_set", return_value={1}):
+                    with mock.patch("filelib.UploadManager.single_thread_upload") as single_thread_upload:
+                        up = self.gen_up(small_file_threshold=len(self.file.getvalue()), ignore_cache=True)
+                        up.upload()
+                        init_upload.assert_called_once()
+                        single_thread_upload.assert_called_once()
+
+            with mock_request("post", status_code=400):
+                up = self.gen_up(small_file_threshold=len(self.file.getvalue()), ignore_cache=True)
+                with self.assertRaises(FilelibAPIException):
+                    up.upload()
+
+        up = self.gen_up(small_file_threshold=len(self.file.getvalue()) - 1)
+        self.assertFalse(up.is_small_file())
+        # Disabled by default
+        self.assertFalse(self.gen_up().is_small_file())
+
+    def test_set_entity(self):
+        """
+        A file entity created already must be used by init_upload instead of creating another one.
+        """
+        up = self.gen_up(ignore_cache=True, small_file_threshold=100)
+        up.set_entity(self.init_upload_201_res_headers, {"complete_url": "https://filelib.com/complete/"})
+        with mock.patch("httpx.Client.post") as post:
+            up.init_upload()
+            post.assert_not_called()
+        self.assertEqual(up._FILE_ENTITY_URL, self.init_upload_201_res_headers[UPLOAD_LOCATION_HEADER])
+        self.assertEqual(up.UPLOAD_CHUNK_SIZE, 5000)
+        self.assertEqual(up.get_upload_part_number_set(), {1})
+        self.assertEqual(up._FILE_COMPLETE_URL, "https://filelib.com/complete/")
+        # Not sent with a single request either.
+        self.assertFalse(up.is_small_file())
+
+    def test_compression(self):
+        """
+        Parts must be compressed with Content-Encoding if samples compress well,
+        sent as is otherwise. Compressed size and ratio must be in the result.
+        """
+        text = b"2024-01-01 00:00:00 INFO request served\n" * 2000
+        up = self.gen_up(file=io.BytesIO(text), compression="gzip")
+        up.UPLOAD_CHUNK_SIZE = 30000
+        up.init_compression()
+        self.assertEqual(up._codec.name, "gzip")
+        up._FILE_ENTITY_URL = "https://filelib.com/upload/file_id/"
+        with mock_request("patch", status_code=201) as patch:
+            for part_number in range(1, up.calculate_part_count() + 1):
+                patch.reset_mock()
+                up.upload_chunk(part_number)
+                headers = patch.call_args[1]["headers"]
+                self.assertEqual(headers[CONTENT_ENCODING_HEADER], "gzip")
+                content = b"".join(patch.call_args[1]["content"])
+                self.assertEqual(headers[CONTENT_LENGTH_HEADER], str(len(content)))
+                start = (part_number - 1) * up.UPLOAD_CHUNK_SIZE
+                self.assertEqual(gzip.decompress(content), text[start:start + up.UPLOAD_CHUNK_SIZE])
+        result = up.to_result()
+        self.assertLess(result.compressed_size, len(text))
+        self.assertGreater(result.compression_ratio, 10)
+
+        # Already compressed data
+        up = self.gen_up(file=io.BytesIO(os.urandom(50000)), compression="gzip")
+        up.init_compression()
+        self.assertIsNone(up._codec)
+        self.assertIsNone(up.to_result().compressed_size)
+        # Not for direct uploads
+        up = self.gen_up(file=io.BytesIO(text), compression="gzip")
+        up.is_direct_upload = True
+        up.init_compression()
+        self.assertIsNone(up._codec)
+        # Disabled by default
+        up = self.gen_up(file=io.BytesIO(text))
+        up.init_compression()
+        self.assertIsNone(up._codec)
+
+    def test_deduplicate(self):
+        """
+        A file with the same content as an uploaded one must be copied instead of uploaded.
+        Must upload the content if the copy cannot be made.
+        """
+        index = DedupIndex()
+        location = "https://filelib.com/upload/first/"
+
+        def upload_parts(up):
+            up._FILE_ENTITY_URL = location
+            up.set_upload_status(UPLOAD_COMPLETED)
+
+        with mock.patch("filelib.UploadManager.init_upload") as init_upload:
+            with mock.patch("filelib.UploadManager.get_upload_part_number_set", return_value={1}):
+                with mock.patch("filelib.UploadManager.single_thread_upload", autospec=True, side_effect=upload_parts):
+                    up = self.gen_up(file=io.BytesIO(b"same content"), dedup_index=index)
+                    up.upload()
+                    init_upload.assert_called_once()
+                    self.assertEqual(index.get(up.digest, up.get_file_size()), location)
+
+                    with mock_request("post", status_code=201, headers={UPLOAD_LOCATION_HEADER: "https://filelib.com/upload/copy/"}) as post:
+                        copy = self.gen_up(file=io.BytesIO(b"same content"), file_name="copy.txt", dedup_index=index)
+                        copy.upload()
+                    init_upload.assert_called_once()
+                    self.assertEqual(post.call_args[0][0], FILE_UPLOAD_COPY_URL)
+                    self.assertEqual(post.call_args[1]["data"]["source_url"], location)
+                    self.assertEqual(copy.get_upload_status(), UPLOAD_COMPLETED)
+                    self.assertEqual(copy.to_result().url, "https://filelib.com/upload/copy/")
+                    self.assertEqual(copy.to_result().digest, up.digest)
+
+                    # Source is gone
+                    with mock_request("post", status_code=404):
+                        copy = self.gen_up(file=io.BytesIO(b"same content"), file_name="copy.txt", dedup_index=index)
+                        copy.upload()
+                    self.assertEqual(init_upload.call_count, 2)
+                    # Uploaded content is indexed again.
+                    self.assertEqual(index.get(up.digest, up.get_file_size()), location)
+
+    def test_rate_limiter(self):
+        """
+        Every block of a part must be drawn from the rate limiter of the storage before it is sent.
+        """
+        limiter = mock.Mock(spec=BandwidthLimiter)
+        up = self.gen_up(rate_limiter=limiter)
+        up.STREAM_BLOCK_SIZE = 4
+        self.assertEqual(b"".join(up._iter_chunk(b"0123456789")), b"0123456789")
+        self.assertEqual(limiter.acquire.call_args_list, [mock.call(4, "test_storage"), mock.call(4, "test_storage"), mock.call(2, "test_storage")])
+
+    def test_send_throttled(self):
+        """
+        Throttled requests must pause every sender sharing the state and be sent again after the pause.
+        """
+        state = mock.Mock(spec=RateLimitState)
+        state.wait.return_value = True
+        up = self.gen_up(rate_limit_state=state)
+        request = httpx.Request(method="patch", url="")
+        throttled = httpx.Response(status_code=429, request=request, headers={RETRY_AFTER_HEADER: "3"})
+        success = httpx.Response(status_code=201, request=request)
+        send = mock.Mock(side_effect=[throttled, success])
+        self.assertIs(up._send_throttled(send), success)
+        self.assertEqual(send.call_count, 2)
+        self.assertEqual(state.wait.call_count, 2)
+        state.pause.assert_called_once_with(3.0)
+        # Gives up after MAX_THROTTLE_RETRIES and returns the throttled response to raise from.
+        send = mock.Mock(return_value=throttled)
+        self.assertIs(up._send_throttled(send), throttled)
+        self.assertEqual(send.call_count, MAX_THROTTLE_RETRIES + 1)
+        # Aborted uploads stop waiting.
+        state.wait.return_value = False
+        with self.assertRaises(UploadAbortedError):
+            up._send_throttled(send)
+
+        # Other Filelib API requests are throttled the same way, and are not interrupted by an abort.
+        state.reset_mock()
+        state.wait.return_value = True
+        up._abort_event.set()
+        up._FILE_COMPLETE_URL = "http://testserver/file_id/complete/"
+        with mock_request("post") as req:
+            req.side_effect = [throttled, httpx.Response(status_code=200, request=request)]
+            up.complete()
+        self.assertEqual(req.call_count, 2)
+        state.pause.assert_called_once_with(3.0)
+        state.wait.assert_called_with(None)
+        self.assertEqual(up.get_upload_status(), UPLOAD_COMPLETED)
+
+    def test_buffer_upload(self):
+        """
+        Buffers must be accepted with a `file_name`, and their parts sliced out of them without copying.
+        """
+        content = b"0123456789"
+        buffers = [content, bytearray(content), memoryview(content), array.array("b", content)]
+        memory_map = mmap.mmap(-1, len(content))
+        memory_map.write(content)
+        self.addCleanup(memory_map.close)
+        buffers.append(memory_map)
+        for buffer in buffers:
+            up = self.gen_up(file=buffer, file_name="array.bin")
+            self.assertIsInstance(up.file, BufferReader)
+            self.assertEqual(up.get_file_size(), 10)
+            up.UPLOAD_CHUNK_SIZE = 4
+            with mock.patch.object(up.buffer_pool, "acquire") as acquire:
+                chunks = [up._read_pooled_chunk(part_number) for part_number in (1, 2, 3)]
+            acquire.assert_not_called()
+            self.assertEqual([bytes(chunk) for chunk in chunks], [b"0123", b"4567", b"89"])
+            # Views of the buffer itself.
+            self.assertTrue(all(chunk.obj is up.file.getbuffer().obj for chunk in chunks))
+            with mock.patch.object(up.buffer_pool, "release") as release:
+                up._release_chunk(chunks[0])
+            release.assert_not_called()
+            up.file.seek(2)
+            self.assertEqual(up.file.read(3), b"234")
+        with self.assertRaises(FileNameRequiredError):
+            self.gen_up(file=content, file_name=None)
+        with self.assertRaises(ValidationError):
+            self.gen_up(file=memoryview(content)[::2], file_name="array.bin")
+        self.assertFalse(is_buffer(io.BytesIO(content)))
+        self.assertFalse(is_buffer("content"))
+
     def test_get_upload_status(self):
         """
         Test that it returns the value of `_FILE_UPLOAD_STATUS`